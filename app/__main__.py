@@ -1,9 +1,9 @@
 import logging
-from multiprocessing import Queue
 
 from app.config import settings
+from app.db.partitions import maintain_history_partitions
 from app.service.telegram import TelegramBotService
-from app.service.utils import load_channels_data
+from app.service.utils import load_channels_chats, load_channels_data
 from app.service.yt_monitor import YTMonitorService
 
 # Настройка уровня логирования SQLAlchemy
@@ -17,19 +17,13 @@ for handler in logging.getLogger("sqlalchemy.engine").handlers:
 
 
 if __name__ == "__main__":
-    # Общая очередь для передачи данных между сервисами
-    news_queue = Queue()
-    if settings.run_tg_bot_shorts_publish:
-        shorts_queue = Queue()
-    else:
-        shorts_queue = None
+    # Создаём секции таблиц истории на ближайшие месяцы до запуска процессов мониторинга
+    maintain_history_partitions()
     # Загружаем список каналов
     channels_list, channels_name = load_channels_data(settings.channels_list_path)
 
     # Инициализируем мониторинг YouTube
-    monitor = YTMonitorService(
-        channels_list, channels_name, new_videos_queue=news_queue, shorts_videos_queue=shorts_queue
-    )
+    monitor = YTMonitorService(channels_list, channels_name, tg_chats=load_channels_chats(settings.channels_list_path))
 
     # Запускаем процессы
     # logger.debug(f"Current Settings: {settings.model_dump()}")
@@ -37,9 +31,6 @@ if __name__ == "__main__":
     if settings.run_tg_bot:
         tg_bot = TelegramBotService(
             bot_token=settings.tg_bot_token,
-            group_id=settings.tg_group_id,
-            msg_queue=news_queue,
-            shorts_queue=shorts_queue,
         )
         bot_process = tg_bot.run()
         bot_process.join()
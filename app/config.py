@@ -23,16 +23,68 @@ class Settings(BaseSettings):
     db_schema: str = "youtube"
     db_username: str = "you_tube_db_user"
     db_password: str = "you_tube_db_password"
+    db_pool_size: int = 10  # Постоянных соединений в пуле каждого процесса
+    db_max_overflow: int = 20  # Дополнительных соединений сверх db_pool_size при пиковой нагрузке
+    db_pool_timeout: int = 30  # Сколько секунд ждать свободного соединения
 
     monitor_new: bool = True
     monitor_history: bool = False
     monitor_video_formats: bool = False
     run_tg_bot: bool = True
     run_tg_bot_shorts_publish: bool = False
+    monitor_new_workers: int = 1  # Сколько каналов сканируется одновременно при поиске новых видео
+    monitor_channel_delay: float = 2.0  # Пауза после обработки канала (в секундах)
+    monitor_new_incremental: bool = False  # Искать новые видео только до первого уже известного видео канала
+    incremental_page_size: int = 30  # Размер первой страницы инкрементального листинга (далее удваивается)
+    full_listing_interval: int = 24 * 60 * 60  # Как часто (в секундах) делать полный листинг канала
+    monitor_new_feed: bool = False  # Проверять Atom-ленту канала перед запуском yt-dlp
+    youtube_feed_url: str = "https://www.youtube.com/feeds/videos.xml"
+    monitor_leasing: bool = False  # Делить каналы между процессами и узлами через аренду в таблице channel_scan_jobs
+    scan_lease_duration: int = 5 * 60  # На сколько секунд канал закрепляется за процессом (продлевается heartbeat)
+    scan_lease_heartbeat: int = 60  # Как часто (в секундах) продлевать аренду обрабатываемого канала
+    scan_lease_poll_interval: int = 60  # Как часто (в секундах) искать каналы, срок сканирования которых подошёл
+    worker_id: str = ""  # Имя узла в таблице аренды (пусто - hostname), к нему добавляется pid процесса
+    monitor_adaptive: bool = False  # Подбирать интервал проверки канала на новые видео по частоте его загрузок
+    adaptive_min_interval: int = 15 * 60  # Минимальный интервал проверки канала (в секундах)
+    adaptive_max_interval: int = 24 * 60 * 60  # Максимальный интервал проверки канала (в секундах)
+    adaptive_checks_per_upload: int = 4  # Сколько проверок приходится на типичный промежуток между загрузками
+    adaptive_history_size: int = 20  # По скольким последним загрузкам канала оценивается их частота
+
+    known_videos_cache_channels: int = 1000  # Для скольких каналов держать в памяти id уже известных видео
+    video_history_heartbeat: int = 7 * 24 * 60 * 60  # Снимок истории без изменений всё равно пишется раз в N секунд
+    history_partitions_ahead: int = 3  # На сколько месяцев вперёд создавать секции таблиц истории
+    history_retention_months: int = 0  # Секции истории старше N месяцев отсоединяются (0 - хранить всё)
+    history_archive_schema: str = "youtube_archive"  # Схема для отсоединённых секций (пусто - удалять их)
+
+    formats_workers: int = 4  # Сколько видео одновременно обрабатывается при сборе форматов
+    formats_lease: int = 10 * 60  # На сколько секунд задание очереди форматов закрепляется за обработчиком
+    formats_max_attempts: int = 5  # После стольких неудачных попыток видео исключается из сбора форматов
+    formats_retry_delay: int = 60 * 60  # Пауза перед повтором неудачного задания (в секундах, растёт с попытками)
+    formats_enqueue_batch: int = 10_000  # Сколько видео без форматов добавляется в очередь за один проход
+    formats_interval: int = 15 * 60  # Пауза между проходами сбора форматов, когда очередь пуста (в секундах)
+
+    download_slots: int = 2  # Сколько видео скачивается одновременно
+    download_rate_limit: int = 0  # Общее ограничение скорости скачивания (байт/с) на все слоты, 0 - без ограничения
+    download_max_attempts: int = 5  # После стольких неудачных попыток задание на скачивание не повторяется
+    download_retry_delay: int = 5 * 60  # Пауза перед повтором неудачного скачивания (в секундах, растёт с попытками)
+    download_lease: int = 6 * 60 * 60  # Через сколько секунд зависшее скачивание может забрать другой процесс
+    download_poll_interval: int = 10  # Как часто (в секундах) проверять очередь скачивания, когда она пуста
+
+    ytdlp_max_processes: int = 4  # Максимум одновременно запущенных процессов yt-dlp
+    ytdlp_timeout: int = 600  # Таймаут одного вызова yt-dlp (в секундах), кроме скачивания видео
+    ytdlp_backend: str = "cli"  # cli - запуск процесса yt-dlp на каждый вызов, library - пул процессов с yt_dlp
+    ytdlp_pool_workers: int = 2  # Число процессов в пуле для ytdlp_backend=library
 
     youtube_api_key: str = "youtube_key"
     youtube_secret_json: str = ""
     youtube_service_secret_json: str = ""
+    youtube_api_url: str = ""  # Другой адрес YouTube Data API (например, локальный фейковый сервер для тестов)
+    ytapi_concurrency: int = 4  # Сколько запросов к YouTube API по 50 видео выполняется одновременно
+    ytapi_max_retries: int = 5  # Повторы запроса к YouTube API при 429, 5xx и сетевых ошибках
+    ytapi_retry_backoff: float = 1.0  # Начальная задержка перед повтором (удваивается с каждой попыткой)
+    ytapi_daily_quota: int = 10_000  # Дневная квота YouTube Data API (в единицах)
+    ytapi_quota_history_reserve: int = 1_500  # Остаток квоты, который обновление истории оставляет новым видео
+    ytapi_quota_channel_reserve: int = 3_000  # Остаток квоты, который информация о каналах оставляет истории
 
     tg_bot_token: str = "TELEGRAM_BOT_TOKEN"
     tg_group_id: str = "group_id"
@@ -41,6 +93,16 @@ class Settings(BaseSettings):
     tg_shorts_template: Path = "./templates/shorts.md"
     tg_new_video_template_default: Path = "./templates/new_video.md"
     tg_shorts_template_default: Path = "./templates/shorts.md"
+    tg_send_interval: float = 3  # Средний интервал между сообщениями в один чат (лимит Telegram - 20 в минуту)
+    tg_send_burst: int = 1  # Сколько сообщений можно отправить в чат подряд без паузы после простоя
+    tg_global_rate: float = 25  # Сообщений в секунду во все чаты вместе (лимит Telegram - около 30)
+    tg_global_burst: int = 25  # Сколько сообщений во все чаты можно отправить подряд без паузы
+    tg_outbox_batch: int = 30  # Сколько публикаций одного чата бот забирает из telegram_outbox за раз
+    tg_outbox_lease: int = 3600  # Аренда публикаций (в секундах), дольше худшего времени отправки одной публикации
+    tg_outbox_heartbeat: int = 60  # Как часто (в секундах) продлевать аренду отправляемых публикаций
+    tg_outbox_max_attempts: int = 5  # Попыток публикации видео, после которых она помечается как failed
+    tg_outbox_retry_delay: int = 60  # Пауза перед повтором публикации (удваивается с каждой попыткой)
+    tg_outbox_poll_interval: int = 30  # Проверка telegram_outbox без уведомления (отложенные повторы)
 
     use_proxy: bool = False
     use_ssh_tunnel: bool = False
@@ -48,6 +110,10 @@ class Settings(BaseSettings):
     ssh_port: int = 22
     ssh_user: str = "root"
     ssh_private_key: str = "/root/.ssh/id_rsa"
+    ssh_tunnel_remote_host: str = "www.googleapis.com"  # Куда ведёт туннель со стороны SSH-сервера
+    ssh_tunnel_remote_port: int = 443
+    ssh_tunnel_local_port: int = 0  # Локальный порт туннеля (0 - любой свободный)
+    ssh_tunnel_check_interval: float = 30.0  # Как часто (в секундах) проверять, что туннель жив
 
     log_lvl: str = "DEBUG"
     log_dir: str = "logs"
@@ -65,6 +131,12 @@ class Settings(BaseSettings):
             f"postgresql+psycopg2://{self.db_username}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
         )
 
+    @property
+    def async_database_url(self) -> str:
+        return (
+            f"postgresql+asyncpg://{self.db_username}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
+        )
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.tg_new_video_template = Path(self.tg_new_video_template).resolve()
@@ -0,0 +1,642 @@
+from datetime import datetime, timedelta
+from typing import Generic, NamedTuple, Optional, Type, TypeVar, Union
+from uuid import UUID
+
+from sqlalchemy import and_, delete, exists, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.db.base import AsyncBaseRepository, Base
+from app.db.data_table import Channel, ChannelHistory, ChannelScanJob, DownloadJob, FormatHarvestJob
+
+# isort: split
+from app.db.data_table import TelegramOutbox, Video, YTFormat
+from app.db.repository import YoutubeDataRepository, insert_publications, notify_publications
+from app.schema import ChannelAPIInfoSchema, ChannelInfoSchema, VideoDownloadSchema, VideoSchema, YTFormatSchema
+
+DOWNLOAD_JOBS_CHANNEL = "download_jobs"  # LISTEN/NOTIFY channel announcing new download jobs
+
+
+class AsyncYoutubeDataRepository(AsyncBaseRepository):
+    """
+    Asynchronous repository for the hot queries of the monitor pipeline, running on the asyncpg engine.
+
+    Lookups are written natively with `select()`. The multi-statement bulk writes reuse the implementation
+    of `YoutubeDataRepository` through `AsyncSession.run_sync`: the same statements are executed over the
+    asyncpg connection without blocking the event loop, so both repositories always write the same rows.
+    `YoutubeDataRepository` remains the repository for scripts and thread-based code.
+    """
+
+    async def get_existing_video_ids(self, video_ids: list[str]) -> set[str]:
+        """
+        Returns the subset of the given YouTube video IDs that are already stored in the database.
+
+        Args:
+            video_ids (list[str]): A list of YouTube video IDs to check.
+
+        Returns:
+            set[str]: Video IDs from `video_ids` that exist in the 'videos' table.
+        """
+        if not video_ids:
+            return set()
+        result = await self._session.scalars(select(Video.video_id).where(Video.video_id.in_(video_ids)))
+        return set(result.all())
+
+    async def get_downloaded_format_ids(self, file_path: str) -> list[str]:
+        """Returns the yt-dlp format IDs recorded as downloaded into `file_path`."""
+        result = await self._session.scalars(
+            select(YTFormat.format_id).where(YTFormat.file_path == file_path, YTFormat.is_downloaded.is_(True))
+        )
+        return list(result.all())
+
+    async def get_channel_video_ids(self, channel_id: str) -> set[str]:
+        """Returns the YouTube IDs of all videos of the channel stored in the database."""
+        result = await self._session.scalars(select(Video.video_id).where(Video.channel_id == channel_id))
+        return set(result.all())
+
+    async def get_new_and_existing_video_ids(
+        self, video_ids: list[str], channel_id: str
+    ) -> tuple[list[str], list[str]]:
+        """
+        Splits the given video IDs of a channel into new ones and ones already stored in the database.
+
+        Args:
+            video_ids (list[str]): A list of YouTube video IDs to check.
+            channel_id (str): The ID of the channel the videos belong to.
+
+        Returns:
+            tuple[list[str], list[str]]: New video IDs and existing video IDs, both in the order of `video_ids`.
+        """
+        existing_ids = await self.get_existing_video_ids(video_ids)
+        return (
+            [video_id for video_id in video_ids if video_id not in existing_ids],
+            [video_id for video_id in video_ids if video_id in existing_ids],
+        )
+
+    async def get_video_ids_by_channel(self, limit_channels: int) -> dict[str, set[str]]:
+        """
+        Returns the YouTube video IDs of the `limit_channels` most recently updated channels in one query.
+
+        Args:
+            limit_channels (int): Maximum number of channels to return.
+
+        Returns:
+            dict[str, set[str]]: channel_id -> video IDs, from the least to the most recently updated channel.
+        """
+        result = await self._session.execute(
+            select(Video.channel_id, func.array_agg(Video.video_id))
+            .group_by(Video.channel_id)
+            .order_by(func.max(Video.last_update).desc())
+            .limit(limit_channels)
+        )
+        return {channel_id: set(video_ids) for channel_id, video_ids in reversed(result.all())}
+
+    async def get_recent_upload_dates(self, channel_id: str, limit: int) -> list[datetime]:
+        """Returns the upload dates of the `limit` most recently uploaded videos of the channel, newest first."""
+        result = await self._session.scalars(
+            select(Video.upload_date)
+            .where(Video.channel_id == channel_id, Video.upload_date.is_not(None))
+            .order_by(Video.upload_date.desc())
+            .limit(limit)
+        )
+        return list(result.all())
+
+    async def get_channel_ids(self) -> set[str]:
+        """Returns the IDs of all channels stored in the database."""
+        return set((await self._session.scalars(select(Channel.channel_id))).all())
+
+    async def channel_exists(self, channel_id: str) -> bool:
+        """Checks whether the channel is stored in the database."""
+        result = await self._session.scalar(select(Channel.channel_id).where(Channel.channel_id == channel_id))
+        return result is not None
+
+    async def upsert_channel(
+        self, channel_data: Union[ChannelInfoSchema, ChannelAPIInfoSchema, Channel], channels_list_name: str
+    ) -> Channel:
+        """
+        Updates the details of an existing channel or creates a new channel. See `YoutubeDataRepository.upsert_channel`.
+        """
+        return await self._session.run_sync(
+            lambda session: YoutubeDataRepository(session).upsert_channel(channel_data, channels_list_name)
+        )
+
+    async def add_channel_history(self, channel_info: Channel | ChannelHistory) -> None:
+        """
+        Adds a snapshot of the channel's follower, view and video counters to the channel history.
+
+        Args:
+            channel_info (Channel | ChannelHistory): The channel to take the counters from, or a ready history row.
+        """
+        if isinstance(channel_info, ChannelHistory):
+            history = channel_info
+        else:
+            history = ChannelHistory(
+                channel_id=channel_info.channel_id,
+                follower_count=channel_info.channel_follower_count,
+                view_count=channel_info.viewCount,
+                video_count=channel_info.videoCount,
+            )
+        self._session.add(history)
+        await self.commit()
+
+    async def bulk_upsert_videos(
+        self,
+        video_schemas: list[VideoSchema],
+        channel_id: str,
+        add_history: bool = True,
+        batch_size: int = 500,
+        publications: Optional[list[dict]] = None,
+    ) -> dict[str, str]:
+        """
+        Inserts or updates many videos of one channel with set-based statements, together with the Telegram
+        publications of the inserted videos. See `YoutubeDataRepository.bulk_upsert_videos`.
+
+        Returns:
+            dict[str, str]: Outcome per YouTube video ID: "inserted", "updated" or "failed".
+        """
+        return await self._session.run_sync(
+            lambda session: YoutubeDataRepository(session).bulk_upsert_videos(
+                video_schemas, channel_id, add_history=add_history, batch_size=batch_size, publications=publications
+            )
+        )
+
+    async def bulk_record_video_history(
+        self, video_schemas: list[VideoSchema], batch_size: int = 1000
+    ) -> dict[str, int]:
+        """
+        Updates already stored videos and records their history snapshots in batches.
+        See `YoutubeDataRepository.bulk_record_video_history`.
+
+        Returns:
+            dict[str, int]: Counters "updated", "tags_updated", "history", "history_skipped" and "missing".
+        """
+        return await self._session.run_sync(
+            lambda session: YoutubeDataRepository(session).bulk_record_video_history(
+                video_schemas, batch_size=batch_size
+            )
+        )
+
+
+J = TypeVar("J", bound=tuple)
+
+
+class LeasedJobRepository(AsyncBaseRepository, Generic[J]):
+    """
+    Base of the work queues leased with `FOR UPDATE SKIP LOCKED`.
+
+    Claimed jobs are leased for a limited time, so any number of workers can share a queue, and a job
+    of a crashed worker is claimed again once its lease expires. A failed job is retried with exponential backoff.
+    Subclasses set the queue `model`, the claimed row type `job_type` (a NamedTuple of queue columns)
+    and the `key` column identifying a job.
+    """
+
+    model: Type[Base]
+    job_type: Type[J]
+    key: str = "id"
+    finished_status: Optional[str] = None  # Статус завершённых заданий, которые остаются в таблице
+
+    def _claim_returning(self) -> tuple[list, list]:
+        """Columns returned for a claimed job and extra conditions of the claim (e.g. a join)."""
+        table = self.model.__table__
+        return [table.c[field] for field in self.job_type._fields], []
+
+    def _due(self):
+        """Condition of jobs that can be claimed: pending jobs that are due and jobs whose lease expired."""
+        table = self.model.__table__
+        now = func.now()
+        return or_(
+            and_(table.c.status == "pending", table.c.available_at <= now),
+            and_(table.c.status == "in_progress", table.c.locked_until < now),
+        )
+
+    async def claim(self, limit: int, lease: int, *where) -> list[J]:
+        """Leases up to `limit` due jobs (optionally only those matching `where`) for `lease` seconds."""
+        table = self.model.__table__
+        key = table.c[self.key]
+        now = func.now()
+        due = (
+            select(key)
+            .where(self._due(), *where)
+            .order_by(table.c.available_at, key)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        columns, conditions = self._claim_returning()
+        result = await self._session.execute(
+            update(table)
+            .where(key.in_(due), *conditions)
+            .values(status="in_progress", attempts=table.c.attempts + 1, locked_until=now + timedelta(seconds=lease))
+            .returning(*columns)
+        )
+        jobs = sorted((self.job_type(*row) for row in result.all()), key=lambda job: getattr(job, self.key))
+        await self.commit()
+        return jobs
+
+    async def extend_lease(self, jobs: list[J], lease: int) -> None:
+        """Extends the lease of jobs that are still being worked on to `lease` seconds from now."""
+        if not jobs:
+            return
+        table = self.model.__table__
+        await self._session.execute(
+            update(table)
+            .where(table.c[self.key].in_([getattr(job, self.key) for job in jobs]), table.c.status == "in_progress")
+            .values(locked_until=func.now() + timedelta(seconds=lease))
+        )
+        await self.commit()
+
+    async def fail(self, job: J, error: str, max_attempts: int, retry_delay: int) -> None:
+        """
+        Releases a failed job. It is retried after `retry_delay` seconds, doubled with every attempt,
+        or marked as "failed" for good after `max_attempts` attempts.
+        """
+        table = self.model.__table__
+        if job.attempts >= max_attempts:
+            values = {"status": "failed"}
+        else:
+            delay = timedelta(seconds=retry_delay * 2 ** (job.attempts - 1))
+            values = {"status": "pending", "available_at": func.now() + delay}
+        await self._session.execute(
+            update(table)
+            .where(table.c[self.key] == getattr(job, self.key))
+            .values(**values, locked_until=None, last_error=error[:1000])
+        )
+        await self.commit()
+
+    async def get_backlog(self) -> dict[str, int]:
+        """Returns the number of unfinished jobs per status ("pending", "in_progress", "failed")."""
+        table = self.model.__table__
+        statement = select(table.c.status, func.count()).group_by(table.c.status)
+        if self.finished_status is not None:
+            statement = statement.where(table.c.status != self.finished_status)
+        result = await self._session.execute(statement)
+        return dict(result.all())
+
+
+class ClaimedFormatJob(NamedTuple):
+    video_id: UUID  # videos.id
+    youtube_video_id: str
+    attempts: int  # Номер текущей попытки
+
+
+class FormatQueueRepository(LeasedJobRepository[ClaimedFormatJob]):
+    """
+    Work queue of videos whose formats have not been harvested yet (`format_harvest_queue`).
+    A job is deleted in the same transaction that stores the formats of its video.
+    """
+
+    model = FormatHarvestJob
+    job_type = ClaimedFormatJob
+    key = "video_id"
+
+    async def enqueue_missing(self, limit: int) -> int:
+        """
+        Adds up to `limit` videos that have no stored formats and are not queued yet.
+
+        Returns:
+            int: The number of enqueued videos.
+        """
+        queue = FormatHarvestJob.__table__
+        videos = Video.__table__
+        formats = YTFormat.__table__
+        missing = (
+            select(videos.c.id)
+            .where(~exists().where(formats.c.video_id == videos.c.id))
+            .where(~exists().where(queue.c.video_id == videos.c.id))
+            .limit(limit)
+        )
+        result = await self._session.execute(
+            insert(queue).from_select([queue.c.video_id], missing).on_conflict_do_nothing()
+        )
+        await self.commit()
+        return result.rowcount
+
+    def _claim_returning(self) -> tuple[list, list]:
+        queue = FormatHarvestJob.__table__
+        videos = Video.__table__
+        return [queue.c.video_id, videos.c.video_id, queue.c.attempts], [videos.c.id == queue.c.video_id]
+
+    async def complete(self, video_id: UUID, formats: list[YTFormatSchema]) -> int:
+        """
+        Stores all formats of the video with one `INSERT ... ON CONFLICT (video_id, format_id) DO UPDATE`
+        and removes its job in the same transaction.
+
+        Returns:
+            int: The number of stored formats.
+        """
+        # Последний формат с тем же format_id побеждает, иначе ON CONFLICT DO UPDATE упадёт на дубликатах
+        rows = list({fmt.format_id: {**fmt.model_dump(), "video_id": video_id} for fmt in formats}.values())
+        table = YTFormat.__table__
+        if rows:
+            statement = insert(table).values(rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.video_id, table.c.format_id],
+                set_={key: statement.excluded[key] for key in rows[0] if key not in ("video_id", "format_id")},
+            )
+            await self._session.execute(statement)
+        await self._session.execute(delete(FormatHarvestJob.__table__).where(FormatHarvestJob.video_id == video_id))
+        await self.commit()
+        return len(rows)
+
+
+class ClaimedDownloadJob(NamedTuple):
+    id: int
+    video_id: str  # YouTube video ID
+    video_url: str
+    file_path: str
+    format: str
+    publish: bool
+    publish_chats: Optional[list[str]]
+    payload: Optional[dict]
+    attempts: int
+
+
+class DownloadJobRepository(LeasedJobRepository[ClaimedDownloadJob]):
+    """
+    Persistent queue of video downloads (`download_jobs`), one job per video and yt-dlp format selector.
+    Finished jobs are kept with status "done".
+    """
+
+    model = DownloadJob
+    job_type = ClaimedDownloadJob
+    finished_status = "done"
+
+    async def enqueue(self, video: VideoDownloadSchema, format: str, publish_chats: Optional[list[str]] = None) -> bool:
+        """
+        Adds a download job unless the video is already queued with the same format. A new job is announced
+        on the `DOWNLOAD_JOBS_CHANNEL` notification channel when the transaction commits.
+
+        Returns:
+            bool: True if a new job was created.
+        """
+        table = DownloadJob.__table__
+        result = await self._session.execute(
+            insert(table)
+            .values(
+                video_id=video.video_id,
+                video_url=video.video_url,
+                file_path=video.video_file_download_path,
+                format=format,
+                publish=bool(publish_chats),
+                publish_chats=publish_chats or None,
+                payload=video.model_dump(),
+            )
+            .on_conflict_do_nothing(index_elements=[table.c.video_id, table.c.format])
+        )
+        created = result.rowcount > 0
+        if created:
+            await self._session.execute(select(func.pg_notify(DOWNLOAD_JOBS_CHANNEL, video.video_id)))
+        await self.commit()
+        return created
+
+    async def complete(self, job: ClaimedDownloadJob, size: int, format_ids: list[str]) -> int:
+        """
+        Marks the job as done and sets `file_path`/`is_downloaded` of the downloaded formats of the video
+        in the same transaction. A job with `publish` also puts the video into the Telegram outbox
+        as "shorts" for each of its `publish_chats`.
+
+        Args:
+            job (ClaimedDownloadJob): The finished job.
+            size (int): Size of the downloaded file in bytes.
+            format_ids (list[str]): yt-dlp format IDs the file was made of (e.g. video and audio format).
+
+        Returns:
+            int: The number of updated video formats.
+        """
+        jobs = DownloadJob.__table__
+        formats = YTFormat.__table__
+        videos = Video.__table__
+        await self._session.execute(
+            update(jobs)
+            .where(jobs.c.id == job.id)
+            .values(status="done", locked_until=None, last_error=None, bytes_downloaded=size, finished_at=func.now())
+        )
+        updated = 0
+        if format_ids:
+            result = await self._session.execute(
+                update(formats)
+                .where(
+                    formats.c.video_id == videos.c.id,
+                    videos.c.video_id == job.video_id,
+                    formats.c.format_id.in_(format_ids),
+                )
+                .values(file_path=job.file_path, is_downloaded=True)
+            )
+            updated = result.rowcount
+        if job.publish and job.publish_chats:
+            payload = {**(job.payload or {}), "video_file_download_path": job.file_path}
+            await self._session.execute(
+                insert_publications(
+                    [
+                        {"video_id": job.video_id, "chat_id": chat_id, "kind": "shorts", "payload": payload}
+                        for chat_id in job.publish_chats
+                    ]
+                )
+            )
+            await self._session.execute(notify_publications())
+        await self.commit()
+        return updated
+
+
+class ChannelScanJobRepository(AsyncBaseRepository):
+    """
+    Leases of channel scans (`channel_scan_jobs`), one row per channel and scan kind ("new", "history").
+
+    A worker claims due channels with `FOR UPDATE SKIP LOCKED`, so concurrent workers never get the same channel.
+    The lease expires after `lease` seconds unless the worker extends it with heartbeats, after which
+    the channel can be claimed by another worker. Only the worker holding a lease can extend or release it.
+    """
+
+    async def register(self, kind: str, channel_urls: list[str], list_name: Optional[str]) -> int:
+        """
+        Creates the jobs of channels that are not registered for `kind` yet. New jobs are due immediately.
+
+        Returns:
+            int: The number of created jobs.
+        """
+        if not channel_urls:
+            return 0
+        table = ChannelScanJob.__table__
+        result = await self._session.execute(
+            insert(table)
+            .values([{"channel_url": url, "kind": kind, "list_name": list_name} for url in channel_urls])
+            .on_conflict_do_nothing(index_elements=[table.c.channel_url, table.c.kind])
+        )
+        await self.commit()
+        return result.rowcount
+
+    async def unregister(self, kind: str) -> int:
+        """Deletes all jobs of `kind`. Returns the number of deleted jobs."""
+        result = await self._session.execute(delete(ChannelScanJob.__table__).where(ChannelScanJob.kind == kind))
+        await self.commit()
+        return result.rowcount
+
+    async def claim(self, kind: str, channel_urls: list[str], worker_id: str, lease: int, limit: int = 1) -> list[str]:
+        """
+        Leases up to `limit` due channels among `channel_urls` that are not leased or whose lease expired.
+
+        Returns:
+            list[str]: URLs of the claimed channels.
+        """
+        table = ChannelScanJob.__table__
+        now = func.now()
+        due = (
+            select(table.c.channel_url)
+            .where(
+                table.c.kind == kind,
+                table.c.channel_url.in_(channel_urls),
+                table.c.next_run_at <= now,
+                or_(table.c.lease_expires_at.is_(None), table.c.lease_expires_at < now),
+            )
+            .order_by(table.c.next_run_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self._session.execute(
+            update(table)
+            .where(table.c.kind == kind, table.c.channel_url.in_(due))
+            .values(leased_by=worker_id, lease_expires_at=now + timedelta(seconds=lease), last_started_at=now)
+            .returning(table.c.channel_url)
+        )
+        claimed = list(result.scalars().all())
+        await self.commit()
+        return claimed
+
+    async def heartbeat(self, kind: str, channel_url: str, worker_id: str, lease: int) -> bool:
+        """Extends the lease by `lease` seconds. Returns False if the lease is no longer held by `worker_id`."""
+        table = ChannelScanJob.__table__
+        result = await self._session.execute(
+            update(table)
+            .where(table.c.kind == kind, table.c.channel_url == channel_url, table.c.leased_by == worker_id)
+            .values(lease_expires_at=func.now() + timedelta(seconds=lease))
+        )
+        await self.commit()
+        return result.rowcount > 0
+
+    async def release(
+        self, kind: str, channel_url: str, worker_id: str, interval: int, error: Optional[str] = None
+    ) -> bool:
+        """
+        Releases the lease and schedules the next scan of the channel in `interval` seconds.
+
+        Returns:
+            bool: False if the lease had already been taken over by another worker.
+        """
+        table = ChannelScanJob.__table__
+        now = func.now()
+        result = await self._session.execute(
+            update(table)
+            .where(table.c.kind == kind, table.c.channel_url == channel_url, table.c.leased_by == worker_id)
+            .values(
+                leased_by=None,
+                lease_expires_at=None,
+                last_finished_at=now,
+                next_run_at=now + timedelta(seconds=interval),
+                poll_interval=interval,
+                last_error=error[:1000] if error else None,
+                scans=table.c.scans + 1,
+            )
+        )
+        await self.commit()
+        return result.rowcount > 0
+
+    async def reschedule(self, kind: str, channel_url: str, interval: int, error: Optional[str] = None) -> None:
+        """Records a finished scan of a channel that is not leased and schedules the next one in `interval` seconds."""
+        table = ChannelScanJob.__table__
+        now = func.now()
+        await self._session.execute(
+            update(table)
+            .where(table.c.kind == kind, table.c.channel_url == channel_url)
+            .values(
+                last_finished_at=now,
+                next_run_at=now + timedelta(seconds=interval),
+                poll_interval=interval,
+                last_error=error[:1000] if error else None,
+                scans=table.c.scans + 1,
+            )
+        )
+        await self.commit()
+
+    async def get_schedule(self, kind: str, channel_urls: list[str]) -> dict[str, tuple[float, Optional[int]]]:
+        """
+        Returns the schedule of the registered channels among `channel_urls`.
+
+        Returns:
+            dict[str, tuple[float, Optional[int]]]: channel_url -> (seconds until the next scan, negative if overdue;
+            poll interval in seconds or None if it was never computed).
+        """
+        table = ChannelScanJob.__table__
+        result = await self._session.execute(
+            select(
+                table.c.channel_url,
+                func.extract("epoch", table.c.next_run_at - func.now()),
+                table.c.poll_interval,
+            ).where(table.c.kind == kind, table.c.channel_url.in_(channel_urls))
+        )
+        return {url: (float(due_in or 0), interval) for url, due_in, interval in result.all()}
+
+    async def get_status(self, kind: str, channel_urls: list[str]) -> dict[str, int]:
+        """Returns the number of registered, due and currently leased channels among `channel_urls`."""
+        table = ChannelScanJob.__table__
+        now = func.now()
+        leased = and_(table.c.leased_by.is_not(None), table.c.lease_expires_at >= now)
+        result = await self._session.execute(
+            select(
+                func.count(),
+                func.count().filter(and_(table.c.next_run_at <= now, ~leased)),
+                func.count().filter(leased),
+            ).where(table.c.kind == kind, table.c.channel_url.in_(channel_urls))
+        )
+        total, due, leased_count = result.one()
+        return {"total": total, "due": due, "leased": leased_count}
+
+
+class ClaimedPublication(NamedTuple):
+    id: int
+    video_id: str  # YouTube video ID
+    chat_id: str
+    kind: str  # "video" или "shorts"
+    payload: Optional[dict]
+    attempts: int
+
+
+class TelegramOutboxRepository(LeasedJobRepository[ClaimedPublication]):
+    """
+    Outbox of Telegram publications (`telegram_outbox`), one row per video and target chat.
+
+    Rows are written in the same transaction as the video they announce (see `insert_publications`), so
+    a publication is delivered at least once. Sent rows are kept with status "sent", so the same video
+    is never queued twice for the same chat.
+    """
+
+    model = TelegramOutbox
+    job_type = ClaimedPublication
+    finished_status = "sent"
+
+    async def claim_chat(self, chat_id: str, limit: int, lease: int) -> list[ClaimedPublication]:
+        """Leases up to `limit` due publications to `chat_id` for `lease` seconds, oldest first."""
+        return await self.claim(limit, lease, TelegramOutbox.__table__.c.chat_id == chat_id)
+
+    async def get_due_chats(self) -> list[str]:
+        """Returns the chats that have publications ready to be claimed."""
+        table = TelegramOutbox.__table__
+        result = await self._session.scalars(select(table.c.chat_id).where(self._due()).distinct())
+        return list(result.all())
+
+    async def mark_sent(self, publication: ClaimedPublication) -> None:
+        """
+        Marks the publication as sent and records `videos.tg_post_date` (the first post of the video to any chat)
+        in the same transaction.
+        """
+        table = TelegramOutbox.__table__
+        videos = Video.__table__
+        now = func.now()
+        await self._session.execute(
+            update(table)
+            .where(table.c.id == publication.id)
+            .values(status="sent", locked_until=None, last_error=None, sent_at=now)
+        )
+        await self._session.execute(
+            update(videos)
+            .where(videos.c.video_id == publication.video_id)
+            .values(tg_post_date=func.coalesce(videos.c.tg_post_date, func.date_trunc("second", now)))
+        )
+        await self.commit()
@@ -1,15 +1,101 @@
-from typing import Generic, Type, TypeVar
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Generic, Iterator, Type, TypeVar
 from uuid import UUID
 
-from sqlalchemy import MetaData, create_engine, orm
+from sqlalchemy import AsyncAdaptedQueuePool, MetaData, QueuePool, create_engine, orm
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext import asyncio as async_orm
 from sqlmodel import SQLModel, select
 
 from app.config import logger, settings
 
-engine = create_engine(settings.database_url, echo=False, pool_size=10, max_overflow=20)
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool, который считает выдачи соединений, время ожидания свободного соединения и выход за pool_size."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self._metrics = {"checkouts": 0, "wait_total": 0.0, "wait_max": 0.0, "overflow_events": 0, "timeouts": 0}
+
+    def _do_get(self):
+        started = time.perf_counter()
+        overflow_before = self.overflow()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            with self._metrics_lock:
+                self._metrics["timeouts"] += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._metrics_lock:
+            self._metrics["checkouts"] += 1
+            self._metrics["wait_total"] += waited
+            self._metrics["wait_max"] = max(self._metrics["wait_max"], waited)
+            if self.overflow() > max(0, overflow_before):
+                self._metrics["overflow_events"] += 1
+        return connection
+
+    def get_metrics(self) -> dict:
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        checkouts = metrics.pop("checkouts")
+        wait_total = metrics.pop("wait_total")
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "overflow": max(0, self.overflow()),
+            "checkouts": checkouts,
+            "avg_wait": round(wait_total / checkouts, 4) if checkouts else 0.0,
+            "max_wait": round(metrics.pop("wait_max"), 4),
+            **metrics,
+        }
+
+
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """InstrumentedQueuePool для асинхронного движка (asyncpg)."""
+
+
+engine = create_engine(
+    settings.database_url,
+    echo=False,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+)
 Session = orm.sessionmaker(engine, expire_on_commit=False)
 
+# Асинхронный движок для горячих запросов мониторинга. Соединения asyncpg привязаны к событийному циклу,
+# поэтому движок используется только внутри одного asyncio.run() процесса мониторинга
+async_engine = async_orm.create_async_engine(
+    settings.async_database_url,
+    echo=False,
+    poolclass=InstrumentedAsyncAdaptedQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+)
+AsyncSession = async_orm.async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+def get_pool_metrics() -> dict:
+    """
+    Returns connection pool statistics of the current process: pool size, connections checked out right now,
+    connections above pool_size, total checkouts, average/max wait for a connection (seconds),
+    overflow events (checkouts that had to open a connection above pool_size) and pool timeouts.
+    """
+    return engine.pool.get_metrics()
+
+
+def get_async_pool_metrics() -> dict:
+    """Returns the statistics of the async engine pool of the current process. See `get_pool_metrics`."""
+    return async_engine.sync_engine.pool.get_metrics()
+
 
 class Base(SQLModel, table=False):
     metadata = MetaData(schema=settings.db_schema)
@@ -95,3 +181,74 @@ class BaseRepository(Generic[T]):
             logger.error(f"Error deleting {self.model.__name__} with PK {pk}: {e}")
             self._session.rollback()
             raise
+
+
+R = TypeVar("R", bound=BaseRepository)
+
+
+@contextmanager
+def repository_scope(repository_cls: Type[R]) -> Iterator[R]:
+    """
+    Unit of work: yields a repository bound to a new session. On exit the session is closed, an unfinished
+    transaction is rolled back and the connection is returned to the pool.
+    """
+    with Session() as session:
+        yield repository_cls(session)
+
+
+class AsyncBaseRepository:
+    """Base class of repositories bound to an `AsyncSession`."""
+
+    def __init__(self, session: async_orm.AsyncSession) -> None:
+        self._session = session
+
+    @property
+    def session(self) -> async_orm.AsyncSession:
+        return self._session
+
+    async def commit(self, commit: bool = True):
+        try:
+            if commit:
+                await self._session.commit()
+            else:
+                await self._session.flush()
+        except SQLAlchemyError as e:
+            logger.error(f"Error on commit: {e}")
+            await self._session.rollback()
+            raise
+
+
+AR = TypeVar("AR", bound=AsyncBaseRepository)
+
+
+@asynccontextmanager
+async def async_repository_scope(repository_cls: Type[AR]) -> AsyncIterator[AR]:
+    """Asynchronous counterpart of `repository_scope`."""
+    async with AsyncSession() as session:
+        yield repository_cls(session)
+
+
+async def listen(channel: str, on_notify: Callable[[str], None], check_interval: float) -> None:
+    """
+    Subscribes to the Postgres notification channel (`LISTEN`) on a dedicated asyncpg connection and calls
+    `on_notify(payload)` for every notification. The connection is checked every `check_interval` seconds
+    and re-established if it is lost. Runs until cancelled.
+    """
+
+    def callback(connection, pid: int, channel_name: str, payload: str) -> None:
+        on_notify(payload)
+
+    while True:
+        try:
+            async with async_engine.connect() as connection:
+                driver_connection = (await connection.get_raw_connection()).driver_connection
+                await driver_connection.add_listener(channel, callback)
+                try:
+                    while not driver_connection.is_closed():
+                        await asyncio.sleep(check_interval)
+                finally:
+                    if not driver_connection.is_closed():
+                        await driver_connection.remove_listener(channel, callback)
+        except Exception as e:
+            logger.error(f"Failed to listen to the notification channel {channel}: {e}")
+        await asyncio.sleep(check_interval)
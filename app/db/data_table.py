@@ -1,8 +1,9 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
 
-from sqlalchemy import ARRAY, Column, DateTime, ForeignKey, Integer, String, UniqueConstraint, text
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, ForeignKey, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.types import ARRAY, BigInteger, Boolean, Date, DateTime, Integer, String
 from sqlmodel import Field, Relationship
 
 from app.config import settings
@@ -58,14 +59,18 @@ class Channel(Base, table=True):
 
 class ChannelHistory(Base, table=True):
     __tablename__ = "channel_history"
-    __table_args__ = {"schema": settings.db_schema}
+    __table_args__ = {"schema": settings.db_schema, "postgresql_partition_by": "RANGE (recorded_at)"}
 
-    id: int = Field(default=None, primary_key=True)
+    id: int = Field(default=None, primary_key=True, sa_column_kwargs={"autoincrement": True})
     channel_id: str = Field(sa_column=Column(String, ForeignKey("channels.channel_id")))
     follower_count: int = Field(sa_column=Column(Integer))
     view_count: int = Field(sa_column=Column(Integer))
     video_count: int = Field(sa_column=Column(Integer))
-    recorded_at: datetime = Field(sa_column=Column(DateTime, default=datetime.now().replace(microsecond=0)))
+    # Первичный ключ секционированной таблицы включает ключ секционирования
+    recorded_at: datetime = Field(
+        default_factory=lambda: datetime.now().replace(microsecond=0),
+        sa_column=Column(DateTime, primary_key=True),
+    )
 
     channel: "Channel" = Relationship(back_populates="history")
 
@@ -94,7 +99,7 @@ class Video(Base, table=True):
     defaultaudiolanguage: Optional[str] = Field(default=None)
     last_update: datetime = Field(default_factory=lambda: datetime.now().replace(microsecond=0))
     # path: Optional[str] = Field(default=None)
-    # tg_post_date: Optional[datetime] = Field(default=None)
+    tg_post_date: Optional[datetime] = Field(default=None)  # Когда видео опубликовано в Telegram
 
     channel: Channel = Relationship(back_populates="videos")
     thumbnails: List["Thumbnail"] = Relationship(back_populates="video")
@@ -136,14 +141,15 @@ class Video(Base, table=True):
 
 class VideoHistory(Base, table=True):
     __tablename__ = "video_history"
-    __table_args__ = {"schema": settings.db_schema}
+    __table_args__ = {"schema": settings.db_schema, "postgresql_partition_by": "RANGE (recorded_at)"}
 
-    id: int = Field(default=None, primary_key=True)
+    id: int = Field(default=None, primary_key=True, sa_column_kwargs={"autoincrement": True})
     video_id: UUID = Field(sa_column=Column(UUID(as_uuid=True), ForeignKey("videos.id"), nullable=False))
     view_count: int = Field(nullable=True)
     like_count: int = Field(nullable=True)
     comment_count: int = Field(nullable=True)
-    recorded_at: datetime = Field(default=datetime.now().replace(microsecond=0))
+    # Первичный ключ секционированной таблицы включает ключ секционирования
+    recorded_at: datetime = Field(default_factory=lambda: datetime.now().replace(microsecond=0), primary_key=True)
 
     video: "Video" = Relationship(back_populates="history")
 
@@ -224,3 +230,103 @@ class YTFormat(Base, table=True):
 
     class Config:
         from_attributes = True
+
+
+class ApiQuotaUsage(Base, table=True):
+    """Дневной расход квоты YouTube Data API (сутки квоты отсчитываются по тихоокеанскому времени)."""
+
+    __tablename__ = "api_quota_usage"
+    __table_args__ = {"schema": settings.db_schema}
+
+    day: date = Field(sa_column=Column(Date, primary_key=True))
+    units_used: int = Field(default=0, sa_column=Column(Integer, nullable=False, server_default="0"))
+    updated_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, server_default=text("now()")))
+
+
+class FormatHarvestJob(Base, table=True):
+    """Задание очереди сбора форматов: видео, для которого ещё не сохранены форматы."""
+
+    __tablename__ = "format_harvest_queue"
+    __table_args__ = {"schema": settings.db_schema}
+
+    video_id: UUID = Field(
+        sa_column=Column(UUID(as_uuid=True), ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True)
+    )
+    status: str = Field(default="pending", sa_column=Column(String, nullable=False, server_default="pending"))
+    attempts: int = Field(default=0, sa_column=Column(Integer, nullable=False, server_default="0"))
+    available_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, server_default=text("now()")))
+    locked_until: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, nullable=True))
+    last_error: Optional[str] = Field(default=None)
+    created_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, server_default=text("now()")))
+
+
+class ChannelScanJob(Base, table=True):
+    """Аренда сканирования канала: какой процесс сканирует канал сейчас и когда канал сканировать в следующий раз."""
+
+    __tablename__ = "channel_scan_jobs"
+    __table_args__ = {"schema": settings.db_schema}
+
+    channel_url: str = Field(sa_column=Column(String, primary_key=True))
+    kind: str = Field(sa_column=Column(String, primary_key=True))  # new - новые видео, history - история
+    list_name: Optional[str] = Field(default=None)
+    next_run_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, server_default=text("now()")))
+    leased_by: Optional[str] = Field(default=None)
+    lease_expires_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, nullable=True))
+    last_started_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, nullable=True))
+    last_finished_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, nullable=True))
+    last_error: Optional[str] = Field(default=None)
+    scans: int = Field(default=0, sa_column=Column(Integer, nullable=False, server_default="0"))
+    poll_interval: Optional[int] = Field(default=None)  # Интервал до следующего сканирования (в секундах)
+
+
+class DownloadJob(Base, table=True):
+    """Задание на скачивание видео. Очередь заданий переживает перезапуск процесса."""
+
+    __tablename__ = "download_jobs"
+    __table_args__ = (
+        UniqueConstraint("video_id", "format", name="download_jobs_video_id_format_key"),
+        {"schema": settings.db_schema},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    video_id: str = Field(nullable=False)  # YouTube video ID
+    video_url: str = Field(nullable=False)
+    file_path: str = Field(nullable=False)  # Куда скачивать файл
+    format: str = Field(nullable=False)  # Селектор формата yt-dlp
+    publish: bool = Field(default=False, sa_column=Column(Boolean, nullable=False, server_default="false"))
+    publish_chats: Optional[list[str]] = Field(default=None, sa_column=Column(ARRAY(String), nullable=True))
+    payload: Optional[dict] = Field(default=None, sa_column=Column(JSONB, nullable=True))  # VideoDownloadSchema
+    status: str = Field(default="pending", sa_column=Column(String, nullable=False, server_default="pending"))
+    attempts: int = Field(default=0, sa_column=Column(Integer, nullable=False, server_default="0"))
+    available_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, server_default=text("now()")))
+    locked_until: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, nullable=True))
+    last_error: Optional[str] = Field(default=None)
+    bytes_downloaded: Optional[int] = Field(default=None, sa_column=Column(BigInteger, nullable=True))
+    created_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, server_default=text("now()")))
+    finished_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, nullable=True))
+
+
+class TelegramOutbox(Base, table=True):
+    """
+    Публикация видео в Telegram-чат. Записывается в одной транзакции с сохранением видео (или завершением
+    его скачивания), поэтому не теряется при падении процесса; в каждый чат видео публикуется не более одного раза.
+    """
+
+    __tablename__ = "telegram_outbox"
+    __table_args__ = (
+        UniqueConstraint("video_id", "chat_id", name="telegram_outbox_video_id_chat_id_key"),
+        {"schema": settings.db_schema},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    video_id: str = Field(nullable=False)  # YouTube video ID
+    chat_id: str = Field(nullable=False)  # Чат, в который публикуется видео
+    kind: str = Field(nullable=False)  # "video" - сообщение со ссылкой, "shorts" - скачанное видео
+    payload: Optional[dict] = Field(default=None, sa_column=Column(JSONB, nullable=True))  # NewVideoSchema
+    status: str = Field(default="pending", sa_column=Column(String, nullable=False, server_default="pending"))
+    attempts: int = Field(default=0, sa_column=Column(Integer, nullable=False, server_default="0"))
+    available_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, server_default=text("now()")))
+    locked_until: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, nullable=True))
+    last_error: Optional[str] = Field(default=None)
+    created_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, server_default=text("now()")))
+    sent_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, nullable=True))
@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+
+from app.config import logger, settings
+from app.db.async_repository import AsyncYoutubeDataRepository
+from app.db.base import async_repository_scope
+
+
+class KnownVideoCache:
+    """
+    Per-process write-through cache of the YouTube video IDs already stored for each channel.
+
+    The cache only ever proves that a video is known: videos are never deleted, so a cached ID is always
+    in the database. IDs missing from the cache are confirmed against the database with one indexed lookup,
+    because another monitor process may have inserted them. Memory is bounded by keeping at most
+    `max_channels` channels, evicting the least recently used one. Database lookups go through the async
+    repository, so the cache is used from the event loop of the monitor process.
+    """
+
+    def __init__(self, max_channels: int = settings.known_videos_cache_channels):
+        self._max_channels = max(1, max_channels)
+        self._videos: OrderedDict[str, set[str]] = OrderedDict()  # channel_id -> id видео канала в БД
+        self._channels: set[str] = set()  # channel_id каналов, которые есть в БД
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "confirmed_new": 0}
+
+    async def warm(self) -> None:
+        """Loads the known channels and the videos of the most recently updated channels in one query each."""
+        async with async_repository_scope(AsyncYoutubeDataRepository) as repository:
+            channel_ids = await repository.get_channel_ids()
+            videos = await repository.get_video_ids_by_channel(limit_channels=self._max_channels)
+        with self._lock:
+            self._channels = channel_ids
+            self._videos = OrderedDict((channel_id, video_ids) for channel_id, video_ids in videos.items())
+        logger.info(f"Known video cache warmed: {len(self._videos)} channels, {self._video_count()} videos")
+
+    def _video_count(self) -> int:
+        return sum(len(video_ids) for video_ids in self._videos.values())
+
+    async def _get_channel_videos(self, channel_id: str) -> set[str]:
+        with self._lock:
+            video_ids = self._videos.get(channel_id)
+            if video_ids is not None:
+                self._videos.move_to_end(channel_id)
+                self.stats["hits"] += 1
+                return video_ids
+            self.stats["misses"] += 1
+
+        async with async_repository_scope(AsyncYoutubeDataRepository) as repository:
+            video_ids = await repository.get_channel_video_ids(channel_id)
+        with self._lock:
+            self._videos[channel_id] = video_ids
+            self._videos.move_to_end(channel_id)
+            while len(self._videos) > self._max_channels:
+                self._videos.popitem(last=False)
+                self.stats["evictions"] += 1
+        return video_ids
+
+    async def split_new_known(self, channel_id: str, video_ids: list[str]) -> tuple[list[str], list[str]]:
+        """
+        Splits `video_ids` of a channel into new ones (absent from the database) and known ones, keeping the order.
+        """
+        cached = await self._get_channel_videos(channel_id)
+        candidates = [video_id for video_id in video_ids if video_id not in cached]
+        if candidates:
+            async with async_repository_scope(AsyncYoutubeDataRepository) as repository:
+                stored = await repository.get_existing_video_ids(candidates)
+            if stored:
+                self.add(channel_id, stored)
+        else:
+            stored = set()
+        new_ids = [video_id for video_id in candidates if video_id not in stored]
+        with self._lock:
+            self.stats["confirmed_new"] += len(new_ids)
+        new_set = set(new_ids)
+        return new_ids, [video_id for video_id in video_ids if video_id not in new_set]
+
+    def add(self, channel_id: str, video_ids) -> None:
+        """Records videos written to the database. Channels that are not cached are loaded on their next use."""
+        with self._lock:
+            self._channels.add(channel_id)
+            if channel_id in self._videos:
+                self._videos[channel_id].update(video_ids)
+
+    async def has_channel(self, channel_id: str) -> bool:
+        with self._lock:
+            if channel_id in self._channels:
+                return True
+        async with async_repository_scope(AsyncYoutubeDataRepository) as repository:
+            exists = await repository.channel_exists(channel_id)
+        if exists:
+            self.add_channel(channel_id)
+        return exists
+
+    def add_channel(self, channel_id: str) -> None:
+        with self._lock:
+            self._channels.add(channel_id)
+
+    def get_stats(self) -> dict[str, int]:
+        with self._lock:
+            return {**self.stats, "channels": len(self._videos), "videos": self._video_count()}
+
+
+known_videos = KnownVideoCache()
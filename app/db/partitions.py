@@ -0,0 +1,192 @@
+"""
+Monthly range partitions of the history tables (`video_history`, `channel_history`) by `recorded_at`.
+
+The parent tables are partitioned by the migration 7b2e4c9d1a53. Writers keep inserting into the parents,
+Postgres routes every row to its month partition, and rows outside the existing partitions land
+in the `<table>_default` partition until the month partition is created.
+
+Usage from the project root:
+    python -m app.db.partitions ensure
+    python -m app.db.partitions archive --older-than 12
+"""
+
+import argparse
+import re
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import Connection, text
+
+from app.config import logger, settings
+from app.db.base import engine
+
+HISTORY_TABLES = ("video_history", "channel_history")
+# Произвольный ключ advisory-блокировки, чтобы процессы мониторинга не создавали секции одновременно
+_PARTITIONS_LOCK_ID = 7_202_610
+
+
+def month_start(value: date | datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def create_month_partition(connection: Connection, table: str, month: date) -> Optional[str]:
+    """
+    Creates the partition of `table` for the month starting at `month` if it does not exist yet.
+
+    Rows of that month already stored in the default partition are moved into the new partition,
+    otherwise Postgres would refuse to attach it.
+
+    Args:
+        connection (Connection): Connection inside an open transaction.
+        table (str): Partitioned parent table name (one of HISTORY_TABLES).
+        month (date): First day of the month.
+
+    Returns:
+        Optional[str]: The name of the created partition, or None if it already existed.
+    """
+    schema = settings.db_schema
+    name = partition_name(table, month)
+    if connection.execute(text("SELECT to_regclass(:name)"), {"name": f"{schema}.{name}"}).scalar():
+        return None
+
+    start, end = month, add_months(month, 1)
+    connection.execute(text(f"CREATE TABLE {schema}.{name} (LIKE {schema}.{table} INCLUDING DEFAULTS)"))
+    connection.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {schema}.{table}_default "
+            f"WHERE recorded_at >= :start AND recorded_at < :end RETURNING *) "
+            f"INSERT INTO {schema}.{name} SELECT * FROM moved"
+        ),
+        {"start": start, "end": end},
+    )
+    connection.execute(
+        text(
+            f"ALTER TABLE {schema}.{table} ATTACH PARTITION {schema}.{name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    )
+    return name
+
+
+def list_month_partitions(connection: Connection, table: str) -> list[tuple[str, date]]:
+    """Returns (partition name, first day of month) of every month partition attached to `table`, oldest first."""
+    rows = connection.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+            "JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_namespace ON pg_namespace.oid = parent.relnamespace "
+            "WHERE pg_namespace.nspname = :schema AND parent.relname = :table"
+        ),
+        {"schema": settings.db_schema, "table": table},
+    ).scalars()
+    pattern = re.compile(rf"^{table}_p(\d{{4}})(\d{{2}})$")
+    partitions = []
+    for name in rows:
+        if match := pattern.match(name):
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def ensure_history_partitions(
+    connection: Connection, months_ahead: int = settings.history_partitions_ahead
+) -> list[str]:
+    """
+    Creates the partitions of the history tables for the current month and `months_ahead` upcoming months.
+
+    Returns:
+        list[str]: Names of the created partitions.
+    """
+    connection.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": _PARTITIONS_LOCK_ID})
+    current_month = month_start(datetime.now())
+    created = []
+    for table in HISTORY_TABLES:
+        for offset in range(max(0, months_ahead) + 1):
+            if name := create_month_partition(connection, table, add_months(current_month, offset)):
+                created.append(name)
+    return created
+
+
+def archive_history_partitions(
+    connection: Connection,
+    older_than_months: int,
+    archive_schema: Optional[str] = settings.history_archive_schema,
+) -> list[str]:
+    """
+    Detaches month partitions that end more than `older_than_months` months before the current month.
+
+    Detached partitions are moved into `archive_schema` (and stay queryable there) or dropped
+    if `archive_schema` is empty.
+
+    Returns:
+        list[str]: Names of the detached partitions.
+    """
+    if older_than_months <= 0:
+        return []
+    connection.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": _PARTITIONS_LOCK_ID})
+    schema = settings.db_schema
+    cutoff = add_months(month_start(datetime.now()), -older_than_months)
+    if archive_schema:
+        connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+    detached = []
+    for table in HISTORY_TABLES:
+        for name, month in list_month_partitions(connection, table):
+            if add_months(month, 1) > cutoff:
+                break
+            connection.execute(text(f"ALTER TABLE {schema}.{table} DETACH PARTITION {schema}.{name}"))
+            if archive_schema:
+                connection.execute(text(f"ALTER TABLE {schema}.{name} SET SCHEMA {archive_schema}"))
+            else:
+                connection.execute(text(f"DROP TABLE {schema}.{name}"))
+            detached.append(name)
+    return detached
+
+
+def maintain_history_partitions() -> None:
+    """Creates upcoming history partitions and archives expired ones according to the settings."""
+    try:
+        with engine.begin() as connection:
+            created = ensure_history_partitions(connection)
+            archived = archive_history_partitions(connection, settings.history_retention_months)
+    except Exception as e:
+        logger.error(f"Failed to maintain history partitions: {e}")
+        return
+    if created:
+        logger.info(f"Created history partitions: {', '.join(created)}")
+    if archived:
+        logger.info(f"Archived history partitions: {', '.join(archived)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ensure_parser = subparsers.add_parser("ensure", help="Create partitions for the current and upcoming months")
+    ensure_parser.add_argument("--months-ahead", type=int, default=settings.history_partitions_ahead)
+    archive_parser = subparsers.add_parser("archive", help="Detach partitions older than N months")
+    archive_parser.add_argument("--older-than", type=int, required=True, help="Retention in months")
+    archive_parser.add_argument(
+        "--archive-schema",
+        default=settings.history_archive_schema,
+        help="Schema for detached partitions; pass an empty string to drop them",
+    )
+    args = parser.parse_args()
+
+    with engine.begin() as connection:
+        if args.command == "ensure":
+            names = ensure_history_partitions(connection, args.months_ahead)
+        else:
+            names = archive_history_partitions(connection, args.older_than, args.archive_schema)
+    print("\n".join(names) if names else "Nothing to do")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,38 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from pathlib import Path
 from typing import Optional, Union
 from uuid import UUID, uuid4
 
-from sqlalchemy import or_
+from sqlalchemy import BigInteger, String, cast, column, delete, func, literal_column, or_, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError, NoResultFound, SQLAlchemyError
+from sqlalchemy.sql.dml import Insert
 
-from app.config import logger
+from app.config import logger, settings
 from app.db.base import BaseRepository
-from app.db.data_table import Channel, ChannelHistory, Tag, Thumbnail, Video, VideoHistory, VideoTag, YTFormat
+from app.db.data_table import ApiQuotaUsage, Channel, ChannelHistory, Tag, TelegramOutbox, Thumbnail
+
+# isort: split
+from app.db.data_table import Video, VideoHistory, VideoTag, YTFormat
 from app.schema import ChannelAPIInfoSchema, ChannelInfoSchema, ThumbnailSchema, VideoSchema, YTFormatSchema
 
+TELEGRAM_OUTBOX_CHANNEL = "telegram_outbox"  # LISTEN/NOTIFY channel announcing new Telegram publications
+
+
+def insert_publications(rows: list[dict]) -> Insert:
+    """
+    Builds an insert of Telegram publications (`telegram_outbox` rows with "video_id", "chat_id", "kind" and
+    "payload") that skips videos already queued for the same chat, so a video is published to a chat at most once.
+    """
+    table = TelegramOutbox.__table__
+    return insert(table).values(rows).on_conflict_do_nothing(index_elements=[table.c.video_id, table.c.chat_id])
+
+
+def notify_publications():
+    """Statement announcing new publications to the bot; delivered when the transaction commits."""
+    return select(func.pg_notify(TELEGRAM_OUTBOX_CHANNEL, ""))
+
 
 class YoutubeDataRepository(BaseRepository[Channel]):
     model = Channel
@@ -119,6 +141,141 @@ class YoutubeDataRepository(BaseRepository[Channel]):
         logger.info(f"Video '{video_schema.title}' metadata added successfully.")
         return video
 
+    def bulk_upsert_videos(
+        self,
+        video_schemas: list[VideoSchema],
+        channel_id: str,
+        add_history: bool = True,
+        batch_size: int = 500,
+        publications: Optional[list[dict]] = None,
+    ) -> dict[str, str]:
+        """
+        Inserts or updates many videos of one channel using set-based statements.
+
+        Args:
+            video_schemas (list[VideoSchema]): The videos to write.
+            channel_id (str): The ID of the channel to which the videos belong.
+            add_history (bool): Whether to append a VideoHistory row for every written video.
+            batch_size (int): Number of videos written per transaction.
+            publications (list[dict], optional): Telegram publications (`insert_publications` rows) to put into
+                `telegram_outbox` for the videos that are inserted, in the same transaction as the videos.
+
+        Returns:
+            dict[str, str]: Outcome per YouTube video ID: "inserted", "updated" or "failed".
+
+        Raises:
+            ValueError: If the channel does not exist in the database.
+
+        Description:
+            Each batch is written in a single transaction: videos via `INSERT ... ON CONFLICT (video_id) DO UPDATE`,
+            then tags, video-tag links and thumbnails via `INSERT ... ON CONFLICT DO NOTHING` (the previous tag links
+            of updated videos are deleted first, so their tags match the current ones), the history rows
+            as one multi-row insert, and finally the publications of the newly inserted videos. If a batch fails,
+            it is rolled back and its videos are reported as "failed" while the remaining batches are still written.
+        """
+        if not self._session.get(Channel, channel_id):
+            logger.error(f"Channel with ID {channel_id} not found.")
+            raise ValueError("Channel not found")
+
+        # Последняя версия видео побеждает, иначе ON CONFLICT DO UPDATE упадёт на дубликатах внутри одного запроса
+        unique_videos = list({video.id: video for video in video_schemas}.values())
+        outcomes: dict[str, str] = {}
+        for start in range(0, len(unique_videos), batch_size):
+            batch = unique_videos[start : start + batch_size]
+            try:
+                outcomes.update(self._upsert_videos_batch(batch, channel_id, add_history, publications or []))
+                self._session.commit()
+            except SQLAlchemyError as e:
+                self._session.rollback()
+                logger.error(f"Failed to upsert batch of {len(batch)} videos for channel {channel_id}: {e}")
+                outcomes.update({video.id: "failed" for video in batch})
+        return outcomes
+
+    def _upsert_videos_batch(
+        self, video_schemas: list[VideoSchema], channel_id: str, add_history: bool, publications: list[dict]
+    ) -> dict[str, str]:
+        """Writes one batch of videos and their related rows without committing. See `bulk_upsert_videos`."""
+        videos_table = Video.__table__
+        video_rows = [Video.from_schema(video, channel_id).model_dump(exclude={"id"}) for video in video_schemas]
+        insert_videos = insert(videos_table)
+        excluded = insert_videos.excluded
+        insert_videos = insert_videos.on_conflict_do_update(
+            index_elements=[videos_table.c.video_id],
+            set_={
+                "title": excluded.title,
+                "description": excluded.description,
+                "url": excluded.url,
+                "duration": func.coalesce(func.nullif(excluded.duration, 0), videos_table.c.duration),
+                "view_count": excluded.view_count,
+                "like_count": excluded.like_count,
+                "comment_count": excluded.comment_count,
+                "upload_date": func.coalesce(excluded.upload_date, videos_table.c.upload_date),
+                "defaultaudiolanguage": excluded.defaultaudiolanguage,
+                "last_update": excluded.last_update,
+            },
+        ).returning(videos_table.c.id, videos_table.c.video_id, literal_column("xmax = 0").label("inserted"))
+        written = self._session.execute(insert_videos, video_rows).all()
+        uuid_by_video_id: dict[str, UUID] = {row.video_id: row.id for row in written}
+        outcomes = {row.video_id: "inserted" if row.inserted else "updated" for row in written}
+
+        # Теги и связи видео-тег. У уже сохранённых видео старые связи удаляются, чтобы снятые на YouTube теги
+        # не оставались привязанными
+        updated_uuids = [row.id for row in written if not row.inserted]
+        if updated_uuids:
+            self._session.execute(delete(VideoTag.__table__).where(VideoTag.__table__.c.video_id.in_(updated_uuids)))
+        tag_names = sorted({tag for video in video_schemas for tag in video.tags})
+        if tag_names:
+            self._session.execute(
+                insert(Tag.__table__).on_conflict_do_nothing(index_elements=["name"]),
+                [{"name": name} for name in tag_names],
+            )
+            tag_ids = dict(self._session.query(Tag.name, Tag.id).filter(Tag.name.in_(tag_names)).all())
+            video_tag_rows = [
+                {"video_id": uuid_by_video_id[video.id], "tag_id": tag_ids[tag]}
+                for video in video_schemas
+                for tag in set(video.tags)
+                if tag in tag_ids
+            ]
+            self._session.execute(insert(VideoTag.__table__).on_conflict_do_nothing(), video_tag_rows)
+
+        # Миниатюры
+        thumbnail_rows = [
+            {
+                "url": thumbnail.url,
+                "width": thumbnail.width,
+                "height": thumbnail.height,
+                "thumbnail_id": thumbnail.id,
+                "video_id": uuid_by_video_id[video.id],
+            }
+            for video in video_schemas
+            for thumbnail in video.thumbnails
+        ]
+        if thumbnail_rows:
+            self._session.execute(
+                insert(Thumbnail.__table__).on_conflict_do_nothing(index_elements=["url"]), thumbnail_rows
+            )
+
+        if add_history:
+            recorded_at = datetime.now().replace(microsecond=0)
+            history_rows = [
+                {
+                    "video_id": uuid_by_video_id[video.id],
+                    "view_count": video.view_count,
+                    "like_count": video.like_count,
+                    "comment_count": video.commentCount,
+                    "recorded_at": recorded_at,
+                }
+                for video in video_schemas
+            ]
+            self._session.execute(insert(VideoHistory.__table__), history_rows)
+
+        # Публикации в Telegram только для впервые сохранённых видео
+        publication_rows = [row for row in publications if outcomes.get(row["video_id"]) == "inserted"]
+        if publication_rows:
+            self._session.execute(insert_publications(publication_rows))
+            self._session.execute(notify_publications())
+        return outcomes
+
     def add_tag(self, tag_name: str) -> Tag:
         """
         Adds a new tag to the database or returns the existing one.
@@ -286,6 +443,185 @@ class YoutubeDataRepository(BaseRepository[Channel]):
         )
         self.add(video_history)
 
+    def bulk_record_video_history(self, video_schemas: list[VideoSchema], batch_size: int = 1000) -> dict[str, int]:
+        """
+        Updates already stored videos and records their history snapshots in batches.
+
+        Args:
+            video_schemas (list[VideoSchema]): Fresh data for videos that already exist in the database.
+            batch_size (int): Number of videos processed per transaction.
+
+        Returns:
+            dict[str, int]: Counters: "updated" videos, "tags_updated" videos, "history" rows written,
+            "history_skipped" unchanged snapshots and "missing" videos that were not found in the database.
+
+        Description:
+            For every batch the YouTube IDs are resolved to internal UUIDs with one query. Only videos whose
+            title, description, counters or audio language changed are written, with a single
+            `UPDATE ... FROM (VALUES ...)` statement. Tag links are rewritten only for videos whose tag set
+            differs from the stored one. The latest VideoHistory snapshot of every video is fetched with one
+            query, and a new row is appended (with one multi-row insert) only if the view, like or comment
+            counters changed or the latest snapshot is older than `settings.video_history_heartbeat` seconds.
+        """
+        totals = {"updated": 0, "tags_updated": 0, "history": 0, "history_skipped": 0, "missing": 0}
+        unique_videos = list({video.id: video for video in video_schemas}.values())
+        for start in range(0, len(unique_videos), batch_size):
+            batch = unique_videos[start : start + batch_size]
+            try:
+                for key, count in self._record_video_history_batch(batch).items():
+                    totals[key] += count
+                self._session.commit()
+            except SQLAlchemyError as e:
+                self._session.rollback()
+                logger.error(f"Failed to record history for batch of {len(batch)} videos: {e}")
+        return totals
+
+    def _record_video_history_batch(self, video_schemas: list[VideoSchema]) -> dict[str, int]:
+        """Processes one batch without committing. See `bulk_record_video_history`."""
+        videos_table = Video.__table__
+        stored = {
+            row.video_id: row
+            for row in self._session.execute(
+                videos_table.select().where(videos_table.c.video_id.in_([video.id for video in video_schemas]))
+            )
+        }
+        found = [video for video in video_schemas if video.id in stored]
+        now = datetime.now().replace(microsecond=0)
+
+        # Одним UPDATE обновляем только изменившиеся видео
+        changed_rows = []
+        for video in found:
+            row = stored[video.id]
+            fresh = (
+                video.title,
+                video.description,
+                video.view_count,
+                video.like_count,
+                video.commentCount,
+                video.defaultAudioLanguage,
+            )
+            current = (
+                row.title,
+                row.description,
+                row.view_count,
+                row.like_count,
+                row.comment_count,
+                row.defaultaudiolanguage,
+            )
+            if fresh != current:
+                changed_rows.append((str(row.id), *fresh))
+        if changed_rows:
+            data = values(
+                column("id", String),
+                column("title", String),
+                column("description", String),
+                column("view_count", BigInteger),
+                column("like_count", BigInteger),
+                column("comment_count", BigInteger),
+                column("defaultaudiolanguage", String),
+                name="data",
+            ).data(changed_rows)
+            self._session.execute(
+                update(videos_table)
+                .where(videos_table.c.id == cast(data.c.id, PG_UUID(as_uuid=True)))
+                .values(
+                    title=data.c.title,
+                    description=data.c.description,
+                    view_count=cast(data.c.view_count, BigInteger),
+                    like_count=cast(data.c.like_count, BigInteger),
+                    comment_count=cast(data.c.comment_count, BigInteger),
+                    defaultaudiolanguage=data.c.defaultaudiolanguage,
+                    last_update=now,
+                )
+            )
+
+        # Перезаписываем связи с тегами только там, где набор тегов изменился
+        stored_tags: dict[UUID, set[str]] = {}
+        for video_uuid, tag_name in (
+            self._session.query(VideoTag.video_id, Tag.name)
+            .join(Tag, Tag.id == VideoTag.tag_id)
+            .filter(VideoTag.video_id.in_([stored[video.id].id for video in found]))
+        ):
+            stored_tags.setdefault(video_uuid, set()).add(tag_name)
+        retagged = [video for video in found if set(video.tags or []) != stored_tags.get(stored[video.id].id, set())]
+        if retagged:
+            # Старые связи удаляются и у видео, у которых теги пропали совсем
+            self._session.execute(
+                delete(VideoTag.__table__).where(
+                    VideoTag.__table__.c.video_id.in_([stored[video.id].id for video in retagged])
+                )
+            )
+            tag_names = sorted({tag for video in retagged for tag in video.tags or []})
+            if tag_names:
+                self._session.execute(
+                    insert(Tag.__table__).on_conflict_do_nothing(index_elements=["name"]),
+                    [{"name": name} for name in tag_names],
+                )
+                tag_ids = dict(self._session.query(Tag.name, Tag.id).filter(Tag.name.in_(tag_names)).all())
+                self._session.execute(
+                    insert(VideoTag.__table__).on_conflict_do_nothing(),
+                    [
+                        {"video_id": stored[video.id].id, "tag_id": tag_ids[tag]}
+                        for video in retagged
+                        for tag in set(video.tags or [])
+                        if tag in tag_ids
+                    ],
+                )
+
+        # Новый снимок истории пишем, только если счётчики изменились или сработал heartbeat
+        last_snapshots = self.get_last_video_snapshots([stored[video.id].id for video in found])
+        heartbeat_deadline = now - timedelta(seconds=settings.video_history_heartbeat)
+        history_rows = []
+        for video in found:
+            video_uuid = stored[video.id].id
+            counters = (video.view_count, video.like_count, video.commentCount)
+            last_snapshot = last_snapshots.get(video_uuid)
+            if (
+                last_snapshot is None
+                or (last_snapshot.view_count, last_snapshot.like_count, last_snapshot.comment_count) != counters
+                or last_snapshot.recorded_at is None
+                or last_snapshot.recorded_at <= heartbeat_deadline
+            ):
+                history_rows.append(
+                    {
+                        "video_id": video_uuid,
+                        "view_count": video.view_count,
+                        "like_count": video.like_count,
+                        "comment_count": video.commentCount,
+                        "recorded_at": now,
+                    }
+                )
+        if history_rows:
+            self._session.execute(insert(VideoHistory.__table__), history_rows)
+        return {
+            "updated": len(changed_rows),
+            "tags_updated": len(retagged),
+            "history": len(history_rows),
+            "history_skipped": len(found) - len(history_rows),
+            "missing": len(video_schemas) - len(found),
+        }
+
+    def get_last_video_snapshots(self, video_ids: list[UUID]) -> dict[UUID, VideoHistory]:
+        """
+        Returns the most recent VideoHistory row for each of the given internal video UUIDs.
+
+        Args:
+            video_ids (list[UUID]): Internal video UUIDs (`videos.id`).
+
+        Returns:
+            dict[UUID, VideoHistory]: The latest snapshot per video. Videos without history are absent.
+        """
+        if not video_ids:
+            return {}
+        snapshots = (
+            self._session.query(VideoHistory)
+            .filter(VideoHistory.video_id.in_(video_ids))
+            .order_by(VideoHistory.video_id, VideoHistory.recorded_at.desc(), VideoHistory.id.desc())
+            .distinct(VideoHistory.video_id)
+            .all()
+        )
+        return {snapshot.video_id: snapshot for snapshot in snapshots}
+
     def get_channel_by_id(self, channel_id: str) -> Optional[Channel]:
         channel: Channel = self.session.query(Channel).filter_by(channel_id=channel_id).first()
         if channel:
@@ -458,6 +794,47 @@ class YoutubeDataRepository(BaseRepository[Channel]):
         new_v_ids = [v_id for v_id in video_ids if v_id not in existing_v_ids]
         return new_v_ids, existing_v_ids
 
+    def get_existing_video_ids(self, video_ids: list[str]) -> set[str]:
+        """
+        Returns the subset of the given YouTube video IDs that are already stored in the database.
+
+        Args:
+            video_ids (list[str]): A list of YouTube video IDs to check.
+
+        Returns:
+            set[str]: Video IDs from `video_ids` that exist in the 'videos' table.
+        """
+        if not video_ids:
+            return set()
+        return {v_id[0] for v_id in self.session.query(Video.video_id).filter(Video.video_id.in_(video_ids)).all()}
+
+    def get_channel_video_ids(self, channel_id: str) -> set[str]:
+        """Returns the YouTube IDs of all videos of the channel stored in the database."""
+        return {v_id[0] for v_id in self.session.query(Video.video_id).filter(Video.channel_id == channel_id).all()}
+
+    def get_video_ids_by_channel(self, limit_channels: int) -> dict[str, set[str]]:
+        """
+        Returns the YouTube video IDs of the `limit_channels` most recently updated channels in one query.
+
+        Args:
+            limit_channels (int): Maximum number of channels to return.
+
+        Returns:
+            dict[str, set[str]]: channel_id -> video IDs, from the least to the most recently updated channel.
+        """
+        rows = (
+            self.session.query(Video.channel_id, func.array_agg(Video.video_id))
+            .group_by(Video.channel_id)
+            .order_by(func.max(Video.last_update).desc())
+            .limit(limit_channels)
+            .all()
+        )
+        return {channel_id: set(video_ids) for channel_id, video_ids in reversed(rows)}
+
+    def get_channel_ids(self) -> set[str]:
+        """Returns the IDs of all channels stored in the database."""
+        return {row[0] for row in self.session.query(Channel.channel_id).all()}
+
     def upsert_channel(
         self, channel_data: Union[ChannelInfoSchema, ChannelAPIInfoSchema], channels_list_name: str
     ) -> Channel:
@@ -696,3 +1073,65 @@ class YoutubeVideoRepository(BaseRepository[Video]):
             if video:
                 video.tg_post_date = datetime.now().replace(microsecond=0)
                 self._session.commit()
+
+
+class ApiQuotaRepository(BaseRepository[ApiQuotaUsage]):
+    model = ApiQuotaUsage
+
+    def spend(self, day: date, units: int, limit: int) -> Optional[int]:
+        """
+        Atomically adds `units` to the quota spent on `day` unless the total would exceed `limit`.
+
+        Args:
+            day (date): Quota day.
+            units (int): Units to spend.
+            limit (int): Maximum total spend allowed for the caller.
+
+        Returns:
+            Optional[int]: The new total spend, or None if the spend was refused.
+        """
+        if units > limit:
+            return None
+        table = ApiQuotaUsage.__table__
+        statement = (
+            insert(table)
+            .values(day=day, units_used=units)
+            .on_conflict_do_update(
+                index_elements=[table.c.day],
+                set_={"units_used": table.c.units_used + units, "updated_at": func.now()},
+                where=table.c.units_used + units <= limit,
+            )
+            .returning(table.c.units_used)
+        )
+        try:
+            used = self._session.execute(statement).scalar()
+            self._session.commit()
+            return used
+        except SQLAlchemyError as e:
+            self._session.rollback()
+            logger.error(f"Error spending API quota for {day}: {e}")
+            raise
+
+    def mark_exhausted(self, day: date, limit: int) -> None:
+        """Sets the spend of `day` to at least `limit`, e.g. after the API itself reported the quota as exceeded."""
+        table = ApiQuotaUsage.__table__
+        statement = (
+            insert(table)
+            .values(day=day, units_used=limit)
+            .on_conflict_do_update(
+                index_elements=[table.c.day],
+                set_={"units_used": func.greatest(table.c.units_used, limit), "updated_at": func.now()},
+            )
+        )
+        try:
+            self._session.execute(statement)
+            self._session.commit()
+        except SQLAlchemyError as e:
+            self._session.rollback()
+            logger.error(f"Error marking API quota for {day} as exhausted: {e}")
+            raise
+
+    def get_used(self, day: date) -> int:
+        """Returns the quota units spent on `day`."""
+        used = self._session.query(ApiQuotaUsage.units_used).filter(ApiQuotaUsage.day == day).scalar()
+        return used or 0
@@ -4,7 +4,7 @@ from telegram import Update
 from telegram.ext import Application, BaseHandler, CommandHandler, MessageHandler, filters
 
 from app.config import settings
-from app.integrations.telegram.commands import start, start_command
+from app.integrations.telegram.commands import quota_command, start, start_command
 from app.integrations.telegram.messages import handle_message, send_test_message, send_test_shorts_video
 
 # set higher logging level for httpx to avoid all GET and POST requests being logged
@@ -21,6 +21,7 @@ def get_telegram_handlers(test_mode: bool = False) -> list[BaseHandler]:
         ]
     return [
         CommandHandler("start", start_command),
+        CommandHandler("quota", quota_command),
         MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message),
     ]
 
@@ -1,6 +1,11 @@
+import asyncio
+
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from app.config import settings
+from app.integrations.ytquota import QuotaAccountant
+
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /start is issued."""
@@ -11,3 +16,15 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка команды /start."""
     await update.message.reply_text("Привет! Я Telegram-бот. Напишите мне что-нибудь.")
+
+
+async def quota_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /quota: расход и остаток квоты YouTube Data API (только для администратора)."""
+    if update.effective_user is None or update.effective_user.id != settings.tg_admin_id:
+        return
+    report = await asyncio.to_thread(QuotaAccountant().get_report)
+    available = "\n".join(f"  {priority}: {units}" for priority, units in report["available"].items())
+    await update.message.reply_text(
+        f"Квота YouTube API на {report['day']}: израсходовано {report['used']} из {report['limit']}, "
+        f"осталось {report['remaining']}.\nДоступно по приоритетам:\n{available}"
+    )
@@ -0,0 +1,108 @@
+import atexit
+import os
+import threading
+import time
+from typing import Optional
+
+import httplib2
+from sshtunnel import BaseSSHTunnelForwarderError, SSHTunnelForwarder
+
+from app.config import logger, settings
+
+
+class ManagedSSHTunnel:
+    """
+    Общий для процесса SSH-туннель к YouTube API.
+
+    Туннель открывается при первом запросе и дальше переиспользуется всеми потоками. Перед выдачей
+    настроек прокси состояние туннеля проверяется (не чаще раза в `check_interval` секунд), и упавший туннель
+    пересоздаётся. Настройки прокси передаются HTTP-клиенту явно, переменные окружения не изменяются.
+    """
+
+    def __init__(
+        self,
+        remote_host: str = settings.ssh_tunnel_remote_host,
+        remote_port: int = settings.ssh_tunnel_remote_port,
+        local_port: int = settings.ssh_tunnel_local_port,
+        check_interval: float = settings.ssh_tunnel_check_interval,
+    ):
+        self._remote_bind_address = (remote_host, remote_port)
+        self._local_port = local_port
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._forwarder: Optional[SSHTunnelForwarder] = None
+        self._last_check = 0.0
+        self.stats = {"starts": 0, "restarts": 0}
+
+    def _start(self) -> None:
+        forwarder = SSHTunnelForwarder(
+            (settings.ssh_host, settings.ssh_port),
+            ssh_username=settings.ssh_user,
+            ssh_pkey=settings.ssh_private_key,
+            remote_bind_address=self._remote_bind_address,
+            local_bind_address=("127.0.0.1", self._local_port),
+            set_keepalive=30.0,
+        )
+        forwarder.start()
+        self._forwarder = forwarder
+        self._last_check = time.monotonic()
+        self.stats["starts"] += 1
+        logger.info(
+            f"SSH tunnel to {settings.ssh_host} is up: 127.0.0.1:{self._forwarder.local_bind_port} -> "
+            f"{self._remote_bind_address[0]}:{self._remote_bind_address[1]}"
+        )
+
+    def _stop(self) -> None:
+        if self._forwarder is not None:
+            try:
+                self._forwarder.stop()
+            except BaseSSHTunnelForwarderError as e:
+                logger.warning(f"Error while stopping SSH tunnel: {e}")
+            self._forwarder = None
+
+    def _is_healthy(self) -> bool:
+        if self._forwarder is None or not self._forwarder.is_active:
+            return False
+        self._forwarder.check_tunnels()
+        return all(self._forwarder.tunnel_is_up.values())
+
+    def ensure(self, force_check: bool = False) -> int:
+        """Открывает туннель или пересоздаёт его, если он упал. Возвращает локальный порт туннеля."""
+        with self._lock:
+            if self._forwarder is None:
+                self._start()
+            elif force_check or time.monotonic() - self._last_check >= self._check_interval:
+                self._last_check = time.monotonic()
+                if not self._is_healthy():
+                    self.stats["restarts"] += 1
+                    logger.warning("SSH tunnel is down. Reconnecting...")
+                    self._stop()
+                    self._start()
+            return self._forwarder.local_bind_port
+
+    def proxy_info(self, scheme: str = "https") -> httplib2.ProxyInfo:
+        """
+        Настройки прокси для httplib2. Передаётся в `httplib2.Http(proxy_info=...)` как функция,
+        чтобы каждое новое соединение проверяло туннель.
+        """
+        return httplib2.ProxyInfo(httplib2.socks.PROXY_TYPE_HTTP, "127.0.0.1", self.ensure())
+
+    def close(self) -> None:
+        with self._lock:
+            self._stop()
+
+
+_tunnel: Optional[ManagedSSHTunnel] = None
+_tunnel_pid: Optional[int] = None
+_tunnel_lock = threading.Lock()
+
+
+def get_ssh_tunnel() -> ManagedSSHTunnel:
+    """Возвращает SSH-туннель текущего процесса. После fork дочерний процесс открывает собственный туннель."""
+    global _tunnel, _tunnel_pid
+    with _tunnel_lock:
+        if _tunnel is None or _tunnel_pid != os.getpid():
+            _tunnel = ManagedSSHTunnel()
+            _tunnel_pid = os.getpid()
+            atexit.register(_tunnel.close)
+        return _tunnel
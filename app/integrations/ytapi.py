@@ -1,25 +1,46 @@
+import asyncio
 import os
 import pickle
+import random
+import threading
+import time
 from datetime import datetime
 from typing import Optional
 
 import googleapiclient.discovery
+import httplib2
 import isodate
 from google.auth.exceptions import RefreshError
 from google.auth.transport.requests import Request
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.errors import HttpError
-from sshtunnel import SSHTunnelForwarder
+from googleapiclient.http import DEFAULT_HTTP_TIMEOUT_SEC, build_http
 
 from app.config import logger, settings
-from app.db.base import Session
+from app.db.base import repository_scope
 from app.db.data_table import Channel, Video
 from app.db.repository import YoutubeDataRepository
+from app.integrations.tunnel import get_ssh_tunnel
+from app.integrations.ytquota import QUOTA_COSTS, QuotaAccountant, QuotaExceededError, QuotaPriority
 from app.schema import ChannelAPIInfoSchema, ThumbnailSchema, VideoSchema
 
 
 class YTApiClient:
+    """
+    Клиент YouTube Data API.
+
+    Ресурс API (собранный из статического discovery-документа) и учётные данные общие для всех экземпляров
+    в процессе, а HTTP-соединения держатся открытыми отдельно для каждого потока, т.к. httplib2 не потокобезопасен.
+    """
+
+    _lock = threading.Lock()
+    _credentials = None
+    _youtube = None
+    _local = threading.local()
+    _metrics: dict[str, dict[str, float]] = {}
+
     def __init__(self, over_ssh_tunnel: bool = False):
         # Disable OAuthlib's HTTPS verification when running locally.
         # *DO NOT* leave this option enabled in production.
@@ -28,16 +49,25 @@ class YTApiClient:
         self.api_service_name = "youtube"
         self.api_version = "v3"
         self._client_secrets_file = settings.youtube_secret_json
-        self._repository = YoutubeDataRepository(session=Session())
         self._credentials_file = f"google-oauth2.pickle"
         self._over_ssh_tunnel = over_ssh_tunnel
-        self._tunnel = None
-
-    def __del__(self):
-        """Закрывает SSH-туннель и очищает переменные окружения."""
-        self._stop_ssh_tunnel()
+        self._quota = QuotaAccountant()
 
     def _get_credentials(self):
+        """Возвращает общие для процесса учетные данные, загружая их при первом обращении."""
+        with YTApiClient._lock:
+            if YTApiClient._credentials is None:
+                YTApiClient._credentials = self._load_credentials()
+            return YTApiClient._credentials
+
+    def _reset_credentials(self) -> None:
+        """Сбрасывает учетные данные и HTTP-соединения, чтобы следующий запрос получил их заново."""
+        with YTApiClient._lock:
+            YTApiClient._credentials = None
+            YTApiClient._youtube = None
+            YTApiClient._local = threading.local()
+
+    def _load_credentials(self):
         """Получить учетные данные. Использует сервисный аккаунт, если доступен."""
 
         # 1️. Попытка загрузить сервисный аккаунт (если есть)
@@ -78,95 +108,226 @@ class YTApiClient:
 
         return credentials
 
-    def _make_request(self, func, *args, **kwargs):
-        """Выполнить запрос к YouTube API с повторной попыткой в случае ошибки."""
-        try:
-            return func(*args, **kwargs)
-        except HttpError as e:
-            if e.resp.status in [401, 403]:
-                os.remove(self._credentials_file)  # Удаляем просроченные учетные данные
-                credentials = self._get_credentials()  # Получаем новые учетные данные
-                youtube = googleapiclient.discovery.build(
-                    self.api_service_name, self.api_version, credentials=credentials
+    def _get_youtube(self):
+        """Возвращает общий для процесса ресурс API, собранный из встроенного discovery-документа без запроса к сети."""
+        credentials = self._get_credentials()
+        with YTApiClient._lock:
+            if YTApiClient._youtube is None:
+                YTApiClient._youtube = googleapiclient.discovery.build(
+                    self.api_service_name,
+                    self.api_version,
+                    credentials=credentials,
+                    static_discovery=True,
+                    cache_discovery=False,
+                    client_options={"api_endpoint": settings.youtube_api_url} if settings.youtube_api_url else None,
                 )
-                return func(*args, **kwargs)  # Повторяем запрос с новыми учетными данными
-            else:
-                raise
-
-    def _start_ssh_tunnel(self):
-        """Запускает SSH-туннель и настраивает https_proxy."""
-        self._tunnel = SSHTunnelForwarder(
-            (settings.ssh_host, settings.ssh_port),
-            ssh_username=settings.ssh_user,
-            ssh_pkey=settings.ssh_private_key,
-            remote_bind_address=("www.googleapis.com", 443),
-            local_bind_address=("127.0.0.1", 8443),
-        )
-        self._tunnel.start()
-
-        # Перенаправляем HTTPS-запросы через туннель
-        os.environ["https_proxy"] = f"http://127.0.0.1:{self._tunnel.local_bind_port}"
-        os.environ["HTTPS_PROXY"] = os.environ["https_proxy"]
+            return YTApiClient._youtube
 
-    def _stop_ssh_tunnel(self):
-        if self._tunnel:
-            self._tunnel.stop()
-            self._tunnel.close()
-            self._tunnel = None  # Убираем ссылку на объект туннеля
+    def _get_http(self) -> AuthorizedHttp:
+        """
+        Возвращает HTTP-клиент текущего потока с постоянными соединениями. Токен обновляется им автоматически.
+        При работе через SSH-туннель клиенты разных потоков используют общий туннель процесса.
+        """
+        attribute = "tunnel_http" if self._over_ssh_tunnel else "http"
+        http = getattr(YTApiClient._local, attribute, None)
+        if http is None:
+            if self._over_ssh_tunnel:
+                transport = httplib2.Http(timeout=DEFAULT_HTTP_TIMEOUT_SEC, proxy_info=get_ssh_tunnel().proxy_info)
+            else:
+                transport = build_http()
+            http = AuthorizedHttp(self._get_credentials(), http=transport)
+            setattr(YTApiClient._local, attribute, http)
+        return http
 
-        # Удаляем переменные окружения
-        os.environ.pop("https_proxy", None)
-        os.environ.pop("HTTPS_PROXY", None)
+    def _execute(self, endpoint: str, request_func, priority: QuotaPriority = QuotaPriority.NEW_VIDEOS) -> dict:
+        """
+        Выполнить запрос к YouTube API, учитывая задержку и расход квоты по `endpoint`.
+        Перед каждой попыткой списывается квота. Если бюджет для `priority` исчерпан, выбрасывается
+        QuotaExceededError.
+        `request_func(youtube)` должен вернуть подготовленный запрос. При ошибке авторизации (401)
+        учетные данные сбрасываются, и запрос повторяется один раз. При 429, 5xx, превышении лимита частоты
+        запросов и сетевых ошибках запрос повторяется с экспоненциальной задержкой (до `ytapi_max_retries` раз).
+        """
+        reauthorized = False
+        attempt = 0
+        while True:
+            if not self._quota.try_spend(endpoint, priority):
+                raise QuotaExceededError(f"YouTube API quota budget for {priority.name} is exhausted")
+            started = time.perf_counter()
+            error = True
+            try:
+                response = request_func(self._get_youtube()).execute(http=self._get_http())
+                error = False
+                return response
+            except HttpError as e:
+                if e.resp.status == 401 and not reauthorized:
+                    logger.warning(f"YouTube API authorization failed for {endpoint}. Reloading credentials...")
+                    self._reset_credentials()
+                    reauthorized = True
+                    continue
+                if "quotaExceeded" in self._error_reasons(e):
+                    self._quota.mark_exhausted()
+                if not self._is_retryable(e) or attempt >= settings.ytapi_max_retries:
+                    raise
+                reason = f"HTTP {e.resp.status}"
+            except (ConnectionError, TimeoutError) as e:
+                if attempt >= settings.ytapi_max_retries:
+                    raise
+                reason = str(e) or type(e).__name__
+                if self._over_ssh_tunnel:
+                    get_ssh_tunnel().ensure(force_check=True)
+            finally:
+                self._record_metrics(endpoint, time.perf_counter() - started, error)
+
+            delay = settings.ytapi_retry_backoff * 2**attempt + random.uniform(0, settings.ytapi_retry_backoff)
+            attempt += 1
+            logger.warning(f"YouTube API {endpoint} failed ({reason}). Retry {attempt} in {delay:.1f}s...")
+            time.sleep(delay)
+
+    @staticmethod
+    def _is_retryable(error: HttpError) -> bool:
+        """Временные ошибки: 429, 5xx и 403 из-за превышения частоты запросов (но не дневной квоты)."""
+        status = error.resp.status
+        if status == 429 or status >= 500:
+            return True
+        rate_limit_reasons = {"rateLimitExceeded", "userRateLimitExceeded"}
+        return status == 403 and bool(YTApiClient._error_reasons(error) & rate_limit_reasons)
+
+    @staticmethod
+    def _error_reasons(error: HttpError) -> set[str]:
+        details = error.error_details if isinstance(error.error_details, list) else []
+        return {detail.get("reason") for detail in details if isinstance(detail, dict)}
+
+    @staticmethod
+    def _record_metrics(endpoint: str, latency: float, error: bool) -> None:
+        with YTApiClient._lock:
+            metrics = YTApiClient._metrics.setdefault(
+                endpoint, {"requests": 0, "errors": 0, "quota_units": 0, "latency_total": 0.0, "latency_max": 0.0}
+            )
+            metrics["requests"] += 1
+            metrics["errors"] += int(error)
+            metrics["quota_units"] += QUOTA_COSTS.get(endpoint, 1)
+            metrics["latency_total"] += latency
+            metrics["latency_max"] = max(metrics["latency_max"], latency)
+
+    @classmethod
+    def get_metrics(cls) -> dict[str, dict[str, float]]:
+        """
+        Returns per-endpoint statistics of the API requests made by this process.
 
-    def get_video_info(self, video_ids: list[str]) -> list[dict]:
+        Returns:
+            dict[str, dict[str, float]]: endpoint -> requests, errors, quota_units (spent, including failed
+            requests), avg_latency and max_latency (seconds).
+        """
+        with cls._lock:
+            return {
+                endpoint: {
+                    "requests": metrics["requests"],
+                    "errors": metrics["errors"],
+                    "quota_units": metrics["quota_units"],
+                    "avg_latency": round(metrics["latency_total"] / metrics["requests"], 3),
+                    "max_latency": round(metrics["latency_max"], 3),
+                }
+                for endpoint, metrics in cls._metrics.items()
+            }
+
+    def get_video_info(self, video_ids: list[str], priority: QuotaPriority = QuotaPriority.NEW_VIDEOS) -> list[dict]:
         """
         Retrieve detailed information for a list of videos using the YouTube API.
 
         Args:
             video_ids (list[str]): List of video IDs.
+            priority (QuotaPriority): Priority of the work in the daily quota budget. Chunks that do not fit
+                into the budget are skipped.
 
         Returns:
             list[dict]: A list of video details retrieved from the YouTube API.
         """
-        youtube = googleapiclient.discovery.build(
-            self.api_service_name, self.api_version, credentials=self._get_credentials()
-        )
-
-        # Split the video IDs into chunks of 50
-        chunk_size = 50
-        video_chunks = [video_ids[i : i + chunk_size] for i in range(0, len(video_ids), chunk_size)]
         all_videos_info = []
-
-        for chunk in video_chunks:
-            try:
-                request_func = (
-                    lambda: youtube.videos()
-                    .list(
-                        part="snippet,statistics,status,contentDetails",
-                        id=",".join(chunk),
-                    )
-                    .execute()
-                )
-                if self._over_ssh_tunnel:
-                    self._start_ssh_tunnel()
-                response = self._make_request(request_func)
-                self._stop_ssh_tunnel()
-                all_videos_info.extend(response.get("items", []))  # Add video data to the results
-            except Exception as e:
-                logger.error(f"Error retrieving video info for chunk {chunk}: {e}")
+        for chunk in self._split_video_ids(video_ids):
+            all_videos_info.extend(self._get_video_info_chunk(chunk, priority))
         return all_videos_info
 
-    def get_video_info_list(self, video_ids: list[str]) -> list[VideoSchema]:
+    @staticmethod
+    def _split_video_ids(video_ids: list[str], chunk_size: int = 50) -> list[list[str]]:
+        """Split the video IDs into chunks of 50 (the maximum number of IDs per videos.list request)."""
+        return [video_ids[i : i + chunk_size] for i in range(0, len(video_ids), chunk_size)]
+
+    def _get_video_info_chunk(self, chunk: list[str], priority: QuotaPriority) -> list[dict]:
+        try:
+            request_func = lambda youtube: youtube.videos().list(
+                part="snippet,statistics,status,contentDetails",
+                id=",".join(chunk),
+            )
+            response = self._execute("videos.list", request_func, priority)
+            return response.get("items", [])
+        except QuotaExceededError as e:
+            logger.warning(f"{e}. Skipping API data for {len(chunk)} videos")
+            return []
+        except Exception as e:
+            logger.error(f"Error retrieving video info for chunk {chunk}: {e}")
+            return []
+
+    async def get_video_info_async(
+        self,
+        video_ids: list[str],
+        concurrency: Optional[int] = None,
+        priority: QuotaPriority = QuotaPriority.NEW_VIDEOS,
+    ) -> list[dict]:
+        """
+        Asynchronous variant of `get_video_info`: chunks of 50 IDs are requested concurrently.
+
+        Args:
+            video_ids (list[str]): List of video IDs.
+            concurrency (Optional[int]): Maximum number of requests in flight. Defaults to `ytapi_concurrency`.
+            priority (QuotaPriority): Priority of the work in the daily quota budget.
+
+        Returns:
+            list[dict]: A list of video details in the order of the requested chunks.
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency or settings.ytapi_concurrency))
+
+        async def fetch(chunk: list[str]) -> list[dict]:
+            async with semaphore:
+                return await asyncio.to_thread(self._get_video_info_chunk, chunk, priority)
+
+        chunks = await asyncio.gather(*(fetch(chunk) for chunk in self._split_video_ids(video_ids)))
+        return [video_info for chunk in chunks for video_info in chunk]
+
+    def get_video_info_list(
+        self, video_ids: list[str], priority: QuotaPriority = QuotaPriority.NEW_VIDEOS
+    ) -> list[VideoSchema]:
         """
         Retrieve detailed information for a list of videos and convert them to VideoSchema.
 
         Args:
             video_ids (list[str]): List of video IDs.
+            priority (QuotaPriority): Priority of the work in the daily quota budget.
 
         Returns:
             list[VideoSchema]: A list of VideoSchema objects with detailed video information.
         """
-        video_info_list = self.get_video_info(video_ids)  # Получаем информацию о видео через API
+        video_info_list = self.get_video_info(video_ids, priority)  # Получаем информацию о видео через API
+        return self._to_video_schemas(video_info_list)
+
+    async def get_video_info_list_async(
+        self, video_ids: list[str], priority: QuotaPriority = QuotaPriority.NEW_VIDEOS
+    ) -> list[VideoSchema]:
+        """
+        Asynchronous variant of `get_video_info_list` built on `get_video_info_async`.
+
+        Args:
+            video_ids (list[str]): List of video IDs.
+            priority (QuotaPriority): Priority of the work in the daily quota budget.
+
+        Returns:
+            list[VideoSchema]: A list of VideoSchema objects with detailed video information.
+        """
+        video_info_list = await self.get_video_info_async(video_ids, priority=priority)
+        return self._to_video_schemas(video_info_list)
+
+    def _to_video_schemas(self, video_info_list: list[dict]) -> list[VideoSchema]:
+        """Convert `videos.list` items to VideoSchema objects, skipping the ones that fail to parse."""
         logger.debug(f"Получена информация о {len(video_info_list)} видео")
         video_schemas = []
 
@@ -229,31 +390,33 @@ class YTApiClient:
     def update_video_info(self, video_ids: list[str]) -> None:
         video_info = self.get_video_info(video_ids)
         if "items" in video_info:
-            for item in video_info["items"]:
-                try:
-                    video_id: str = item["id"]
-                    upload_date = datetime.strptime(item["snippet"]["publishedAt"], "%Y-%m-%dT%H:%M:%SZ")
-                    like_count = int(item.get("statistics", {}).get("likeCount", 0))
-                    commentCount = int(item.get("statistics", {}).get("commentCount", 0))
-                    tags = item.get("snippet", {}).get("tags", [])
-                    defaultAudioLanguage = item.get("snippet", {}).get("defaultAudioLanguage", None)
-
-                    # Проверка существования видео в базе данных
-                    if not self._repository.get_video_by_id(video_id):
-                        logger.warning(f"Video with ID {video_id} not found in the database. Skipping update.")
-                        continue
-
-                    self._repository.update_video(
-                        video_id, upload_date, like_count, commentCount, tags, defaultAudioLanguage
-                    )
-                    # logger.debug(f"Updated video details for video ID {video_id}.")
-                except Exception as e:
-                    self._repository.set_video_as_invalid(video_id)
-                    logger.error(f"Failed to update video details for video ID {video_id}. Error: {e}")
+            with repository_scope(YoutubeDataRepository) as repository:
+                for item in video_info["items"]:
+                    try:
+                        video_id: str = item["id"]
+                        upload_date = datetime.strptime(item["snippet"]["publishedAt"], "%Y-%m-%dT%H:%M:%SZ")
+                        like_count = int(item.get("statistics", {}).get("likeCount", 0))
+                        commentCount = int(item.get("statistics", {}).get("commentCount", 0))
+                        tags = item.get("snippet", {}).get("tags", [])
+                        defaultAudioLanguage = item.get("snippet", {}).get("defaultAudioLanguage", None)
+
+                        # Проверка существования видео в базе данных
+                        if not repository.get_video_by_id(video_id):
+                            logger.warning(f"Video with ID {video_id} not found in the database. Skipping update.")
+                            continue
+
+                        repository.update_video(
+                            video_id, upload_date, like_count, commentCount, tags, defaultAudioLanguage
+                        )
+                        # logger.debug(f"Updated video details for video ID {video_id}.")
+                    except Exception as e:
+                        repository.set_video_as_invalid(video_id)
+                        logger.error(f"Failed to update video details for video ID {video_id}. Error: {e}")
 
     def update_missing_video_info(self, videos_list: list[Video] = []):
         if not videos_list:
-            videos_list = self._repository.get_videos_without_upload_date()
+            with repository_scope(YoutubeDataRepository) as repository:
+                videos_list = repository.get_videos_without_upload_date()
             logger.debug(f"videos_without_date: {len(videos_list)}")
         while videos_list:
             video_ids = [
@@ -264,26 +427,23 @@ class YTApiClient:
             self.update_video_info(video_ids)
 
             # Fetch next batch of videos, уже с учетом маркера неудачи
-            videos_list = self._repository.get_videos_without_upload_date()
-        self._repository.reset_all_invalid_videos()
+            with repository_scope(YoutubeDataRepository) as repository:
+                videos_list = repository.get_videos_without_upload_date()
+        with repository_scope(YoutubeDataRepository) as repository:
+            repository.reset_all_invalid_videos()
 
     def get_channel_info(self, channel_ids: list[str]) -> list[ChannelAPIInfoSchema]:
-        credentials = self._get_credentials()
-        youtube = googleapiclient.discovery.build(self.api_service_name, self.api_version, credentials=credentials)
         channels_info: list[ChannelAPIInfoSchema] = []
 
-        request_func = (
-            lambda: youtube.channels()
-            .list(
-                part="contentDetails,contentOwnerDetails,id,snippet,statistics,status,topicDetails",
-                id=",".join(channel_ids),
-            )
-            .execute()
+        request_func = lambda youtube: youtube.channels().list(
+            part="contentDetails,contentOwnerDetails,id,snippet,statistics,status,topicDetails",
+            id=",".join(channel_ids),
         )
-        if self._over_ssh_tunnel:
-            self._start_ssh_tunnel()
-        response = self._make_request(request_func)
-        self._stop_ssh_tunnel()
+        try:
+            response = self._execute("channels.list", request_func, QuotaPriority.CHANNEL_DETAILS)
+        except QuotaExceededError as e:
+            logger.warning(f"{e}. Channel details for {channel_ids} are deferred")
+            return []
 
         try:
             # Преобразуем ответ в объект ChannelAPIInfoSchema
@@ -299,7 +459,8 @@ class YTApiClient:
         return []
 
     def update_channels_info(self):
-        channels_list: list[Channel] = self._repository.get_channels(limit=10)
+        with repository_scope(YoutubeDataRepository) as repository:
+            channels_list: list[Channel] = repository.get_channels(limit=10)
         # logger.debug(channels_list)
         page = 1
         while channels_list:
@@ -307,11 +468,13 @@ class YTApiClient:
             try:
                 channel_ids = [ch.channel_id for ch in channels_list]
                 channels = self.get_channel_info(channel_ids)
-                for channel_api_info in channels:
-                    self._repository.update_channel_details(channel_api_info)
+                with repository_scope(YoutubeDataRepository) as repository:
+                    for channel_api_info in channels:
+                        repository.update_channel_details(channel_api_info)
             except Exception as e:
                 logger.error("Failed to update channels info!")
                 logger.error(e)
             # Загружаем следующую порцию каналов
-            channels_list: list[Channel] = self._repository.get_channels(limit=10, page=page)
+            with repository_scope(YoutubeDataRepository) as repository:
+                channels_list: list[Channel] = repository.get_channels(limit=10, page=page)
             page += 1
@@ -4,30 +4,124 @@ import json
 import locale
 import os
 import re
-import subprocess
+import signal
 import tempfile
+import weakref
 from pathlib import Path
-from typing import Optional
+from typing import Callable, NamedTuple, Optional
 
 import httpx
 from pydantic import ValidationError
 
 from app.config import logger, settings
-from app.db.base import Session
+from app.db.async_repository import AsyncYoutubeDataRepository
+from app.db.base import async_repository_scope, repository_scope
 from app.db.data_table import Video
+from app.db.known_videos import known_videos
 from app.db.repository import YoutubeDataRepository
+from app.integrations import ytdlp_engine
 from app.schema import ChannelInfoSchema, VideoDownloadSchema, VideoSchema, YTFormatSchema
 
+_READ_CHUNK_SIZE = 64 * 1024
+DEFAULT_VIDEO_FORMAT = "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best"
+_ytdlp_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class YtDlpResult(NamedTuple):
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+def _get_ytdlp_semaphore() -> asyncio.Semaphore:
+    """Возвращает общий для текущего event loop семафор, ограничивающий число процессов yt-dlp."""
+    loop = asyncio.get_running_loop()
+    semaphore = _ytdlp_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _ytdlp_semaphores[loop] = asyncio.Semaphore(max(1, settings.ytdlp_max_processes))
+    return semaphore
+
+
+def _kill_process_tree(proc: asyncio.subprocess.Process) -> None:
+    """Убивает процесс yt-dlp вместе с дочерними процессами (например, ffmpeg)."""
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def _read_stream(
+    stream: asyncio.StreamReader, encoding: str, on_line: Optional[Callable[[str], None]] = None
+) -> str:
+    """Читает поток кусками по мере поступления данных, при необходимости передавая каждую строку в `on_line`."""
+    buffer = bytearray()
+    pending = b""
+    while chunk := await stream.read(_READ_CHUNK_SIZE):
+        buffer.extend(chunk)
+        if on_line is not None:
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                on_line(line.decode(encoding, "replace"))
+    if on_line is not None and pending:
+        on_line(pending.decode(encoding, "replace"))
+    return buffer.decode(encoding, "replace")
+
+
+async def run_ytdlp(
+    args: list[str],
+    timeout: Optional[float] = settings.ytdlp_timeout,
+    on_line: Optional[Callable[[str], None]] = None,
+) -> YtDlpResult:
+    """
+    Асинхронно запускает `yt-dlp` с аргументами `args`, не блокируя event loop.
+
+    stdout и stderr читаются параллельно по мере поступления данных, строки stdout передаются в `on_line`.
+    Число одновременно запущенных процессов ограничено `settings.ytdlp_max_processes`.
+    По истечении `timeout` (None - без ограничения) или при отмене корутины дочерний процесс убивается;
+    таймаут возвращается как результат с ненулевым кодом возврата.
+    """
+    command = ["yt-dlp", *args]
+    async with _get_ytdlp_semaphore():
+        logger.debug(f"Executing command: {' '.join(command)}")
+        proc = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=os.name == "posix",  # Отдельная группа процессов, чтобы убить и дочерние процессы
+        )
+        readers = [
+            asyncio.ensure_future(_read_stream(proc.stdout, "utf-8", on_line)),
+            asyncio.ensure_future(_read_stream(proc.stderr, locale.getpreferredencoding(False))),
+        ]
+        try:
+            returncode = await asyncio.wait_for(proc.wait(), timeout=timeout)
+            stdout, stderr = [await reader for reader in readers]
+            return YtDlpResult(returncode, stdout, stderr)
+        except asyncio.TimeoutError:
+            logger.error(f"yt-dlp timed out after {timeout}s: {' '.join(command)}")
+            return YtDlpResult(-1, "", f"Timed out after {timeout}s")
+        finally:
+            if proc.returncode is None:
+                _kill_process_tree(proc)
+                await proc.wait()
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+
 
 class YTChannelDownloader:
     def __init__(self, channel_url: str):
         self._channel_data = {}
         self._channel_url = channel_url
-        self._repository = YoutubeDataRepository(session=Session())
 
-    def get_channel_info(self) -> Optional[ChannelInfoSchema]:
+    async def get_channel_info(self) -> Optional[ChannelInfoSchema]:
         if not self._channel_data:
-            self._channel_data = self._get_channel_data()
+            self._channel_data = await self._get_channel_data()
         if self._channel_data:
             try:
                 return ChannelInfoSchema(**self._channel_data)
@@ -35,9 +129,9 @@ class YTChannelDownloader:
                 logger.error(f"Ошибка при обработке информации о канале: {e}")
         return None
 
-    def get_video_list(self) -> tuple[list[VideoSchema], str]:
+    async def get_video_list(self) -> tuple[list[VideoSchema], str]:
         if not self._channel_data:
-            self._channel_data = self._get_channel_data()
+            self._channel_data = await self._get_channel_data()
         video_list = []
         channel_id = ""
         if self._channel_data:
@@ -48,34 +142,88 @@ class YTChannelDownloader:
                 logger.error(f"Ошибка при обработке списка видео: {e}")
         return video_list, channel_id
 
-    def filter_new_old(
+    async def filter_new_old(
         self, video_list: list[VideoSchema], channel_id: str
     ) -> tuple[list[VideoSchema], list[VideoSchema]]:
         v_ids = [v.id for v in video_list]
-        new_v_ids, _ = self._repository.get_new_and_existing_video_ids(v_ids, channel_id)
+        new_v_ids = set((await known_videos.split_new_known(channel_id, v_ids))[0])
         new_videos = [v for v in video_list if v.id in new_v_ids]
         old_videos = [v for v in video_list if v.id not in new_v_ids]
         return new_videos, old_videos
 
-    def _get_channel_data(self) -> dict:
-        command = ["yt-dlp", "-J", "--flat-playlist", "--quiet", "--no-warnings", "--no-progress", self._channel_url]
-        logger.debug(f"Executing command: {' '.join(command)}")
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-        )
+    async def load_recent_videos(self, tabs: tuple[str, ...] = ("videos", "shorts", "streams")) -> bool:
+        """
+        Инкрементально загружает список видео канала вместо полного листинга.
+
+        Каждая вкладка канала читается постранично от новых видео к старым и только до первого видео,
+        которое уже есть в БД. Результат сохраняется в том же формате, что и полный листинг, поэтому
+        `get_channel_info` и `get_video_list` работают без изменений.
+        Возвращает False, если не удалось загрузить ни одной вкладки.
+        """
+        base_url = self._channel_url.rstrip("/")
+        channel_data: dict = {}
+        tab_playlists = []
+        for tab in tabs:
+            tab_data, entries = await self._get_tab_entries_until_known(f"{base_url}/{tab}")
+            if not tab_data:
+                continue
+            channel_data = channel_data or tab_data
+            tab_playlists.append({"_type": "playlist", "entries": entries})
+            logger.debug(f"Incremental listing of '{tab}' tab for {self._channel_url}: {len(entries)} new entries")
+
+        if not channel_data:
+            return False
+        channel_data["entries"] = tab_playlists
+        self._channel_data = channel_data
+        return True
+
+    async def _get_tab_entries_until_known(self, tab_url: str) -> tuple[dict, list[dict]]:
+        """Читает вкладку канала страницами растущего размера, пока не встретится уже известное видео."""
+        page_size = settings.incremental_page_size
+        start = 1
+        tab_data: dict = {}
+        new_entries: list[dict] = []
+        while True:
+            end = start + page_size - 1
+            data = await self._dump_json(tab_url, playlist_items=f"{start}:{end}")
+            if not data:
+                break
+            tab_data = tab_data or data
+            page = [entry for entry in data.get("entries") or [] if entry.get("id")]
+            known_ids = await self._get_existing_video_ids([entry["id"] for entry in page])
+            for entry in page:
+                if entry["id"] in known_ids:
+                    return tab_data, new_entries
+                new_entries.append(entry)
+            if len(page) < page_size:
+                break
+            start = end + 1
+            page_size *= 2
+        return tab_data, new_entries
+
+    async def _get_channel_data(self) -> dict:
+        return await self._dump_json(self._channel_url)
+
+    async def _dump_json(self, url: str, playlist_items: Optional[str] = None) -> dict:
+        """Аналог `yt-dlp -J --flat-playlist [--playlist-items ...]` для выбранного бэкенда yt-dlp."""
+        if settings.ytdlp_backend == "library":
+            return await ytdlp_engine.extract_info(url, flat_playlist=True, playlist_items=playlist_items) or {}
+
+        args = ["-J", "--flat-playlist", "--quiet", "--no-warnings", "--no-progress"]
+        if playlist_items:
+            args += ["--playlist-items", playlist_items]
+        result = await run_ytdlp([*args, url])
         if result.returncode != 0:
-            logger.error(f"Error while executing yt-dlp for {self._channel_url}: {result.stderr}")
+            logger.error(f"Error while executing yt-dlp for {url}: {result.stderr}")
             return {}
 
         try:
             data = json.loads(result.stdout)
             return data
         except json.JSONDecodeError:
-            logger.error(f"Не удалось декодировать JSON из вывода yt-dlp для {self._channel_url}")
+            logger.error(f"Не удалось декодировать JSON из вывода yt-dlp для {url}")
         except KeyError:
-            logger.error(f"Отсутствует ключевая информация в данных от {self._channel_url}")
+            logger.error(f"Отсутствует ключевая информация в данных от {url}")
         return {}
 
     def _extract_video_list(self) -> tuple[list[VideoSchema], str]:
@@ -92,87 +240,107 @@ class YTChannelDownloader:
     @staticmethod
     async def download_video(
         video_info: VideoDownloadSchema,
-        format: str = "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
+        format: str = DEFAULT_VIDEO_FORMAT,
         ensure_mp4: bool = True,
-    ) -> None:
+        rate_limit: int = 0,
+    ) -> YtDlpResult:
+        """
+        Скачивает видео в `video_info.video_file_download_path`. Недокачанный файл (.part) докачивается.
+
+        `rate_limit` - ограничение скорости в байтах в секунду (0 - без ограничения). В stdout результата
+        выводятся id форматов, из которых собран файл (например, "137+140"), в т.ч. если файл уже был скачан.
+        """
         out_path = Path(video_info.video_file_download_path)
         if out_path.exists():
             logger.info(f"Видео уже скачано: {out_path}")
-            return
-
-        postproc_flag = "--recode-video mp4" if ensure_mp4 else "--merge-output-format mp4"
-        command = f'yt-dlp -f "{format}" {postproc_flag} -o "{out_path}" {video_info.video_url}'
+            # Возвращаем форматы имеющегося файла, чтобы у них заполнился file_path
+            async with async_repository_scope(AsyncYoutubeDataRepository) as repository:
+                format_ids = await repository.get_downloaded_format_ids(str(out_path))
+            if format_ids:
+                return YtDlpResult(0, "+".join(format_ids), "")
+            # Форматы файла не записаны (например, он скачан до учёта форматов): берём те, что выбирает `format`
+            result = await run_ytdlp(["-f", format, "--print", "format_id", video_info.video_url])
+            return result if result.returncode == 0 else YtDlpResult(0, "", "")
+
+        postproc_flag = ["--recode-video", "mp4"] if ensure_mp4 else ["--merge-output-format", "mp4"]
+        rate_flag = ["--limit-rate", str(rate_limit)] if rate_limit > 0 else []
 
         logger.debug(f"Downloading video: {video_info.video_url}")
-        logger.debug(f"Command: {command}")
-
-        proc = await asyncio.create_subprocess_shell(
-            command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        result = await run_ytdlp(
+            [
+                "-f",
+                format,
+                *postproc_flag,
+                "--continue",
+                "--part",
+                *rate_flag,
+                "--print",
+                "after_move:%(format_id)s",
+                "-o",
+                str(out_path),
+                video_info.video_url,
+            ],
+            timeout=None,  # Длительность скачивания заранее неизвестна
         )
-        _, stderr = await proc.communicate()
 
-        if proc.returncode == 0:
+        if result.returncode == 0:
             logger.info(f"Видео скачано: {out_path}")
         else:
-            err = stderr.decode(locale.getpreferredencoding(False), "replace").strip()
-            logger.error(f"Ошибка скачивания видео: {err}")
+            logger.error(f"Ошибка скачивания видео: {result.stderr.strip()}")
+        return result
+
+    @staticmethod
+    async def _get_existing_video_ids(video_ids: list[str]) -> set[str]:
+        async with async_repository_scope(AsyncYoutubeDataRepository) as repository:
+            return await repository.get_existing_video_ids(video_ids)
 
     def download_thumbnail(self, video_id: str) -> None:
-        video: Video = self._repository.get_video(video_id)
+        with repository_scope(YoutubeDataRepository) as repository:
+            video: Video = repository.get_video(video_id)
         if video and video.thumbnail_url:
             try:
                 r = httpx.get(video.thumbnail_url)
                 r.raise_for_status()
                 thumbnail_path = self._construct_thumbnail_path(video_id)
                 thumbnail_path.write_bytes(r.content)
-                self._repository.update_thumbnail_path(video_id, video.thumbnail_url, thumbnail_path)
+                with repository_scope(YoutubeDataRepository) as repository:
+                    repository.update_thumbnail_path(video_id, video.thumbnail_url, thumbnail_path)
             except httpx.HTTPStatusError as e:
                 logger.error(f"HTTP error occurred: {e}")
 
-    def update_video_formats(self) -> None:
-        video_ids = self._repository.get_video_ids_without_formats(limit=50)
-        logger.debug(f"video_ids_without_formats: {len(video_ids)}")
-        for i, v_id in enumerate(video_ids):
-            formats = self.get_video_formats(v_id)
-            for format_data in formats:
-                self._repository.add_video_format(format_data, v_id)
-            logger.debug(f"[{i+1}/{len(video_ids)}] Added video formats for v_id: {v_id}")
-
     @staticmethod
-    def get_video_formats(video_id: str) -> list[YTFormatSchema]:
-        result = subprocess.run(
-            [
-                "yt-dlp",
-                "-J",
-                "--quiet",
-                "--no-warnings",
-                "--no-progress",
-                f"https://www.youtube.com/watch?v={video_id}",
-            ],
-            capture_output=True,
-            text=True,
-        )
+    async def get_video_formats(video_id: str) -> list[YTFormatSchema]:
+        video_url = f"https://www.youtube.com/watch?v={video_id}"
+        if settings.ytdlp_backend == "library":
+            video_data = await ytdlp_engine.extract_info(video_url)
+            return YTChannelDownloader._parse_video_formats(video_data) if video_data else []
+
+        result = await run_ytdlp(["-J", "--quiet", "--no-warnings", "--no-progress", video_url])
         if result.returncode != 0:
             logger.error(f"Ошибка при выполнении yt-dlp для video_id={video_id}: {result.stderr}")
             return []
 
         try:
             video_data = json.loads(result.stdout)
-            formats_data = video_data.get("formats", [])  # Получаем список форматов
-            formats = []
-            for format_data in formats_data:
-                try:
-                    format_schema = YTFormatSchema(**format_data)  # Создаём объект схемы для каждого формата
-                    formats.append(format_schema)
-                except ValidationError as e:
-                    logger.error(f"Ошибка валидации формата видео: {e}")
-            return formats
         except json.JSONDecodeError as e:
             logger.error(f"Не удалось декодировать JSON: {e}")
             return []
+        return YTChannelDownloader._parse_video_formats(video_data)
+
+    @staticmethod
+    def _parse_video_formats(video_data: dict) -> list[YTFormatSchema]:
+        formats_data = video_data.get("formats", [])  # Получаем список форматов
+        formats = []
+        for format_data in formats_data:
+            try:
+                format_schema = YTFormatSchema(**format_data)  # Создаём объект схемы для каждого формата
+                formats.append(format_schema)
+            except ValidationError as e:
+                logger.error(f"Ошибка валидации формата видео: {e}")
+        return formats
 
     @staticmethod
-    def fetch_transcript(
+    async def fetch_transcript(
         video_id: str,
         preferred_langs: tuple[str, ...] = ("ru",),
     ) -> Optional[str]:
@@ -201,15 +369,13 @@ class YTChannelDownloader:
         video_url = f"https://www.youtube.com/watch?v={video_id}"
 
         # 1. Получаем метаданные ролика
+        result = await run_ytdlp(["-j", video_url])
+        if result.returncode != 0:
+            logger.error(f"Не удалось получить JSON-метаданные: {result.stderr.strip()}")
+            return None
         try:
-            proc = subprocess.run(
-                ["yt-dlp", "-j", video_url],
-                check=True,
-                capture_output=True,
-                text=True,
-            )
-            info = json.loads(proc.stdout)
-        except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
+            info = json.loads(result.stdout)
+        except json.JSONDecodeError as e:
             logger.error(f"Не удалось получить JSON-метаданные: {e}")
             return None
 
@@ -241,8 +407,8 @@ class YTChannelDownloader:
         # 3. Скачиваем json3 и читаем
         with tempfile.TemporaryDirectory() as tmpdir:
             outtmpl = os.path.join(tmpdir, "subs")  # yt-dlp → subs.<lang>.json3
-            cmd = [
-                "yt-dlp",
+            args = [
+                "--write-auto-subs" if use_auto else "--write-subs",
                 "--skip-download",
                 "--sub-lang",
                 lang,
@@ -252,12 +418,10 @@ class YTChannelDownloader:
                 outtmpl,
                 video_url,
             ]
-            cmd.insert(1, "--write-auto-subs" if use_auto else "--write-subs")
 
-            try:
-                subprocess.run(cmd, check=True, capture_output=True, text=True)
-            except subprocess.CalledProcessError as e:
-                logger.error(f"Ошибка скачивания субтитров: {e.stderr.strip()}")
+            result = await run_ytdlp(args)
+            if result.returncode != 0:
+                logger.error(f"Ошибка скачивания субтитров: {result.stderr.strip()}")
                 return None
 
             pattern = os.path.join(tmpdir, f"subs.{lang}*.json3")
@@ -285,11 +449,12 @@ class YTChannelDownloader:
         logger.info(f"Расшифровка {video_id} ({lang}) успешно получена ({len(transcript)} символов)")
         return transcript
 
-    def channel_exist(self, channel_id: str) -> bool:
-        return bool(self._repository.get_channel_by_id(channel_id))
+    async def channel_exist(self, channel_id: str) -> bool:
+        return await known_videos.has_channel(channel_id)
 
     def video_exist(self, youtube_video_id: str) -> bool:
-        return bool(self._repository.get_video(youtube_video_id))
+        with repository_scope(YoutubeDataRepository) as repository:
+            return bool(repository.get_video(youtube_video_id))
 
     def _construct_video_path(self, video_id: str) -> Path:
         return Path(settings.video_download_path) / f"{video_id}.mp4"
@@ -0,0 +1,146 @@
+"""
+Встроенный (in-process) режим работы yt-dlp.
+
+Вместо запуска отдельного процесса `yt-dlp` на каждый вызов библиотека yt_dlp загружается один раз
+в каждом процессе долгоживущего пула (ProcessPoolExecutor). Так не тратится время на старт интерпретатора
+и импорт экстракторов, а падение экстрактора или GIL не затрагивают event loop мониторинга.
+
+Режим включается настройкой `YTDLP_BACKEND=library` и требует установленного пакета `yt-dlp` (`pip install yt-dlp`).
+"""
+
+import asyncio
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from app.config import logger, settings
+
+_BASE_OPTIONS = {
+    "quiet": True,
+    "no_warnings": True,
+    "noprogress": True,
+    "skip_download": True,
+}
+_TIMEOUT_GRACE = 30  # Сколько секунд сверх таймаута ждать процесс пула, прежде чем завершить его принудительно
+
+_pool: Optional[ProcessPoolExecutor] = None
+_worker_clients: dict[bool, object] = {}  # Экземпляры YoutubeDL внутри процесса пула: flat_playlist -> YoutubeDL
+
+
+class _WorkerAlarm(BaseException):
+    """Сигнал таймаута внутри процесса пула. Наследует BaseException, чтобы его не перехватил yt-dlp."""
+
+
+class ExtractTimeoutError(Exception):
+    """Вызов `extract_info` в процессе пула прерван по таймауту."""
+
+
+def _on_alarm(signum, frame):
+    raise _WorkerAlarm()
+
+
+def _get_worker_client(flat_playlist: bool):
+    """Возвращает закэшированный в процессе пула экземпляр YoutubeDL (выполняется в процессе пула)."""
+    client = _worker_clients.get(flat_playlist)
+    if client is None:
+        import yt_dlp
+
+        options = dict(_BASE_OPTIONS)
+        if flat_playlist:
+            options["extract_flat"] = "in_playlist"  # Аналог --flat-playlist
+        client = _worker_clients[flat_playlist] = yt_dlp.YoutubeDL(options)
+    return client
+
+
+def _extract_info_worker(
+    url: str, flat_playlist: bool, playlist_items: Optional[str] = None, timeout: Optional[float] = None
+) -> dict:
+    """
+    Аналог `yt-dlp -J` (выполняется в процессе пула). Возвращает JSON-совместимый словарь.
+
+    Процесс пула выполняет задачи по одной, поэтому `playlist_items` задаётся в параметрах закэшированного
+    экземпляра только на время вызова. По истечении `timeout` вызов прерывается сигналом SIGALRM.
+    """
+    client = _get_worker_client(flat_playlist)
+    client.params["playlist_items"] = playlist_items
+    if timeout:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        info = client.extract_info(url, download=False)
+        return client.sanitize_info(info)
+    except _WorkerAlarm:
+        # Состояние прерванного экземпляра не гарантировано, следующий вызов создаст новый
+        _worker_clients.pop(flat_playlist, None)
+        raise ExtractTimeoutError(f"Timed out after {timeout}s")
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        client.params.pop("playlist_items", None)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max(1, settings.ytdlp_pool_workers))
+        logger.info(f"Started yt-dlp engine pool with {max(1, settings.ytdlp_pool_workers)} workers")
+    return _pool
+
+
+def _reset_pool(pool: ProcessPoolExecutor, terminate: bool = False) -> None:
+    """
+    Пересоздаёт пул после аварийного завершения или зависания одного из его процессов.
+
+    При `terminate=True` процессы пула завершаются принудительно: зависший вызов нельзя отменить иначе.
+    Если пул уже пересоздан другим вызовом, новый пул не затрагивается.
+    """
+    global _pool
+    if terminate:
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+    if _pool is pool:
+        _pool = None
+
+
+def shutdown() -> None:
+    """Останавливает пул процессов yt-dlp."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+async def extract_info(
+    url: str,
+    flat_playlist: bool = False,
+    playlist_items: Optional[str] = None,
+    timeout: Optional[float] = settings.ytdlp_timeout,
+) -> Optional[dict]:
+    """
+    Получает метаданные `url` через пул процессов yt-dlp.
+
+    Возвращает тот же словарь, что и `yt-dlp -J` (с `--flat-playlist`, если `flat_playlist=True`,
+    и `--playlist-items`, если задан `playlist_items`), или None при ошибке.
+    По истечении `timeout` вызов прерывается внутри процесса пула. Если процесс не ответил и через
+    `_TIMEOUT_GRACE` секунд, пул пересоздаётся с принудительным завершением его процессов.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(pool, _extract_info_worker, url, flat_playlist, playlist_items, timeout),
+            timeout=timeout + _TIMEOUT_GRACE if timeout else None,
+        )
+    except ExtractTimeoutError:
+        logger.error(f"yt-dlp engine timed out after {timeout}s for {url}")
+    except asyncio.TimeoutError:
+        logger.error(f"yt-dlp engine worker hung on {url} after {timeout}s. Restarting pool...")
+        _reset_pool(pool, terminate=True)
+    except BrokenProcessPool:
+        logger.error(f"yt-dlp engine worker crashed while processing {url}. Restarting pool...")
+        _reset_pool(pool)
+    except Exception as e:
+        logger.error(f"Error while extracting info with yt-dlp engine for {url}: {e}")
+    return None
@@ -0,0 +1,74 @@
+import xml.etree.ElementTree as ET
+from typing import Optional
+
+import httpx
+
+from app.config import logger, settings
+
+_ATOM_NS = {"atom": "http://www.w3.org/2005/Atom", "yt": "http://www.youtube.com/xml/schemas/2015"}
+
+
+class YTFeedClient:
+    """
+    Клиент публичных Atom-лент каналов YouTube (`/feeds/videos.xml?channel_id=...`).
+
+    Лента весит несколько килобайт и содержит последние ~15 видео канала, поэтому по ней можно быстро
+    понять, появились ли новые видео, не запуская yt-dlp. Запросы условные (ETag / If-Modified-Since)
+    и идут через общий пул соединений `httpx.AsyncClient`.
+    """
+
+    def __init__(self, feed_url: str = settings.youtube_feed_url, timeout: float = 15.0):
+        self._feed_url = feed_url
+        self._timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._validators: dict[str, dict[str, str]] = {}  # channel_id -> заголовки для условного запроса
+        self._video_ids: dict[str, list[str]] = {}  # channel_id -> id видео из последней полученной ленты
+        self.stats = {"requests": 0, "not_modified": 0, "errors": 0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Клиент создаётся лениво, чтобы он принадлежал event loop процесса, в котором используется
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                follow_redirects=True,
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_video_ids(self, channel_id: str) -> Optional[list[str]]:
+        """
+        Возвращает id видео из ленты канала (от новых к старым) или None, если ленту получить не удалось.
+        Если лента не изменилась (304), возвращаются id из последней полученной версии.
+        """
+        headers = self._validators.get(channel_id, {}) if channel_id in self._video_ids else {}
+        self.stats["requests"] += 1
+        try:
+            response = await self._get_client().get(self._feed_url, params={"channel_id": channel_id}, headers=headers)
+            if response.status_code == httpx.codes.NOT_MODIFIED:
+                self.stats["not_modified"] += 1
+                return self._video_ids[channel_id]
+            response.raise_for_status()
+            video_ids = self._parse_video_ids(response.content)
+        except (httpx.HTTPError, ET.ParseError) as e:
+            self.stats["errors"] += 1
+            logger.error(f"Failed to fetch feed for channel {channel_id}: {e}")
+            return None
+
+        validators = {}
+        if etag := response.headers.get("ETag"):
+            validators["If-None-Match"] = etag
+        if last_modified := response.headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = last_modified
+        self._validators[channel_id] = validators
+        self._video_ids[channel_id] = video_ids
+        return video_ids
+
+    @staticmethod
+    def _parse_video_ids(content: bytes) -> list[str]:
+        root = ET.fromstring(content)
+        return [video_id.text for video_id in root.findall("atom:entry/yt:videoId", _ATOM_NS) if video_id.text]
@@ -0,0 +1,84 @@
+from datetime import date, datetime
+from enum import IntEnum
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from app.config import logger, settings
+from app.db.base import repository_scope
+from app.db.repository import ApiQuotaRepository
+
+# Стоимость запросов в единицах дневной квоты YouTube Data API
+QUOTA_COSTS = {"videos.list": 1, "channels.list": 1, "playlistItems.list": 1, "search.list": 100}
+# Дневная квота YouTube Data API сбрасывается в полночь по тихоокеанскому времени
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+
+class QuotaPriority(IntEnum):
+    """Приоритет работы, расходующей квоту. Чем меньше значение, тем важнее работа."""
+
+    NEW_VIDEOS = 0  # Дополнение новых видео данными API
+    HISTORY = 1  # Обновление статистики старых видео
+    CHANNEL_DETAILS = 2  # Информация и статистика каналов
+
+
+class QuotaExceededError(Exception):
+    """Бюджет квоты для работы данного приоритета на сегодня исчерпан."""
+
+
+class QuotaAccountant:
+    """
+    Учёт дневного расхода квоты YouTube Data API, общий для всех процессов через таблицу `api_quota_usage`.
+
+    Работа с приоритетом ниже NEW_VIDEOS может тратить квоту, только пока остаток больше её резерва:
+    так обновление истории не может израсходовать квоту, нужную для новых видео, а информация о каналах -
+    квоту, нужную для истории. Если БД недоступна, запросы разрешаются, чтобы мониторинг не останавливался.
+    """
+
+    def __init__(
+        self, daily_limit: int = settings.ytapi_daily_quota, reserves: Optional[dict[QuotaPriority, int]] = None
+    ):
+        self._daily_limit = daily_limit
+        self._reserves = reserves or {
+            QuotaPriority.NEW_VIDEOS: 0,
+            QuotaPriority.HISTORY: settings.ytapi_quota_history_reserve,
+            QuotaPriority.CHANNEL_DETAILS: settings.ytapi_quota_channel_reserve,
+        }
+
+    @staticmethod
+    def quota_day() -> date:
+        return datetime.now(QUOTA_TIMEZONE).date()
+
+    def allowance(self, priority: QuotaPriority) -> int:
+        """Сколько единиц квоты в сутки может быть израсходовано с учётом работы с приоритетом `priority`."""
+        return max(0, self._daily_limit - self._reserves.get(priority, 0))
+
+    def try_spend(self, endpoint: str, priority: QuotaPriority) -> bool:
+        """Списывает стоимость запроса к `endpoint`. Возвращает False, если бюджет для `priority` исчерпан."""
+        try:
+            with repository_scope(ApiQuotaRepository) as repository:
+                used = repository.spend(self.quota_day(), QUOTA_COSTS.get(endpoint, 1), self.allowance(priority))
+        except Exception as e:
+            logger.error(f"Failed to account API quota for {endpoint}: {e}")
+            return True
+        return used is not None
+
+    def mark_exhausted(self) -> None:
+        """Отмечает дневную квоту исчерпанной, когда API вернул ошибку quotaExceeded."""
+        try:
+            with repository_scope(ApiQuotaRepository) as repository:
+                repository.mark_exhausted(self.quota_day(), self._daily_limit)
+        except Exception as e:
+            logger.error(f"Failed to mark API quota as exhausted: {e}")
+
+    def get_report(self) -> dict:
+        """Возвращает расход и остаток квоты за текущие сутки, в т.ч. остаток, доступный каждому приоритету."""
+        day = self.quota_day()
+        with repository_scope(ApiQuotaRepository) as repository:
+            used = repository.get_used(day)
+        return {
+            "day": day.isoformat(),
+            "limit": self._daily_limit,
+            "used": used,
+            "remaining": max(0, self._daily_limit - used),
+            "available": {priority.name: max(0, self.allowance(priority) - used) for priority in QuotaPriority},
+        }
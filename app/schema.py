@@ -44,6 +44,7 @@ class NewVideoSchema(BaseModel):
     video_title: str = ""
     video_url: str = ""
     video_id: str = ""
+    detected_at: Optional[float] = None  # time.time() обнаружения видео, для замера задержки до публикации
 
 
 class VideoDownloadSchema(NewVideoSchema):
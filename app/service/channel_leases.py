@@ -0,0 +1,195 @@
+"""
+Распределение сканирования каналов между процессами и узлами через аренду в таблице `channel_scan_jobs`.
+
+Каждый процесс мониторинга регистрирует каналы своего списка и забирает каналы, срок сканирования которых
+подошёл, через `SELECT ... FOR UPDATE SKIP LOCKED`. Пока канал обрабатывается, аренда продлевается heartbeat;
+после обработки канал освобождается, и следующее сканирование назначается через интервал мониторинга.
+Если процесс упал, аренда истекает, и канал забирает другой процесс.
+
+Демонстрация масштабирования (нужна БД с применёнными миграциями), запуск из корня проекта:
+    python -m app.service.channel_leases --workers 1 2 4 --channels 200 --scan-time 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import time
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass
+from multiprocessing import Process, Queue
+from typing import AsyncIterator, Optional
+
+from app.config import logger, settings
+from app.db.async_repository import ChannelScanJobRepository
+from app.db.base import async_engine, async_repository_scope, engine
+
+
+@dataclass
+class Lease:
+    """Аренда канала внутри `ChannelLeaser.hold`. Интервал до следующего сканирования можно изменить до выхода."""
+
+    channel_url: str
+    interval: int
+
+
+def get_worker_id() -> str:
+    return f"{settings.worker_id or socket.gethostname()}:{os.getpid()}"
+
+
+class ChannelLeaser:
+    """Аренда каналов одного вида сканирования (`kind`) для списка каналов процесса."""
+
+    def __init__(
+        self,
+        kind: str,
+        channel_urls: list[str],
+        interval: int,
+        list_name: Optional[str] = None,
+        lease: int = settings.scan_lease_duration,
+        heartbeat: int = settings.scan_lease_heartbeat,
+        worker_id: Optional[str] = None,
+    ):
+        self._kind = kind
+        self._channel_urls = channel_urls
+        self._interval = interval
+        self._list_name = list_name
+        self._lease = lease
+        self._heartbeat = max(1, min(heartbeat, lease // 2))
+        self._worker_id = worker_id or get_worker_id()
+        self._registered = False
+
+    async def claim(self) -> Optional[str]:
+        """Забирает один канал, срок сканирования которого подошёл. Возвращает None, если таких каналов нет."""
+        try:
+            async with async_repository_scope(ChannelScanJobRepository) as repository:
+                if not self._registered:
+                    created = await repository.register(self._kind, self._channel_urls, self._list_name)
+                    self._registered = True
+                    logger.info(f"({self._kind}) Registered {created} new channel scan jobs as {self._worker_id}")
+                claimed = await repository.claim(self._kind, self._channel_urls, self._worker_id, self._lease)
+        except Exception as e:
+            logger.error(f"({self._kind}) Failed to claim a channel: {e}")
+            return None
+        return claimed[0] if claimed else None
+
+    @asynccontextmanager
+    async def hold(self, channel_url: str) -> AsyncIterator[Lease]:
+        """Продлевает аренду канала, пока выполняется блок `async with`, и освобождает канал после него."""
+        heartbeat = asyncio.create_task(self._keep_alive(channel_url))
+        lease = Lease(channel_url, self._interval)
+        error = None
+        try:
+            yield lease
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            heartbeat.cancel()
+            with suppress(asyncio.CancelledError):
+                await heartbeat
+            await self._release(channel_url, lease.interval, error)
+
+    async def _keep_alive(self, channel_url: str) -> None:
+        while True:
+            await asyncio.sleep(self._heartbeat)
+            try:
+                async with async_repository_scope(ChannelScanJobRepository) as repository:
+                    held = await repository.heartbeat(self._kind, channel_url, self._worker_id, self._lease)
+            except Exception as e:
+                logger.error(f"({self._kind}) Failed to extend lease of {channel_url}: {e}")
+                continue
+            if not held:
+                logger.warning(f"({self._kind}) Lease of {channel_url} was taken over by another worker")
+                return
+
+    async def _release(self, channel_url: str, interval: int, error: Optional[str]) -> None:
+        try:
+            async with async_repository_scope(ChannelScanJobRepository) as repository:
+                released = await repository.release(self._kind, channel_url, self._worker_id, interval, error=error)
+        except Exception as e:
+            logger.error(f"({self._kind}) Failed to release lease of {channel_url}: {e}")
+            return
+        if not released:
+            logger.warning(f"({self._kind}) Lease of {channel_url} expired before the scan finished")
+
+    async def get_status(self) -> dict[str, int]:
+        try:
+            async with async_repository_scope(ChannelScanJobRepository) as repository:
+                return await repository.get_status(self._kind, self._channel_urls)
+        except Exception as e:
+            logger.error(f"({self._kind}) Failed to get channel lease status: {e}")
+            return {}
+
+
+async def _demo_worker(kind: str, channel_urls: list[str], scan_time: float, results: Queue) -> None:
+    leaser = ChannelLeaser(kind, channel_urls, interval=24 * 60 * 60, lease=60, heartbeat=20)
+    scanned = []
+    while (channel_url := await leaser.claim()) is not None:
+        async with leaser.hold(channel_url):
+            await asyncio.sleep(scan_time)  # Имитация сканирования канала
+        scanned.append(channel_url)
+    results.put((get_worker_id(), scanned))
+
+
+def _run_demo_worker(*args) -> None:
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+    asyncio.run(_demo_worker(*args))
+
+
+async def _reset_demo_jobs(kind: str, channel_urls: list[str]) -> None:
+    async with async_repository_scope(ChannelScanJobRepository) as repository:
+        await repository.unregister(kind)
+        if channel_urls:
+            await repository.register(kind, channel_urls, "demo")
+    await async_engine.dispose()
+
+
+def run_demo(workers: int, channels: int, scan_time: float) -> dict:
+    """
+    Сканирует `channels` фиктивных каналов силами `workers` процессов и проверяет, что каждый канал
+    просканирован ровно один раз. Возвращает время прохода, скорость и распределение каналов по процессам.
+    """
+    kind = "demo"
+    channel_urls = [f"https://www.youtube.com/@demo_channel_{i}" for i in range(channels)]
+    asyncio.run(_reset_demo_jobs(kind, channel_urls))
+
+    results: Queue = Queue()
+    started = time.monotonic()
+    processes = [
+        Process(target=_run_demo_worker, args=(kind, channel_urls, scan_time, results)) for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    per_worker = dict(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    elapsed = time.monotonic() - started
+
+    scanned = [channel_url for urls in per_worker.values() for channel_url in urls]
+    asyncio.run(_reset_demo_jobs(kind, []))
+    return {
+        "workers": workers,
+        "elapsed": round(elapsed, 2),
+        "channels_per_min": round(len(scanned) / elapsed * 60, 1),
+        "scanned": len(scanned),
+        "duplicates": len(scanned) - len(set(scanned)),
+        "missed": len(set(channel_urls) - set(scanned)),
+        "per_worker": sorted(len(urls) for urls in per_worker.values()),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Numbers of worker processes")
+    parser.add_argument("--channels", type=int, default=200, help="Number of fake channels")
+    parser.add_argument("--scan-time", type=float, default=0.2, help="Simulated scan time per channel (seconds)")
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        print(run_demo(workers, args.channels, args.scan_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import asyncio
+import time
+from contextlib import suppress
+from pathlib import Path
+from typing import Optional
+
+from app.config import logger, settings
+from app.db.async_repository import DOWNLOAD_JOBS_CHANNEL, ClaimedDownloadJob, DownloadJobRepository
+from app.db.base import async_repository_scope, listen
+from app.integrations.ytdlp import DEFAULT_VIDEO_FORMAT, YTChannelDownloader
+from app.schema import VideoDownloadSchema
+
+
+async def enqueue_download(
+    video: VideoDownloadSchema, publish_chats: Optional[list[str]] = None, format: str = DEFAULT_VIDEO_FORMAT
+) -> bool:
+    """
+    Добавляет видео в очередь скачивания `download_jobs`; после скачивания видео публикуется в чаты `publish_chats`.
+    Возвращает False, если видео уже в очереди.
+    """
+    async with async_repository_scope(DownloadJobRepository) as repository:
+        return await repository.enqueue(video, format, publish_chats=publish_chats)
+
+
+class DownloadManager:
+    """
+    Скачивание видео по очереди `download_jobs` в `slots` параллельных слотах.
+
+    Задания хранятся в БД и не теряются при перезапуске; прерванное скачивание докачивается с места остановки
+    (`yt-dlp --continue`). Общее ограничение скорости `rate_limit` делится поровну между слотами, занятыми
+    на момент начала скачивания: единственное скачивание получает весь лимит.
+    Число одновременных процессов yt-dlp дополнительно ограничено `settings.ytdlp_max_processes`.
+    О новых заданиях менеджер узнаёт через `LISTEN download_jobs` и сразу будит свободные слоты; опрос очереди
+    раз в `settings.download_poll_interval` секунд остаётся для отложенных повторов и на случай потери соединения.
+    После скачивания у форматов видео заполняются `file_path` и `is_downloaded`, а задания с `publish`
+    в той же транзакции добавляют видео в очередь публикаций `telegram_outbox` для каждого чата из `publish_chats`.
+    """
+
+    def __init__(
+        self,
+        slots: int = settings.download_slots,
+        rate_limit: int = settings.download_rate_limit,
+        report_every: int = 10,
+    ):
+        self._slots = max(1, slots)
+        self._rate_limit = max(0, rate_limit)
+        self._busy = 0  # Число слотов, скачивающих видео в данный момент
+        self._report_every = report_every
+        self._started = time.monotonic()
+        self.stats = {"downloaded": 0, "failed": 0, "bytes": 0}
+        self._wakeup = asyncio.Event()
+
+    async def run(self) -> None:
+        """Запускает слоты скачивания и подписку на уведомления о новых заданиях."""
+        logger.info(f"Starting download manager: {self._slots} slots, total rate limit: {self._rate_limit}")
+        self._started = time.monotonic()
+        await asyncio.gather(
+            listen(DOWNLOAD_JOBS_CHANNEL, self._on_notify, settings.download_poll_interval),
+            *(self._slot() for _ in range(self._slots)),
+        )
+
+    def _on_notify(self, payload: str) -> None:
+        logger.debug(f"(DOWNLOADS) New download job: {payload}")
+        self._wakeup.set()
+
+    async def _wait_for_jobs(self) -> None:
+        """Ждёт уведомления о новом задании, но не дольше `settings.download_poll_interval` секунд."""
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._wakeup.wait(), settings.download_poll_interval)
+
+    async def _slot(self) -> None:
+        while True:
+            # Сбрасываем до запроса, чтобы уведомление, пришедшее во время запроса, не потерялось
+            self._wakeup.clear()
+            try:
+                async with async_repository_scope(DownloadJobRepository) as repository:
+                    jobs = await repository.claim(1, settings.download_lease)
+            except Exception as e:
+                logger.error(f"(DOWNLOADS) Failed to claim a download job: {e}")
+                jobs = []
+            if not jobs:
+                await self._wait_for_jobs()
+                continue
+            self._busy += 1
+            try:
+                await self._download(jobs[0])
+            finally:
+                self._busy -= 1
+
+            if (self.stats["downloaded"] + self.stats["failed"]) % self._report_every == 0:
+                logger.info(f"(DOWNLOADS) {await self.get_report()}")
+
+    async def _download(self, job: ClaimedDownloadJob) -> None:
+        video = VideoDownloadSchema(**(job.payload or {}))
+        video.video_file_download_path = job.file_path
+        video.video_url = job.video_url
+        Path(job.file_path).parent.mkdir(parents=True, exist_ok=True)
+        format_ids: list[str] = []
+        try:
+            result = await YTChannelDownloader.download_video(
+                video, format=job.format, rate_limit=self._get_rate_limit()
+            )
+            error = result.stderr.strip() or "yt-dlp failed" if result.returncode != 0 else None
+            format_ids = self._parse_format_ids(result.stdout)
+        except Exception as e:
+            error = str(e)
+        size = Path(job.file_path).stat().st_size if error is None and Path(job.file_path).exists() else 0
+
+        try:
+            async with async_repository_scope(DownloadJobRepository) as repository:
+                if error is None:
+                    await repository.complete(job, size, format_ids)
+                else:
+                    await repository.fail(job, error, settings.download_max_attempts, settings.download_retry_delay)
+        except Exception as e:
+            logger.error(f"(DOWNLOADS) Failed to save the result of download job {job.id} ({job.video_id}): {e}")
+            return
+
+        if error is not None:
+            self.stats["failed"] += 1
+            logger.warning(f"(DOWNLOADS) Download of {job.video_id} failed (attempt {job.attempts}): {error}")
+            return
+        self.stats["downloaded"] += 1
+        self.stats["bytes"] += size
+
+    def _get_rate_limit(self) -> int:
+        """Доля общего ограничения скорости для нового скачивания. Не меньше 1 байта/с: 0 означал бы без ограничения."""
+        if self._rate_limit == 0:
+            return 0
+        return max(1, self._rate_limit // max(1, self._busy))
+
+    @staticmethod
+    def _parse_format_ids(stdout: str) -> list[str]:
+        """Извлекает id форматов из вывода `--print after_move:%(format_id)s` (например, "137+140")."""
+        lines = [line.strip() for line in stdout.splitlines() if line.strip()]
+        return lines[-1].split("+") if lines else []
+
+    async def get_report(self) -> dict:
+        """Скорость скачивания (видео в минуту, МБ/с) с момента запуска и глубина очереди по статусам."""
+        elapsed = time.monotonic() - self._started
+        try:
+            async with async_repository_scope(DownloadJobRepository) as repository:
+                backlog = await repository.get_backlog()
+        except Exception as e:
+            logger.error(f"(DOWNLOADS) Failed to get download queue backlog: {e}")
+            backlog = {}
+        return {
+            **self.stats,
+            "videos_per_min": round(self.stats["downloaded"] / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            "mb_per_sec": round(self.stats["bytes"] / elapsed / 1024 / 1024, 2) if elapsed > 0 else 0.0,
+            "queue": backlog,
+        }
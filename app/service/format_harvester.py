@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from app.config import logger, settings
+from app.db.async_repository import ClaimedFormatJob, FormatQueueRepository
+from app.db.base import async_repository_scope
+from app.integrations.ytdlp import YTChannelDownloader
+
+
+class FormatHarvester:
+    """
+    Сбор форматов видео через yt-dlp по очереди `format_harvest_queue`.
+
+    Каждый проход добавляет в очередь видео без форматов, после чего `workers` обработчиков забирают задания
+    из очереди по одному, пока не останется готовых к обработке заданий. Все форматы видео сохраняются
+    одним запросом вместе с удалением задания. Неудачные задания повторяются с растущей паузой.
+    Число одновременных процессов yt-dlp дополнительно ограничено `settings.ytdlp_max_processes`.
+    """
+
+    def __init__(self, workers: int = settings.formats_workers, progress_every: int = 100):
+        self._workers = max(1, workers)
+        self._progress_every = progress_every
+        self._stats: dict[str, int] = {}
+        self._started = 0.0
+
+    async def run_pass(self) -> dict:
+        """
+        Выполняет один проход по очереди. Возвращает статистику прохода: число добавленных в очередь,
+        обработанных и неудачных видео, сохранённых форматов, скорость (видео в минуту) и размер очереди.
+        """
+        async with async_repository_scope(FormatQueueRepository) as repository:
+            enqueued = await repository.enqueue_missing(settings.formats_enqueue_batch)
+        logger.info(f"(FORMATS) Enqueued {enqueued} videos without formats")
+
+        self._stats = {"harvested": 0, "failed": 0, "formats": 0}
+        self._started = time.monotonic()
+        await asyncio.gather(*(self._worker() for _ in range(self._workers)))
+        return {"enqueued": enqueued, **self._get_progress(), "backlog": await self.get_backlog()}
+
+    @staticmethod
+    async def get_backlog() -> dict[str, int]:
+        async with async_repository_scope(FormatQueueRepository) as repository:
+            return await repository.get_backlog()
+
+    def _get_progress(self) -> dict:
+        elapsed = time.monotonic() - self._started
+        processed = self._stats["harvested"] + self._stats["failed"]
+        return {
+            **self._stats,
+            "elapsed": round(elapsed, 1),
+            "videos_per_min": round(processed / elapsed * 60, 1) if elapsed > 0 else 0.0,
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            async with async_repository_scope(FormatQueueRepository) as repository:
+                jobs = await repository.claim(1, settings.formats_lease)
+            if not jobs:
+                return
+            await self._harvest(jobs[0])
+
+            processed = self._stats["harvested"] + self._stats["failed"]
+            if processed % self._progress_every == 0:
+                logger.info(f"(FORMATS) Progress: {self._get_progress()}")
+
+    async def _harvest(self, job: ClaimedFormatJob) -> None:
+        try:
+            formats = await YTChannelDownloader.get_video_formats(job.youtube_video_id)
+            error = "yt-dlp returned no formats"
+        except Exception as e:
+            formats, error = [], str(e)
+
+        async with async_repository_scope(FormatQueueRepository) as repository:
+            if formats:
+                stored = await repository.complete(job.video_id, formats)
+                self._stats["harvested"] += 1
+                self._stats["formats"] += stored
+                logger.debug(f"Added {stored} video formats for v_id: {job.youtube_video_id}")
+            else:
+                await repository.fail(job, error, settings.formats_max_attempts, settings.formats_retry_delay)
+                self._stats["failed"] += 1
+                logger.warning(
+                    f"Failed to harvest formats for v_id: {job.youtube_video_id} (attempt {job.attempts}): {error}"
+                )
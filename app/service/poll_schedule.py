@@ -0,0 +1,124 @@
+"""
+Адаптивная частота проверки каналов на новые видео.
+
+Интервал проверки канала подбирается по датам его последних загрузок (`videos.upload_date`): активные каналы
+проверяются часто, давно молчащие - редко. Расписание хранится в `channel_scan_jobs` (`next_run_at`,
+`poll_interval`), поэтому перезапуск процесса не сбрасывает его.
+"""
+
+import heapq
+import statistics
+import time
+from datetime import datetime
+from typing import Optional
+
+from app.config import logger, settings
+from app.db.async_repository import AsyncYoutubeDataRepository, ChannelScanJobRepository
+from app.db.base import async_repository_scope
+
+
+def compute_poll_interval(
+    upload_dates: list[datetime],
+    now: datetime,
+    min_interval: int = settings.adaptive_min_interval,
+    max_interval: int = settings.adaptive_max_interval,
+    checks_per_upload: int = settings.adaptive_checks_per_upload,
+) -> int:
+    """
+    Вычисляет интервал проверки канала (в секундах) по датам его последних загрузок.
+
+    Ожидаемый промежуток до следующей загрузки - медиана промежутков между последними загрузками. Если канал
+    молчит дольше двух таких промежутков, ожидаемым промежутком считается половина времени с последней загрузки,
+    и канал проверяется всё реже. Канал проверяется `checks_per_upload` раз за ожидаемый промежуток.
+    Для канала без известных дат загрузки возвращается `min_interval`.
+    """
+    dates = sorted(upload_dates, reverse=True)
+    if not dates:
+        return min_interval
+    since_last = max(0.0, (now - dates[0]).total_seconds())
+    gaps = [(newer - older).total_seconds() for newer, older in zip(dates, dates[1:])]
+    typical_gap = statistics.median(gaps) if gaps else 0.0
+    expected_gap = max(typical_gap, since_last / 2)
+    return int(min(max_interval, max(min_interval, expected_gap / max(1, checks_per_upload))))
+
+
+async def get_channel_poll_interval(channel_id: Optional[str]) -> int:
+    """Интервал проверки канала по его загрузкам в БД. Если channel_id неизвестен или БД недоступна - минимальный."""
+    if not channel_id:
+        return settings.adaptive_min_interval
+    try:
+        async with async_repository_scope(AsyncYoutubeDataRepository) as repository:
+            upload_dates = await repository.get_recent_upload_dates(channel_id, settings.adaptive_history_size)
+    except Exception as e:
+        logger.error(f"Failed to get upload dates of channel {channel_id}: {e}")
+        return settings.adaptive_min_interval
+    return compute_poll_interval(upload_dates, datetime.now())
+
+
+class ChannelPollScheduler:
+    """
+    Очередь с приоритетом из каналов процесса, упорядоченная по времени следующей проверки.
+
+    При первом обращении расписание загружается из `channel_scan_jobs` (новые каналы должны быть проверены сразу),
+    после каждой проверки канал возвращается в очередь с новым интервалом, и расписание сохраняется в БД.
+    """
+
+    def __init__(self, kind: str, channel_urls: list[str], list_name: Optional[str] = None):
+        self._kind = kind
+        self._channel_urls = channel_urls
+        self._list_name = list_name
+        self._queue: list[tuple[float, str]] = []  # (time.monotonic() следующей проверки, channel_url)
+        self._intervals: dict[str, int] = {}
+        self._loaded = False
+
+    async def load(self) -> None:
+        schedule: dict[str, tuple[float, Optional[int]]] = {}
+        try:
+            async with async_repository_scope(ChannelScanJobRepository) as repository:
+                await repository.register(self._kind, self._channel_urls, self._list_name)
+                schedule = await repository.get_schedule(self._kind, self._channel_urls)
+        except Exception as e:
+            logger.error(f"({self._kind}) Failed to load channel poll schedule, polling all channels now: {e}")
+        now = time.monotonic()
+        self._queue = []
+        for channel_url in self._channel_urls:
+            due_in, interval = schedule.get(channel_url, (0.0, None))
+            self._queue.append((now + max(0.0, due_in), channel_url))
+            self._intervals[channel_url] = interval or settings.adaptive_min_interval
+        heapq.heapify(self._queue)
+        self._loaded = True
+        logger.info(f"({self._kind}) Channel poll schedule loaded: {self.get_stats()}")
+
+    async def pop_due(self) -> Optional[str]:
+        """Извлекает канал, время проверки которого наступило. Возвращает None, если таких каналов нет."""
+        if not self._loaded:
+            await self.load()
+        if self._queue and self._queue[0][0] <= time.monotonic():
+            return heapq.heappop(self._queue)[1]
+        return None
+
+    async def reschedule(self, channel_url: str, interval: int, error: Optional[str] = None) -> None:
+        """Возвращает канал в очередь через `interval` секунд и сохраняет расписание в БД."""
+        heapq.heappush(self._queue, (time.monotonic() + interval, channel_url))
+        self._intervals[channel_url] = interval
+        try:
+            async with async_repository_scope(ChannelScanJobRepository) as repository:
+                await repository.reschedule(self._kind, channel_url, interval, error=error)
+        except Exception as e:
+            logger.error(f"({self._kind}) Failed to save poll schedule of {channel_url}: {e}")
+
+    def get_delay(self) -> float:
+        """Сколько секунд осталось до следующей проверки."""
+        if not self._queue:
+            return float(settings.adaptive_max_interval)
+        return max(0.0, self._queue[0][0] - time.monotonic())
+
+    def get_stats(self) -> dict:
+        """Число каналов, проверок в час при текущих интервалах, медианный интервал и время до следующей проверки."""
+        intervals = list(self._intervals.values())
+        return {
+            "channels": len(self._channel_urls),
+            "polls_per_hour": round(sum(3600 / interval for interval in intervals), 1),
+            "median_interval": int(statistics.median(intervals)) if intervals else 0,
+            "next_in": round(self.get_delay(), 1),
+        }
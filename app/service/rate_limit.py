@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Ограничение частоты операций: в среднем `rate` операций в секунду, до `capacity` операций подряд.
+
+    Токены накапливаются со временем, поэтому после простоя операция выполняется сразу, а пауза нужна только
+    при превышении частоты.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self._rate = rate
+        self._capacity = max(1, capacity)
+        self._tokens = float(self._capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + max(0.0, now - self._updated) * self._rate)
+        self._updated = now
+
+    def pause(self, seconds: float) -> None:
+        """Запрещает операции на `seconds` секунд (например, по `RetryAfter` от API)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        """Ждёт, пока появится токен, и забирает его. При `rate` <= 0 частота не ограничена, но паузы действуют."""
+        async with self._lock:
+            paused = self._paused_until - time.monotonic()
+            if paused > 0:
+                await asyncio.sleep(paused)
+                # После паузы разрешаем одну операцию, без накопленного за паузу запаса
+                self._tokens = min(self._tokens, 1.0)
+                self._updated = time.monotonic()
+            if self._rate <= 0:
+                return
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class ChatRateLimiter:
+    """
+    Ограничение частоты отправки сообщений ботом: общий `TokenBucket` на все чаты и отдельный на каждый чат.
+
+    Отправка в чат ждёт сначала токен своего чата, затем общий, поэтому медленный чат не задерживает остальные.
+    """
+
+    def __init__(self, global_rate: float, global_burst: int, chat_rate: float, chat_burst: int):
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._chats: dict[str, TokenBucket] = {}
+
+    def _get_bucket(self, chat_id: str) -> TokenBucket:
+        if chat_id not in self._chats:
+            self._chats[chat_id] = TokenBucket(self._chat_rate, self._chat_burst)
+        return self._chats[chat_id]
+
+    async def acquire(self, chat_id: str) -> None:
+        """Ждёт, пока отправка сообщения в чат будет разрешена обоими ограничениями."""
+        await self._get_bucket(chat_id).acquire()
+        await self._global.acquire()
+
+    def pause(self, chat_id: str, seconds: float) -> None:
+        """Приостанавливает отправку в чат на `seconds` секунд."""
+        self._get_bucket(chat_id).pause(seconds)
@@ -1,44 +1,69 @@
 import asyncio
 import time
 from asyncio import AbstractEventLoop
-from multiprocessing import Process, Queue
+from collections import deque
+from contextlib import suppress
+from multiprocessing import Process
 from pathlib import Path
-from queue import Empty
+from typing import Optional
 
-from jinja2 import Template, TemplateSyntaxError
 from telegram import Bot, LinkPreviewOptions, Update
-from telegram.error import TelegramError
+from telegram.error import RetryAfter, TelegramError
 from telegram.ext import Application
 from telegram.helpers import escape_markdown
 
 from app.config import logger, settings
+from app.db.async_repository import ClaimedPublication, TelegramOutboxRepository
+from app.db.base import async_engine, async_repository_scope, engine, listen
+from app.db.repository import TELEGRAM_OUTBOX_CHANNEL
 from app.integrations.telegram import get_telegram_handlers
 from app.schema import NewVideoSchema, VideoDownloadSchema
+from app.service.rate_limit import ChatRateLimiter
+from app.service.template_renderer import template_renderer
 from app.service.utils import extract_hashtags, get_channel_hashtag
 
 
 class TelegramBotService:
-    """Класс для публикации сообщений в Telegram."""
-
-    def __init__(self, bot_token: str, group_id: str, msg_queue: Queue, shorts_queue: Queue = None, delay: int = 30):
+    """
+    Класс для публикации сообщений в Telegram.
+
+    Видео публикуются из `telegram_outbox` в чаты, указанные в публикациях. Частота отправки ограничена
+    отдельно для каждого чата (`settings.tg_send_interval`) и для бота в целом (`settings.tg_global_rate`),
+    поэтому при всплеске загрузок сообщения уходят с максимально допустимой частотой, а `RetryAfter`
+    от Telegram API приостанавливает отправку в чат на указанное время.
+    """
+
+    def __init__(
+        self,
+        bot_token: str,
+        delay: float = settings.tg_send_interval,
+        global_rate: float = settings.tg_global_rate,
+    ):
         self._bot_token = bot_token
-        self._group_id = group_id
-        self._messages_queue = msg_queue
-        self._shorts_queue = shorts_queue
-        self._delay = delay  # Задержка между отправками сообщений с новыми видео
+        self._rate_limiter = ChatRateLimiter(
+            global_rate=global_rate,
+            global_burst=settings.tg_global_burst,
+            chat_rate=1 / delay if delay > 0 else 0,
+            chat_burst=settings.tg_send_burst,
+        )
+        self._latencies: deque[float] = deque(maxlen=1000)
+        self._posted = 0
+        self._latency_report_every = 10
         self._max_retries = 3  # Максимальное количество попыток запуска бота и отправки сообщений
         self._retry_delay = 5  # Задержка между неудачными попытками (в секундах)
-        # self._repository = YoutubeVideoRepository(session=Session())
         logger.info("Telegram bot is created")
 
     def run(self):
-        """Запускает поток для публикации сообщений из очереди."""
+        """Запускает процесс бота, публикующего видео из `telegram_outbox`."""
         process = Process(target=self._start)
         process.start()
         return process
 
     def _start(self):
         """Инициализация всех обработчиков и запуск бота."""
+        # Соединения, унаследованные от родительского процесса, не используются в процессе бота
+        engine.dispose(close=False)
+        async_engine.sync_engine.dispose(close=False)
         for attempt in range(1, self._max_retries + 1):
             try:
                 application = Application.builder().token(self._bot_token).build()
@@ -48,10 +73,7 @@ class TelegramBotService:
                 # Создаём новый event loop для асинхронных задач
                 loop = asyncio.new_event_loop()
                 asyncio.set_event_loop(loop)
-                if settings.monitor_new:
-                    loop.create_task(self._publish_messages(application.bot))
-                if settings.run_tg_bot_shorts_publish:
-                    loop.create_task(self._publish_shorts_videos(application.bot))
+                loop.create_task(self._publish_outbox(application.bot))
 
                 try:
                     logger.info("Starting Telegram bot...")
@@ -99,90 +121,163 @@ class TelegramBotService:
         except Exception as e:
             logger.error(f"Error during shutdown: {e}")
 
-    async def _publish_messages(self, bot: Bot):
-        """Публикация сообщений из очереди каждые N секунд."""
-        await asyncio.sleep(5)
-        logger.info("News feed Bot is running...")
-
+    async def _publish_outbox(self, bot: Bot):
+        """
+        Публикация видео из `telegram_outbox`. Каждый чат разбирается отдельной задачей, поэтому медленный чат
+        или пауза по `RetryAfter` не задерживают остальные. О новых публикациях бот узнаёт через
+        `LISTEN telegram_outbox`; раз в `settings.tg_outbox_poll_interval` секунд очередь проверяется и без
+        уведомления (отложенные повторы, потеря соединения).
+        """
+        logger.info("Telegram outbox publisher is running...")
+        wakeup = asyncio.Event()
+        listener = asyncio.create_task(
+            listen(TELEGRAM_OUTBOX_CHANNEL, lambda payload: wakeup.set(), settings.tg_outbox_poll_interval)
+        )
+        chats: dict[str, asyncio.Task] = {}
+        try:
+            while True:
+                # Сбрасываем до запроса, чтобы уведомление, пришедшее во время запроса, не потерялось
+                wakeup.clear()
+                try:
+                    async with async_repository_scope(TelegramOutboxRepository) as repository:
+                        due_chats = await repository.get_due_chats()
+                except Exception as e:
+                    logger.error(f"(TGBot) Failed to get chats with pending publications: {e}")
+                    due_chats = []
+                for chat_id in due_chats:
+                    if chat_id not in chats or chats[chat_id].done():
+                        chats[chat_id] = asyncio.create_task(self._publish_to_chat(bot, chat_id))
+                        # Завершившаяся задача будит цикл: в чат могли прийти публикации, пока она работала
+                        chats[chat_id].add_done_callback(lambda task: wakeup.set())
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(wakeup.wait(), settings.tg_outbox_poll_interval)
+        finally:
+            listener.cancel()
+            for task in chats.values():
+                task.cancel()
+
+    async def _publish_to_chat(self, bot: Bot, chat_id: str) -> None:
+        """Публикует видео одного чата по порядку, пока у чата есть готовые к отправке публикации."""
         while True:
             try:
-                # Получаем сообщение из очереди
-                logger.debug("(TGBot) Checking messages queue...")
-                video: NewVideoSchema = self._messages_queue.get(block=False, timeout=5)  # Ждём сообщение
-                logger.debug(f"video={video}")
-
-                message = self._format_newvideo_message(
-                    video.channel_name, video.channel_url, video.video_title, video.video_url
-                )
-                logger.info(f"(TGBot) Sending message to {self._group_id}:\n{message}")
-
-                await self._send_message_with_retries(bot, self._group_id, message, video_url=video.video_url)
-
-                # Задержка между отправками сообщений
-                await asyncio.sleep(self._delay)
-            except Empty:
-                # Если очередь пуста после таймаута, ничего не делаем и продолжаем ждать
-                await asyncio.sleep(self._delay)
-                continue
+                async with async_repository_scope(TelegramOutboxRepository) as repository:
+                    publications = await repository.claim_chat(
+                        chat_id, settings.tg_outbox_batch, settings.tg_outbox_lease
+                    )
             except Exception as e:
-                logger.error(f"(TGBot) Ошибка при отправке сообщения: {e}")
-
-    async def _publish_shorts_videos(self, bot: Bot):
-        """Публикация shorts из очереди каждые N секунд."""
-        if self._shorts_queue is None:
-            return
-        await asyncio.sleep(5)
-        logger.info("Shorts publisher Bot is running...")
+                logger.error(f"(TGBot) Failed to claim publications to {chat_id}: {e}")
+                return
+            if not publications:
+                return
+            pending = list(publications)
+            heartbeat = asyncio.create_task(self._keep_alive(pending))
+            try:
+                for publication in publications:
+                    await self._publish(bot, publication)
+                    pending.remove(publication)
+            finally:
+                heartbeat.cancel()
 
+    @staticmethod
+    async def _keep_alive(publications: list[ClaimedPublication]) -> None:
+        """Продлевает аренду неотправленных публикаций, чтобы их не отправил повторно другой процесс."""
         while True:
+            await asyncio.sleep(settings.tg_outbox_heartbeat)
             try:
-                # Получаем сообщение из очереди
-                logger.debug("(TGBot) Checking shorts queue...")
-                video: VideoDownloadSchema = self._shorts_queue.get(block=False, timeout=10)  # Ждём сообщение
-                logger.debug(f"video={video}")
+                async with async_repository_scope(TelegramOutboxRepository) as repository:
+                    await repository.extend_lease(list(publications), settings.tg_outbox_lease)
+            except Exception as e:
+                logger.error(f"(TGBot) Failed to extend lease of publications: {e}")
 
+    async def _publish(self, bot: Bot, publication: ClaimedPublication) -> None:
+        """Отправляет одну публикацию и сохраняет результат. Неудачная публикация повторяется позже."""
+        error = "Не удалось отправить сообщение после всех попыток"
+        try:
+            if publication.kind == "shorts":
+                video = VideoDownloadSchema(**(publication.payload or {}))
                 message = self._format_shorts_message(
                     video.channel_name, video.channel_url, video.video_title, video.video_url
                 )
-                logger.info(f"(TGBot) Sending message to {self._group_id}:\n{message}")
-
-                await self._send_message_with_retries(
-                    bot, self._group_id, message, video_path=Path(video.video_file_download_path)
+                send_kwargs = {"video_path": Path(video.video_file_download_path)}
+            else:
+                video = NewVideoSchema(**(publication.payload or {}))
+                message = self._format_newvideo_message(
+                    video.channel_name, video.channel_url, video.video_title, video.video_url
                 )
+                send_kwargs = {"video_url": video.video_url}
+            logger.info(f"(TGBot) Sending message to {publication.chat_id}:\n{message}")
+            sent = await self._send_message_with_retries(bot, publication.chat_id, message, **send_kwargs)
+        except Exception as e:
+            logger.error(f"(TGBot) Ошибка при отправке сообщения: {e}")
+            sent, error = False, str(e)
 
-                # Задержка между отправками сообщений
-                await asyncio.sleep(self._delay)
-            except Empty:
-                # Если очередь пуста после таймаута, ничего не делаем и продолжаем ждать
-                await asyncio.sleep(self._delay)
-                continue
-            except Exception as e:
-                logger.error(f"(TGBot) Ошибка при отправке сообщения: {e}")
+        try:
+            async with async_repository_scope(TelegramOutboxRepository) as repository:
+                if sent:
+                    await repository.mark_sent(publication)
+                else:
+                    await repository.fail(
+                        publication, error, settings.tg_outbox_max_attempts, settings.tg_outbox_retry_delay
+                    )
+        except Exception as e:
+            # Публикация останется в аренде и после её истечения будет отправлена ещё раз
+            logger.error(
+                f"(TGBot) Failed to save the result of publication {publication.video_id} to {publication.chat_id}: {e}"
+            )
+        if sent:
+            self._record_latency(video)
+
+    def _record_latency(self, video: NewVideoSchema) -> None:
+        """Запоминает задержку от обнаружения видео до публикации и периодически выводит её статистику."""
+        if video.detected_at is None:
+            return
+        latency = time.time() - video.detected_at
+        self._latencies.append(latency)
+        logger.info(f"(TGBot) Video {video.video_id} posted {latency:.1f}s after detection")
+        self._posted += 1
+        if self._posted % self._latency_report_every == 0:
+            logger.info(f"(LATENCY) {self.get_latency_stats()}")
+
+    def get_latency_stats(self) -> dict:
+        """Задержка от обнаружения видео до публикации (в секундах) по последним опубликованным видео."""
+        latencies = sorted(self._latencies)
+        if not latencies:
+            return {"posted": self._posted}
+        return {
+            "posted": self._posted,
+            "p50": round(latencies[len(latencies) // 2], 1),
+            "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+            "max": round(latencies[-1], 1),
+        }
 
     async def _send_message_with_retries(
         self, bot: Bot, chat_id: str, text: str, video_path: Path = None, video_url: Path = None
-    ):
+    ) -> bool:
         """
-        Отправляет сообщение в Telegram с заданным числом повторных попыток.
+        Отправляет сообщение в Telegram с заданным числом повторных попыток. Возвращает True при успешной отправке.
+        Каждая попытка ждёт разрешения ограничителя частоты; при `RetryAfter` отправка в чат приостанавливается
+        на указанное Telegram время.
 
         :param bot: Экземпляр бота Telegram.
         :param chat_id: ID чата, куда отправляется сообщение.
         :param text: Текст сообщения.
         """
         for attempt in range(1, self._max_retries + 1):
+            await self._rate_limiter.acquire(chat_id)
             try:
                 if video_path is not None and video_path.exists():
                     logger.debug("(TGBot) Sending video...")
-                    await bot.send_video(
-                        chat_id=chat_id,
-                        video=open(video_path, "rb"),
-                        caption=text,
-                        parse_mode="MarkdownV2",
-                        pool_timeout=180,
-                        read_timeout=180,
-                        write_timeout=180,
-                        connect_timeout=180,
-                    )
+                    with open(video_path, "rb") as video_file:
+                        await bot.send_video(
+                            chat_id=chat_id,
+                            video=video_file,
+                            caption=text,
+                            parse_mode="MarkdownV2",
+                            pool_timeout=180,
+                            read_timeout=180,
+                            write_timeout=180,
+                            connect_timeout=180,
+                        )
                     logger.info("(TGBot) Видео успешно отправлено")
                 elif text and video_url:
                     await bot.send_message(
@@ -202,9 +297,13 @@ class TelegramBotService:
                         text=text,
                         parse_mode="MarkdownV2",
                     )
-                    # self._repository.update_tg_post_date(video_id)
                     logger.info("(TGBot) Сообщение успешно отправлено")
-                return  # Успешная отправка, выходим из функции
+                return True  # Успешная отправка, выходим из функции
+            except RetryAfter as e:
+                # Ограничитель сам выдержит паузу перед следующей попыткой
+                logger.warning(f"Flood control в чате {chat_id}: повтор через {e.retry_after} с (попытка {attempt})")
+                self._rate_limiter.pause(chat_id, float(e.retry_after))
+                continue
             except asyncio.TimeoutError:
                 logger.error(f"Timeout error при отправке сообщения (попытка {attempt} из {self._max_retries})")
             except TelegramError as te:
@@ -219,27 +318,20 @@ class TelegramBotService:
                 await asyncio.sleep(self._retry_delay)
 
         logger.error("Не удалось отправить сообщение после всех попыток")
+        return False
 
     @staticmethod
-    def render_template(template_path: Path, **kwargs) -> str:
-        """Загружает и рендерит шаблон с подстановкой значений."""
-        if not template_path.exists():
-            raise FileNotFoundError(f"Шаблон не найден: {template_path}")
-
-        try:
-            with open(template_path, "r", encoding="utf-8") as f:
-                template_content = f.read()
-
-            # Экранируем переменные
-            safe_kwargs = {
-                key: escape_markdown(value, version=2) if key not in {"video_url", "channel_url"} else value
-                for key, value in kwargs.items()
-            }
-
-            template = Template(template_content)
-            return template.render(**safe_kwargs)
-        except TemplateSyntaxError as e:
-            raise ValueError(f"Ошибка в шаблоне {template_path}: {e}")
+    def render_template(template_path: Path, fallback: Optional[Path] = None, **kwargs) -> str:
+        """
+        Рендерит шаблон с подстановкой значений, экранированных для MarkdownV2. Шаблон компилируется один раз
+        и перекомпилируется только при изменении файла (см. `TemplateRenderer`); если его нет - берётся `fallback`.
+        """
+        # Экранируем переменные
+        safe_kwargs = {
+            key: escape_markdown(value, version=2) if key not in {"video_url", "channel_url"} else value
+            for key, value in kwargs.items()
+        }
+        return template_renderer.render(template_path, fallback, **safe_kwargs)
 
     def _format_newvideo_message(self, channel_name: str, channel_url: str, video_title: str, video_url: str):
         """Форматирование сообщения в Markdown формате."""
@@ -249,13 +341,9 @@ class TelegramBotService:
             all_hashtags = f"#Videos #{main_hashtag} {additional_hashtags}"
         else:
             all_hashtags = f"#Videos #{main_hashtag} #YouTube"
-        if settings.tg_new_video_template.exists():
-            new_video_template_path = settings.tg_new_video_template
-        else:
-            logger.warning("New video template not found. Using default template!")
-            new_video_template_path = settings.tg_new_video_template_default
         return self.render_template(
-            new_video_template_path,
+            settings.tg_new_video_template,
+            settings.tg_new_video_template_default,
             video_title=cleaned_title,
             video_url=video_url,
             channel_name=channel_name,
@@ -271,13 +359,9 @@ class TelegramBotService:
             all_hashtags = f"#Shorts #{main_hashtag} {additional_hashtags}"
         else:
             all_hashtags = f"#Shorts #{main_hashtag}"
-        if settings.tg_shorts_template.exists():
-            shorts_template_path = settings.tg_shorts_template
-        else:
-            logger.warning("Shorts template not found. Using default template!")
-            shorts_template_path = settings.tg_shorts_template_default
         return self.render_template(
-            shorts_template_path,
+            settings.tg_shorts_template,
+            settings.tg_shorts_template_default,
             video_title=cleaned_title,
             video_url=video_url,
             channel_name=channel_name,
@@ -0,0 +1,124 @@
+"""
+Рендеринг шаблонов сообщений с кешем скомпилированных шаблонов.
+
+Каждый шаблон компилируется один раз через `jinja2.Environment`; скомпилированный байткод сохраняется
+в `FileSystemBytecodeCache`, поэтому после перезапуска процесса шаблон не компилируется заново. Перед рендерингом
+проверяется только время изменения файла (mtime): изменённый шаблон перечитывается и компилируется снова.
+
+Замер стоимости рендеринга одного сообщения до и после (запуск из корня проекта):
+    python -m app.service.template_renderer --iterations 10000
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from jinja2 import Environment, FileSystemBytecodeCache, FunctionLoader, Template, TemplateNotFound, TemplateSyntaxError
+
+from app.config import logger, settings
+
+
+class TemplateRenderer:
+    """
+    Реестр скомпилированных шаблонов, адресуемых путём к файлу.
+
+    Шаблоны хранятся в LRU-кеше `Environment` (до `cache_size` шаблонов) и перекомпилируются только при изменении
+    mtime файла. Если шаблон не найден, используется `fallback`.
+    """
+
+    def __init__(self, cache_size: int = 50, bytecode_cache_dir: Optional[str] = None):
+        self._env = Environment(
+            loader=FunctionLoader(self._load),
+            bytecode_cache=FileSystemBytecodeCache(bytecode_cache_dir),
+            auto_reload=True,
+            cache_size=cache_size,
+        )
+
+    @staticmethod
+    def _load(name: str) -> Optional[tuple[str, str, Callable[[], bool]]]:
+        path = Path(name)
+        try:
+            mtime = path.stat().st_mtime
+            source = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+        def is_up_to_date() -> bool:
+            try:
+                return os.path.getmtime(path) == mtime
+            except OSError:
+                return False
+
+        logger.debug(f"Compiling template {path}")
+        return source, str(path), is_up_to_date
+
+    def get_template(self, template_path: Path, fallback: Optional[Path] = None) -> Template:
+        """
+        Возвращает скомпилированный шаблон.
+
+        Raises:
+            FileNotFoundError: Если не найден ни шаблон, ни `fallback`.
+            ValueError: Если в шаблоне синтаксическая ошибка.
+        """
+        try:
+            return self._env.get_template(str(template_path))
+        except TemplateNotFound:
+            if fallback is not None and Path(fallback) != Path(template_path):
+                logger.warning(f"Template {template_path} not found. Using {fallback}!")
+                return self.get_template(fallback)
+            raise FileNotFoundError(f"Шаблон не найден: {template_path}")
+        except TemplateSyntaxError as e:
+            raise ValueError(f"Ошибка в шаблоне {template_path}: {e}")
+
+    def render(self, template_path: Path, fallback: Optional[Path] = None, **kwargs) -> str:
+        """Рендерит шаблон с подстановкой значений. См. `get_template`."""
+        return self.get_template(template_path, fallback).render(**kwargs)
+
+
+template_renderer = TemplateRenderer()
+
+
+def _render_uncached(template_path: Path, **kwargs) -> str:
+    """Прежний способ рендеринга: чтение файла и компиляция шаблона на каждое сообщение."""
+    if not template_path.exists():
+        raise FileNotFoundError(f"Шаблон не найден: {template_path}")
+    with open(template_path, "r", encoding="utf-8") as f:
+        template_content = f.read()
+    return Template(template_content).render(**kwargs)
+
+
+def run_benchmark(template_path: Path, iterations: int) -> dict:
+    """Среднее время рендеринга одного сообщения (в микросекундах) без кеша и с кешем шаблонов."""
+    values = {
+        "video_title": "Video title",
+        "video_url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        "channel_name": "Channel",
+        "channel_url": "https://www.youtube.com/@channel",
+        "all_hashtags": "#Videos #Channel #YouTube",
+    }
+    renderer = TemplateRenderer()
+    if renderer.render(template_path, **values) != _render_uncached(template_path, **values):
+        raise RuntimeError("Cached and uncached renders differ")
+
+    results = {"template": str(template_path), "iterations": iterations}
+    for name, render in (("uncached_us", _render_uncached), ("cached_us", renderer.render)):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            render(template_path, **values)
+        results[name] = round((time.perf_counter() - started) / iterations * 1_000_000, 1)
+    results["speedup"] = round(results["uncached_us"] / results["cached_us"], 1)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--template", type=Path, default=settings.tg_new_video_template, help="Template file")
+    parser.add_argument("--iterations", type=int, default=10_000, help="Renders per variant")
+    args = parser.parse_args()
+    print(run_benchmark(args.template, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
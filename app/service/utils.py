@@ -1,7 +1,7 @@
 import json
 import re
 
-from app.config import logger
+from app.config import logger, settings
 
 
 def clean_string(s: str) -> str:
@@ -74,6 +74,21 @@ def load_channels_data(file_path: str = "channels_list.json") -> tuple[list[str]
     return sorted(valid_urls), channels_name
 
 
+def load_channels_chats(file_path: str = "channels_list.json") -> list[str]:
+    """
+    Загружает чаты Telegram, в которые публикуются видео каналов списка (ключ "tg_chats" JSON файла).
+    Если чаты не указаны, видео публикуются в `settings.tg_group_id`.
+    """
+    chats = []
+    if file_path.endswith(".json"):
+        try:
+            with open(file_path, encoding="utf8") as f:
+                chats = [str(chat).strip() for chat in json.load(f).get("tg_chats", []) if str(chat).strip()]
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Не удалось загрузить чаты Telegram из {file_path}: {e}")
+    return list(dict.fromkeys(chats)) or [settings.tg_group_id]
+
+
 if __name__ == "__main__":
     from telegram.helpers import escape_markdown
 
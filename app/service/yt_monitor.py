@@ -1,16 +1,25 @@
 import asyncio
-from multiprocessing import Process, Queue
+import math
+import time
+from multiprocessing import Process
 from pathlib import Path
-from queue import Empty
 from typing import Optional
 
 from app.config import logger, settings
-from app.db.base import Session
+from app.db.async_repository import AsyncYoutubeDataRepository
+from app.db.base import async_engine, async_repository_scope, engine, get_async_pool_metrics, get_pool_metrics
 from app.db.data_table import Channel, ChannelHistory, Thumbnail
-from app.db.repository import YoutubeDataRepository
+from app.db.known_videos import known_videos
+from app.db.partitions import maintain_history_partitions
 from app.integrations.ytapi import YTApiClient
 from app.integrations.ytdlp import YTChannelDownloader
+from app.integrations.ytfeed import YTFeedClient
+from app.integrations.ytquota import QuotaAccountant, QuotaPriority
 from app.schema import ChannelAPIInfoSchema, ChannelInfoSchema, NewVideoSchema, VideoDownloadSchema, VideoSchema
+from app.service.channel_leases import ChannelLeaser
+from app.service.download_manager import DownloadManager, enqueue_download
+from app.service.format_harvester import FormatHarvester
+from app.service.poll_schedule import ChannelPollScheduler, get_channel_poll_interval
 
 
 class YTMonitorService:
@@ -20,8 +29,7 @@ class YTMonitorService:
         channels_name: Optional[str] = None,
         new_videos_timeout: int = 15 * 60,
         history_timeout: int = 8 * 60 * 60,
-        new_videos_queue: Optional[Queue] = None,
-        shorts_videos_queue: Optional[Queue] = None,
+        tg_chats: Optional[list[str]] = None,
     ) -> None:
         if isinstance(channels_list, str):
             channels_list = [channels_list]
@@ -29,18 +37,26 @@ class YTMonitorService:
         self._channels_name = channels_name
         self._new_videos_timeout = new_videos_timeout
         self._history_timeout = history_timeout
-        self._queue = new_videos_queue  # Очередь для обработки новых видео
-        self._shorts_publish_queue = shorts_videos_queue
-        self._download_queue = Queue()
+        self._publish_new = settings.run_tg_bot  # Публиковать новые видео в Telegram (через telegram_outbox)
+        self._tg_chats = tg_chats or [settings.tg_group_id]  # Чаты, в которые публикуются видео списка каналов
         self._shorts_publish = settings.run_tg_bot_shorts_publish
         self._short_download_path = Path(settings.storage_path).expanduser().resolve() / settings.shorts_download_path
         self._video_download_path = Path(settings.storage_path).expanduser().resolve() / settings.video_download_path
+        self._last_full_listing: dict[str, float] = {}  # channel_url -> time.monotonic() последнего полного листинга
+        self._channel_ids: dict[str, str] = {}  # channel_url -> YouTube channel_id
+        self._feed_client = YTFeedClient()
+        self._api_client: Optional[YTApiClient] = None  # Создаётся в процессе мониторинга при первом обращении
+        self._leasers: dict[str, ChannelLeaser] = {}  # kind -> аренда каналов (settings.monitor_leasing)
+        self._schedulers: dict[str, ChannelPollScheduler] = {}  # kind -> расписание проверок (monitor_adaptive)
+        self._partitions_kind = "new"  # Цикл мониторинга, который раз в сутки обслуживает секции таблиц истории
+        self._partitions_checked_at = time.monotonic()  # Секции создаются при запуске приложения
 
     def run(
         self, monitor_new: bool = True, monitor_history: bool = True, monitor_video_formats: bool = True
     ) -> list[Process]:
         """Запускает процессы мониторинга новых видео и истории каналов."""
         processes: list[Process] = []
+        self._partitions_kind = "new" if monitor_new else "history"
 
         if monitor_new:
             new_videos_process = Process(target=self._start_async_loop, args=(self._monitor_new_videos,))
@@ -66,83 +82,239 @@ class YTMonitorService:
 
     def _start_async_loop(self, coro_func, *args, **kwargs):
         """Запускает событийный цикл для асинхронной функции."""
+        # Соединения пула, унаследованные от родительского процесса, не используются: процесс открывает свои
+        engine.dispose(close=False)
+        async_engine.sync_engine.dispose(close=False)
         asyncio.run(coro_func(*args, **kwargs))
 
     async def _monitor_new_videos(self):
         """Мониторинг новых видео с заданным интервалом."""
+        await self._warm_known_videos()
         while True:
             logger.info("Starting new video monitoring...")
-            for i, channel_url in enumerate(self._channels_list):
-                logger.info(f"[{i+1}/{len(self._channels_list)}] Processing new videos for channel: {channel_url}")
-                try:
-                    await self._process_channel_videos(channel_url, process_new=True)
-                except Exception as e:
-                    logger.error(f"Error monitoring new videos for {channel_url}: {e}")
-                await asyncio.sleep(2)
-            logger.info(f"(NEW VIDEOS) Waiting for {self._new_videos_timeout} seconds")
-            await asyncio.sleep(self._new_videos_timeout)
+            await self._maintain_partitions_daily("new")
+            await self._scan_channels(
+                "NEW VIDEOS", settings.monitor_new_workers, self._new_videos_timeout, "new", process_new=True
+            )
+            if settings.monitor_new_feed:
+                logger.info(f"(NEW VIDEOS) Feed stats: {self._feed_client.stats}")
+            await self._log_api_usage("NEW VIDEOS")
+            logger.info(f"(NEW VIDEOS) Known video cache: {known_videos.get_stats()}")
+            logger.info(f"(NEW VIDEOS) DB pool: {get_pool_metrics()}, async: {get_async_pool_metrics()}")
+            pause = self._get_pass_pause(self._new_videos_timeout, "new")
+            logger.info(f"(NEW VIDEOS) Waiting for {pause} seconds")
+            await asyncio.sleep(pause)
 
     async def _monitor_channel_videos_history(self):
         """Мониторинг истории каналов с заданным интервалом."""
         await asyncio.sleep(10)
+        await self._warm_known_videos()
         while True:
             logger.info("Starting channel history monitoring...")
-            for i, channel_url in enumerate(self._channels_list):
-                logger.info(f"[{i+1}/{len(self._channels_list)}] Processing channel history for: {channel_url}")
+            await self._maintain_partitions_daily("history")
+            await self._scan_channels("HISTORY", 1, self._history_timeout, "history", process_old=True)
+            await self._log_api_usage("HISTORY")
+            logger.info(f"(HISTORY) Known video cache: {known_videos.get_stats()}")
+            logger.info(f"(HISTORY) DB pool: {get_pool_metrics()}, async: {get_async_pool_metrics()}")
+            pause = self._get_pass_pause(self._history_timeout, "history")
+            logger.info(f"(HISTORY) Waiting for {pause} seconds")
+            await asyncio.sleep(pause)
+
+    async def _maintain_partitions_daily(self, kind: str) -> None:
+        """Раз в сутки создаёт секции таблиц истории на следующие месяцы (только в одном цикле мониторинга)."""
+        if kind != self._partitions_kind or time.monotonic() - self._partitions_checked_at < 24 * 60 * 60:
+            return
+        self._partitions_checked_at = time.monotonic()
+        await asyncio.to_thread(maintain_history_partitions)
+
+    async def _scan_channels(self, label: str, workers: int, interval: int, kind: str, **process_kwargs) -> list[str]:
+        """
+        Обходит список каналов, обрабатывая не более `workers` каналов одновременно.
+        Ошибка в одном канале не прерывает проход. Возвращает список каналов, обработка которых завершилась ошибкой.
+        При settings.monitor_leasing каналы берутся в аренду (см. `_scan_leased_channels`), а при
+        settings.monitor_adaptive новые видео ищутся только в каналах, срок проверки которых подошёл
+        (см. `_scan_scheduled_channels`).
+        """
+        if settings.monitor_leasing:
+            return await self._scan_leased_channels(label, workers, interval, kind, **process_kwargs)
+        if self._is_adaptive(kind):
+            return await self._scan_scheduled_channels(label, workers, kind, **process_kwargs)
+        semaphore = asyncio.Semaphore(max(1, workers))
+        total = len(self._channels_list)
+        failed: list[str] = []
+
+        async def scan(i: int, channel_url: str) -> None:
+            async with semaphore:
+                logger.info(f"[{i+1}/{total}] ({label}) Processing channel: {channel_url}")
                 try:
-                    await self._process_channel_videos(channel_url, process_old=True)
+                    await self._process_channel_videos(channel_url, **process_kwargs)
                 except Exception as e:
-                    logger.error(f"Error updating channel history for {channel_url}: {e}")
-                await asyncio.sleep(2)
-            logger.info(f"(HISTORY) Waiting for {self._history_timeout} seconds")
-            await asyncio.sleep(self._history_timeout)
+                    failed.append(channel_url)
+                    logger.error(f"({label}) Error processing channel {channel_url}: {e}")
+                await asyncio.sleep(settings.monitor_channel_delay)
+
+        started = time.monotonic()
+        await asyncio.gather(*(scan(i, channel_url) for i, channel_url in enumerate(self._channels_list)))
+        elapsed = time.monotonic() - started
+        throughput = total / elapsed * 60 if elapsed > 0 else 0.0
+        logger.info(
+            f"({label}) Pass finished: {total} channels in {elapsed:.1f}s "
+            f"({throughput:.1f} channels/min, workers={max(1, workers)}), failed: {len(failed)}"
+        )
+        if failed:
+            logger.warning(f"({label}) Failed channels: {', '.join(failed)}")
+        return failed
+
+    async def _scan_leased_channels(
+        self, label: str, workers: int, interval: int, kind: str, **process_kwargs
+    ) -> list[str]:
+        """
+        Обрабатывает каналы списка, срок сканирования которых подошёл, беря каждый канал в аренду.
+        Каналы делятся между всеми процессами и узлами с общей БД, у которых канал есть в списке,
+        поэтому каждый канал сканируется одним процессом раз в `interval` секунд.
+        """
+        leaser = self._leasers.get(kind)
+        if leaser is None:
+            leaser = ChannelLeaser(kind, self._channels_list, interval, list_name=self._channels_name)
+            self._leasers[kind] = leaser
+        failed: list[str] = []
+        scanned = 0
+
+        async def scan() -> None:
+            nonlocal scanned
+            while (channel_url := await leaser.claim()) is not None:
+                scanned += 1
+                logger.info(f"[{scanned}] ({label}) Processing leased channel: {channel_url}")
+                try:
+                    async with leaser.hold(channel_url) as lease:
+                        await self._process_channel_videos(channel_url, **process_kwargs)
+                        if self._is_adaptive(kind):
+                            lease.interval = await get_channel_poll_interval(self._channel_ids.get(channel_url))
+                except Exception as e:
+                    failed.append(channel_url)
+                    logger.error(f"({label}) Error processing channel {channel_url}: {e}")
+                await asyncio.sleep(settings.monitor_channel_delay)
+
+        started = time.monotonic()
+        await asyncio.gather(*(scan() for _ in range(max(1, workers))))
+        elapsed = time.monotonic() - started
+        throughput = scanned / elapsed * 60 if elapsed > 0 else 0.0
+        logger.info(
+            f"({label}) Leased pass finished: {scanned} channels in {elapsed:.1f}s "
+            f"({throughput:.1f} channels/min, workers={max(1, workers)}), failed: {len(failed)}, "
+            f"leases: {await leaser.get_status()}"
+        )
+        if failed:
+            logger.warning(f"({label}) Failed channels: {', '.join(failed)}")
+        return failed
+
+    async def _scan_scheduled_channels(self, label: str, workers: int, kind: str, **process_kwargs) -> list[str]:
+        """
+        Обрабатывает каналы, время проверки которых наступило, в порядке очереди с приоритетом.
+        После обработки интервал проверки канала пересчитывается по частоте его загрузок.
+        """
+        scheduler = self._schedulers.get(kind)
+        if scheduler is None:
+            scheduler = ChannelPollScheduler(kind, self._channels_list, list_name=self._channels_name)
+            self._schedulers[kind] = scheduler
+        failed: list[str] = []
+        scanned = 0
+
+        async def scan() -> None:
+            nonlocal scanned
+            while (channel_url := await scheduler.pop_due()) is not None:
+                scanned += 1
+                logger.info(f"[{scanned}] ({label}) Processing due channel: {channel_url}")
+                error = None
+                try:
+                    await self._process_channel_videos(channel_url, **process_kwargs)
+                except Exception as e:
+                    error = str(e)
+                    failed.append(channel_url)
+                    logger.error(f"({label}) Error processing channel {channel_url}: {e}")
+                interval = await get_channel_poll_interval(self._channel_ids.get(channel_url))
+                await scheduler.reschedule(channel_url, interval, error=error)
+                await asyncio.sleep(settings.monitor_channel_delay)
+
+        started = time.monotonic()
+        await asyncio.gather(*(scan() for _ in range(max(1, workers))))
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"({label}) Scheduled pass finished: {scanned} due channels in {elapsed:.1f}s, failed: {len(failed)}, "
+            f"schedule: {scheduler.get_stats()} "
+            f"(fixed interval: {len(self._channels_list) * 3600 / self._new_videos_timeout:.1f} polls/hour)"
+        )
+        if failed:
+            logger.warning(f"({label}) Failed channels: {', '.join(failed)}")
+        return failed
+
+    @staticmethod
+    def _is_adaptive(kind: str) -> bool:
+        return settings.monitor_adaptive and kind == "new"
+
+    def _get_pass_pause(self, timeout: int, kind: str) -> int:
+        """
+        Пауза между проходами. При аренде срок следующего сканирования хранится в БД для каждого канала,
+        поэтому процесс проверяет наступившие сроки каждые settings.scan_lease_poll_interval секунд.
+        При адаптивной частоте процесс ждёт, пока не подойдёт срок проверки ближайшего канала.
+        """
+        if settings.monitor_leasing:
+            return min(timeout, settings.scan_lease_poll_interval)
+        scheduler = self._schedulers.get(kind)
+        if scheduler is not None and self._is_adaptive(kind):
+            return max(1, math.ceil(scheduler.get_delay()))
+        return timeout
 
     async def _update_video_formats(self):
-        """Update video formats in the database."""
+        """Собирает форматы видео по очереди format_harvest_queue, общей для всех процессов и узлов."""
+        harvester = FormatHarvester()
         while True:
             logger.info("Updating video formats...")
-            for channel_url in enumerate(self._channels_list):
-                yt_dlp_client = YTChannelDownloader(channel_url)
-                yt_dlp_client.update_video_formats()
-                await asyncio.sleep(5)
-            logger.info(f"(FORMATS) Waiting for {self._history_timeout} seconds")
-            await asyncio.sleep(self._history_timeout)
-
-    async def _shorts_downloader(self, delay: int = 5):
-        logger.info("Starting shorts video downloader...")
-        while True:
             try:
-                video: VideoDownloadSchema = self._download_queue.get(block=False, timeout=5)
-                logger.debug(f"VideoDownloadSchema={video.model_dump()}")
-                await YTChannelDownloader.download_video(video)
-                logger.debug("Adding shorts info into queue...")
-                self._shorts_publish_queue.put(video)
-                # Задержка между скачиванием файлов
-                await asyncio.sleep(delay)
-            except Empty:
-                # Если очередь пуста после таймаута, ничего не делаем и продолжаем ждать
-                await asyncio.sleep(delay)
-                continue
+                logger.info(f"(FORMATS) Pass finished: {await harvester.run_pass()}")
             except Exception as e:
-                logger.error(f"Ошибка при отправке сообщения: {e}")
+                logger.error(f"(FORMATS) Error harvesting video formats: {e}")
+            logger.info(f"(FORMATS) Waiting for {settings.formats_interval} seconds")
+            await asyncio.sleep(settings.formats_interval)
+
+    async def _shorts_downloader(self):
+        logger.info("Starting shorts video downloader...")
+        await DownloadManager().run()
 
     async def _process_channel_videos(self, channel_url: str, process_new: bool = False, process_old: bool = False):
-        """Обработка новых и старых видео для канала."""
+        """
+        Обработка новых и старых видео для канала.
+        yt-dlp и запросы к БД (asyncpg) выполняются асинхронно, а блокирующие вызовы YouTube API - в пуле потоков,
+        чтобы несколько каналов могли обрабатываться параллельно.
+        """
+        if process_new and not process_old and settings.monitor_new_feed:
+            if not await self._feed_has_unseen_videos(channel_url):
+                logger.info(f"No unseen videos in the feed of {channel_url}. Skipping...")
+                return
+
         # Получение информации о канале через yt-dlp
         yt_dlp_client = YTChannelDownloader(channel_url)
-        ytdlp_channel_info: Optional[ChannelInfoSchema] = yt_dlp_client.get_channel_info()
+        full_listing = True
+        if process_new and not process_old and self._incremental_listing_allowed(channel_url):
+            full_listing = not await yt_dlp_client.load_recent_videos()
+            if full_listing:
+                logger.warning(f"Incremental listing failed for {channel_url}. Falling back to full listing...")
+        ytdlp_channel_info: Optional[ChannelInfoSchema] = await yt_dlp_client.get_channel_info()
 
         if not ytdlp_channel_info:
             logger.error(f"Failed to retrieve channel info for {channel_url}. Skipping...")
             return
+        if full_listing:
+            self._last_full_listing[channel_url] = time.monotonic()
+        self._channel_ids[channel_url] = ytdlp_channel_info.channel_id
 
-        api_client = YTApiClient(over_ssh_tunnel=settings.use_ssh_tunnel)
+        api_client = self._get_api_client()
         # Если канала нет в БД, до дополняем о нём информацию через API и добавляем в БД
-        if not yt_dlp_client.channel_exist(ytdlp_channel_info.channel_id):
+        if not await yt_dlp_client.channel_exist(ytdlp_channel_info.channel_id):
             logger.debug("Channel not found in database! Updating...")
             # Получение информации о канале через API
-            ytapi_channel_info: list[ChannelAPIInfoSchema] = api_client.get_channel_info(
-                [ytdlp_channel_info.channel_id]
+            ytapi_channel_info: list[ChannelAPIInfoSchema] = await asyncio.to_thread(
+                api_client.get_channel_info, [ytdlp_channel_info.channel_id]
             )
 
             if len(ytapi_channel_info) == 0:
@@ -151,28 +323,28 @@ class YTMonitorService:
 
             # Объединение и обработка информации о канале
             full_channel_info = self._combine_channel_info(ytdlp_channel_info, ytapi_channel_info[0])
-            self._process_channel_info(full_channel_info, add_history=process_old)
-            video_list, channel_id = yt_dlp_client.get_video_list()
-            video_list = api_client.get_video_info_list([video.id for video in video_list])
-            self._process_new_videos(video_list, channel_id)
+            await self._process_channel_info(full_channel_info, add_history=process_old)
+            video_list, channel_id = await yt_dlp_client.get_video_list()
+            video_list = await api_client.get_video_info_list_async([video.id for video in video_list])
+            await self._process_new_videos(video_list, channel_id)
         elif process_old:
-            ytapi_channel_info = api_client.get_channel_info([ytdlp_channel_info.channel_id])
+            ytapi_channel_info = await asyncio.to_thread(api_client.get_channel_info, [ytdlp_channel_info.channel_id])
             if len(ytapi_channel_info):
-                self._process_channel_history(
+                await self._process_channel_history(
                     ChannelHistory(
                         channel_id=ytdlp_channel_info.channel_id,
                         follower_count=ytdlp_channel_info.channel_follower_count,
                         view_count=ytapi_channel_info[0].viewCount,
                         video_count=ytapi_channel_info[0].videoCount,
-                    )
+                    ),
                 )
             else:
                 logger.warning(f"No channel info returned by YouTube API for {channel_url}.")
 
         # Получение списка видео через yt-dlp
-        video_list, channel_id = yt_dlp_client.get_video_list()
+        video_list, channel_id = await yt_dlp_client.get_video_list()
         # Фильтруем видео на новые и старые
-        new_videos, old_videos = yt_dlp_client.filter_new_old(video_list, channel_id)
+        new_videos, old_videos = await yt_dlp_client.filter_new_old(video_list, channel_id)
         logger.debug(f"Videos count: {len(video_list)}, New: {len(new_videos)}, Old: {len(old_videos)}")
 
         # Определяем, какие видео нужно обрабатывать
@@ -190,49 +362,107 @@ class YTMonitorService:
 
         # Получение дополнительной информации о видео через YouTube API
         video_ids = [video.id for video in videos_to_process]
-        api_videos_info = api_client.get_video_info_list(video_ids)
+        priority = QuotaPriority.NEW_VIDEOS if process_new else QuotaPriority.HISTORY
+        api_videos_info = await api_client.get_video_info_list_async(video_ids, priority=priority)
 
         # Объединение данных о видео
         complete_video_list = self._combine_video_info(videos_to_process, api_videos_info)
-        new_videos, old_videos = yt_dlp_client.filter_new_old(complete_video_list, channel_id)
+        new_videos, old_videos = await yt_dlp_client.filter_new_old(complete_video_list, channel_id)
         logger.debug(
             f"Total combined videos: {len(complete_video_list)}, New: {len(new_videos)}, Old: {len(old_videos)}"
         )
 
         if process_new and new_videos:
-            self._process_new_videos(new_videos, channel_id)
+            # Публикации обычных видео записываются в telegram_outbox в одной транзакции с самими видео
+            publications = []
+            if self._publish_new:
+                for video in new_videos:
+                    if video.url.find("shorts") != -1:  # исключаем shorts videos
+                        continue
+                    payload = NewVideoSchema(
+                        channel_name=ytdlp_channel_info.channel,
+                        channel_url=ytdlp_channel_info.channel_url,
+                        video_title=video.title,
+                        video_url=video.url,
+                        video_id=video.id,
+                        detected_at=time.time(),
+                    ).model_dump()
+                    publications.extend(
+                        {"video_id": video.id, "chat_id": chat_id, "kind": "video", "payload": payload}
+                        for chat_id in self._tg_chats
+                    )
+            await self._process_new_videos(new_videos, channel_id, publications)
 
-            if self._queue is not None:  # Добавление сообщений в очередь на публикацию
+            if self._shorts_publish:  # Shorts публикуются после скачивания
                 for video in new_videos:
-                    if video.url.find("shorts") == -1:  # исключаем shorts videos
-                        self._queue.put(
-                            NewVideoSchema(
-                                channel_name=ytdlp_channel_info.channel,
-                                channel_url=ytdlp_channel_info.channel_url,
-                                video_title=video.title,
-                                video_url=video.url,
-                                video_id=video.id,
-                            )
-                        )  # add video to queue for telegram bot
-                    elif self._shorts_publish:
-                        channel_name = ytdlp_channel_info.id.replace("@", "") or ytdlp_channel_info.channel.replace(
-                            " ", "_"
-                        )
-                        new_shorts_path = self._generate_shorts_download_path(channel_name, video.id)
-                        logger.info(f"Got new shorts ({video.id})!")
-                        logger.debug(f"Path is: {new_shorts_path}")
-                        self._download_queue.put(
-                            VideoDownloadSchema(
-                                channel_name=ytdlp_channel_info.channel,
-                                channel_url=ytdlp_channel_info.channel_url,
-                                video_title=video.title,
-                                video_url=video.url,
-                                video_id=video.id,
-                                video_file_download_path=str(new_shorts_path),
-                            )
-                        )
+                    if video.url.find("shorts") == -1:
+                        continue
+                    channel_name = ytdlp_channel_info.id.replace("@", "") or ytdlp_channel_info.channel.replace(
+                        " ", "_"
+                    )
+                    new_shorts_path = self._generate_shorts_download_path(channel_name, video.id)
+                    logger.info(f"Got new shorts ({video.id})!")
+                    logger.debug(f"Path is: {new_shorts_path}")
+                    await enqueue_download(
+                        VideoDownloadSchema(
+                            channel_name=ytdlp_channel_info.channel,
+                            channel_url=ytdlp_channel_info.channel_url,
+                            video_title=video.title,
+                            video_url=video.url,
+                            video_id=video.id,
+                            video_file_download_path=str(new_shorts_path),
+                            detected_at=time.time(),
+                        ),
+                        publish_chats=self._tg_chats,
+                    )
         if process_old and old_videos:
-            self._process_old_videos(old_videos)
+            await self._process_old_videos(old_videos)
+
+    def _get_api_client(self) -> YTApiClient:
+        """Возвращает клиент YouTube API, общий для всех каналов процесса."""
+        if self._api_client is None:
+            self._api_client = YTApiClient(over_ssh_tunnel=settings.use_ssh_tunnel)
+        return self._api_client
+
+    async def _warm_known_videos(self) -> None:
+        try:
+            await known_videos.warm()
+        except Exception as e:
+            logger.error(f"Failed to warm known video cache: {e}")
+
+    async def _log_api_usage(self, label: str) -> None:
+        logger.info(f"({label}) API stats: {YTApiClient.get_metrics()}")
+        try:
+            logger.info(f"({label}) API quota: {await asyncio.to_thread(QuotaAccountant().get_report)}")
+        except Exception as e:
+            logger.error(f"({label}) Failed to get API quota report: {e}")
+
+    async def _feed_has_unseen_videos(self, channel_url: str) -> bool:
+        """
+        Проверяет Atom-ленту канала. Возвращает True, если в ленте есть видео, которых нет в БД,
+        либо если ленту проверить нельзя (channel_id ещё неизвестен или запрос не удался),
+        и нужно выполнить полную обработку канала через yt-dlp и YouTube API.
+        """
+        channel_id = self._channel_ids.get(channel_url)
+        if not channel_id:
+            return True
+        video_ids = await self._feed_client.get_video_ids(channel_id)
+        if video_ids is None:
+            return True
+        unseen_ids, _ = await known_videos.split_new_known(channel_id, video_ids)
+        if unseen_ids:
+            logger.debug(f"Feed of {channel_url} has {len(unseen_ids)} unseen videos: {unseen_ids}")
+        return bool(unseen_ids)
+
+    def _incremental_listing_allowed(self, channel_url: str) -> bool:
+        """
+        Инкрементальный листинг используется, только если канал уже полностью просканирован в этом процессе
+        и с момента последнего полного листинга прошло меньше `settings.full_listing_interval` секунд.
+        """
+        if not settings.monitor_new_incremental:
+            return False
+        last_full_listing = self._last_full_listing.get(channel_url)
+        return last_full_listing is not None and time.monotonic() - last_full_listing < settings.full_listing_interval
 
     def _combine_channel_info(
         self, ytdlp_channel_info: ChannelInfoSchema, ytapi_channel_info: ChannelAPIInfoSchema
@@ -253,21 +483,21 @@ class YTMonitorService:
         )
         return combined_channel
 
-    def _process_channel_info(self, channel_info: ChannelInfoSchema, add_history: bool) -> None:
+    async def _process_channel_info(self, channel_info: ChannelInfoSchema, add_history: bool) -> None:
         """
         Processes the channel information:
         Updates or adds a channel to the database and optionally logs the historical data.
         """
-        with Session() as session:
-            repository = YoutubeDataRepository(session)
-            channel = repository.upsert_channel(channel_info, self._channels_name)
+        async with async_repository_scope(AsyncYoutubeDataRepository) as repository:
+            channel = await repository.upsert_channel(channel_info, self._channels_name)
+            known_videos.add_channel(channel.channel_id)
             if add_history:
-                repository.add_channel_history(channel)
+                await repository.add_channel_history(channel)
 
-    def _process_channel_history(self, history: ChannelHistory):
+    async def _process_channel_history(self, history: ChannelHistory):
         """Add a channel history into database"""
-        with Session() as session:
-            YoutubeDataRepository(session).add_channel_history(history)
+        async with async_repository_scope(AsyncYoutubeDataRepository) as repository:
+            await repository.add_channel_history(history)
 
     def _combine_video_info(self, yt_dlp_videos: list[VideoSchema], api_videos: list[VideoSchema]) -> list[VideoSchema]:
         """Combine video data from yt-dlp and YouTube API."""
@@ -303,34 +533,34 @@ class YTMonitorService:
             complete_videos.append(complete_video)
         return complete_videos
 
-    def _process_new_videos(self, new_videos: list[VideoSchema], channel_id: str) -> None:
+    async def _process_new_videos(
+        self, new_videos: list[VideoSchema], channel_id: str, publications: Optional[list[dict]] = None
+    ) -> None:
         """
         Processes new videos:
-        Adds each new video to the database and logs the historical data.
+        Adds the new videos to the database in bulk together with their tags, thumbnails and historical data,
+        and their Telegram publications (`telegram_outbox` rows) to the outbox.
         """
-        with Session() as session:
-            repository = YoutubeDataRepository(session)
-            for video_schema in new_videos:
-                try:
-                    # Добавляем видео в базу данных
-                    repository.add_video(video_schema, channel_id)
-                    # Добавляем исторические данные о видео
-                    repository.add_video_history(video_schema)
-                    logger.info(f"Added new video: {video_schema.title} (ID: {video_schema.id})")
-                except Exception as e:
-                    logger.error(f"Failed to process video {video_schema.id}: {e}")
-                    continue
+        async with async_repository_scope(AsyncYoutubeDataRepository) as repository:
+            outcomes = await repository.bulk_upsert_videos(new_videos, channel_id, publications=publications)
+        known_videos.add(channel_id, [video_id for video_id, outcome in outcomes.items() if outcome != "failed"])
+        for video_schema in new_videos:
+            if outcomes.get(video_schema.id) == "failed":
+                logger.error(f"Failed to process video {video_schema.id}")
+            else:
+                logger.info(f"Added new video: {video_schema.title} (ID: {video_schema.id})")
 
-    def _process_old_videos(self, old_videos: list[VideoSchema]) -> None:
+    async def _process_old_videos(self, old_videos: list[VideoSchema]) -> None:
         """
         Processes old videos:
-        Logs the historical data for each video already present in the database.
+        Updates the videos already present in the database and logs their historical data in batches.
         """
-        with Session() as session:
-            repository = YoutubeDataRepository(session)
-            for video_schema in old_videos:
-                repository.update_video(video_schema)
-                repository.add_video_history(video_schema)
+        async with async_repository_scope(AsyncYoutubeDataRepository) as repository:
+            totals = await repository.bulk_record_video_history(old_videos)
+        logger.info(
+            f"History recorded for {totals['history']} videos (unchanged, skipped: {totals['history_skipped']}): "
+            f"updated {totals['updated']}, retagged {totals['tags_updated']}, missing {totals['missing']}"
+        )
 
     def _generate_shorts_download_path(self, channel_name: str, video_id: str, format: str = "mp4") -> Path:
         video_file_name = f"{channel_name}_{video_id}.{format}"
@@ -0,0 +1,203 @@
+"""
+Бенчмарк горячих запросов репозитория до и после миграции с индексами (3f9c1d7a2b64).
+
+Скрипт создаёт отдельную базу данных (по умолчанию youtube_bench), применяет начальную миграцию,
+заполняет таблицы синтетическими данными, замеряет время запросов, применяет миграцию с индексами
+и замеряет ещё раз. Рабочая база данных не затрагивается.
+
+Запуск из корня проекта:
+    PYTHONPATH=. python migrations/benchmark_indexes.py --channels 100 --videos 100000
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+BASE_REVISION = "e5c52e63bc97"
+INDEXES_REVISION = "3f9c1d7a2b64"
+
+SEED_SQL = [
+    """
+    INSERT INTO {schema}.channels (channel_id, channel_url, title, published_at)
+    SELECT 'UC' || lpad(c::text, 22, '0'), 'https://www.youtube.com/channel/UC' || lpad(c::text, 22, '0'),
+           'Channel ' || c, now() - c * interval '1 day'
+    FROM generate_series(1, :channels) AS c
+    """,
+    """
+    INSERT INTO {schema}.videos (video_id, channel_id, url, title, duration, view_count, like_count, comment_count,
+                                 upload_date)
+    SELECT 'v' || lpad(v::text, 10, '0'), 'UC' || lpad((1 + v % :channels)::text, 22, '0'),
+           'https://www.youtube.com/watch?v=v' || lpad(v::text, 10, '0'), 'Video ' || v, 60 + v % 3600, v * 10,
+           CASE WHEN v % 500 = 0 THEN -1 ELSE v END, v % 100,
+           CASE WHEN v % 50 = 0 THEN NULL ELSE now() - (v % 1000) * interval '1 hour' END
+    FROM generate_series(1, :videos) AS v
+    """,
+    """
+    INSERT INTO {schema}.video_history (video_id, view_count, like_count, comment_count, recorded_at)
+    SELECT id, view_count + h, like_count, comment_count, now() - h * interval '8 hours'
+    FROM {schema}.videos, generate_series(1, :history) AS h
+    """,
+    """
+    INSERT INTO {schema}.channel_history (channel_id, follower_count, view_count, video_count, recorded_at)
+    SELECT channel_id, h, h * 100, h, now() - h * interval '8 hours'
+    FROM {schema}.channels, generate_series(1, :history) AS h
+    """,
+    """
+    INSERT INTO {schema}.video_formats (video_id, format_id, ext)
+    SELECT id, f::text, 'mp4'
+    FROM {schema}.videos, generate_series(1, :formats) AS f
+    WHERE view_count % 100 <> 0
+    """,
+    """
+    INSERT INTO {schema}.thumbnails (video_id, url, width, height)
+    SELECT id, 'https://i.ytimg.com/vi/' || video_id || '/' || t || '.jpg', 120 * t, 90 * t
+    FROM {schema}.videos, generate_series(1, :thumbnails) AS t
+    """,
+    """
+    INSERT INTO {schema}.tags (name) SELECT 'tag ' || t FROM generate_series(1, 5000) AS t
+    """,
+    """
+    INSERT INTO {schema}.videotag (video_id, tag_id)
+    SELECT DISTINCT v.id, 1 + (abs(hashtext(v.video_id)) + t * 997) % 5000
+    FROM {schema}.videos AS v, generate_series(1, 5) AS t
+    """,
+]
+
+QUERIES = {
+    "videos of channel (get_new_and_existing_video_ids)": (
+        "SELECT video_id FROM {schema}.videos WHERE channel_id = :channel_id"
+    ),
+    "thumbnail by url (add_thumbnail)": "SELECT id FROM {schema}.thumbnails WHERE url = :thumbnail_url",
+    "thumbnails of video": "SELECT url FROM {schema}.thumbnails WHERE video_id = CAST(:video_uuid AS uuid)",
+    "format by (video_id, format_id) (add_video_format)": (
+        "SELECT id FROM {schema}.video_formats WHERE video_id = CAST(:video_uuid AS uuid) AND format_id = '1'"
+    ),
+    "last snapshot of 1000 videos (get_last_video_snapshots)": (
+        "SELECT DISTINCT ON (video_id) video_id, view_count FROM {schema}.video_history "
+        "WHERE video_id = ANY(CAST(:video_uuids AS uuid[])) ORDER BY video_id, recorded_at DESC"
+    ),
+    "invalid videos (like_count = -1)": "SELECT video_id FROM {schema}.videos WHERE like_count = -1",
+    "videos without upload_date (get_videos_without_upload_date)": (
+        "SELECT video_id FROM {schema}.videos WHERE upload_date IS NULL "
+        "AND (like_count IS NULL OR like_count != -1) LIMIT 30"
+    ),
+    "videos without formats (get_video_ids_without_formats)": (
+        "SELECT v.video_id FROM {schema}.videos AS v "
+        "LEFT JOIN (SELECT DISTINCT video_id FROM {schema}.video_formats) AS f ON v.id = f.video_id "
+        "WHERE f.video_id IS NULL LIMIT 50"
+    ),
+    "last channel snapshot": (
+        "SELECT * FROM {schema}.channel_history WHERE channel_id = :channel_id ORDER BY recorded_at DESC LIMIT 1"
+    ),
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-name", default="youtube_bench", help="Имя создаваемой базы данных для бенчмарка")
+    parser.add_argument("--channels", type=int, default=100)
+    parser.add_argument("--videos", type=int, default=100_000)
+    parser.add_argument("--history", type=int, default=10, help="Снимков истории на видео и канал")
+    parser.add_argument("--formats", type=int, default=10, help="Форматов на видео")
+    parser.add_argument("--thumbnails", type=int, default=5, help="Миниатюр на видео")
+    parser.add_argument("--repeat", type=int, default=20, help="Повторов каждого запроса")
+    parser.add_argument(
+        "--recreate", action="store_true", help="Пересоздать схему, если база бенчмарка уже содержит данные"
+    )
+    return parser.parse_args()
+
+
+def measure(connection, schema: str, params: dict, repeat: int) -> dict[str, float]:
+    """Возвращает медианное время выполнения каждого запроса в миллисекундах."""
+    from sqlalchemy import text
+
+    timings = {}
+    for name, query in QUERIES.items():
+        statement = text(query.format(schema=schema))
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            connection.execute(statement, params).fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+        timings[name] = statistics.median(samples)
+    return timings
+
+
+def main() -> None:
+    args = parse_args()
+    # Имя БД подменяется до импорта настроек приложения, чтобы миграции и подключение шли в базу бенчмарка
+    os.environ["DB_NAME"] = args.db_name
+
+    from alembic import command
+    from alembic.config import Config
+    from sqlalchemy import create_engine, text
+
+    from app.config import settings
+
+    schema = settings.db_schema
+    alembic_cfg = Config("alembic.ini")
+    engine = create_engine(settings.database_url)
+
+    print(f"Preparing database '{settings.db_name}' (schema '{schema}')...")
+    server_url = settings.database_url.rsplit("/", 1)[0] + "/postgres"
+    with create_engine(server_url, isolation_level="AUTOCOMMIT").connect() as connection:
+        database_exists = connection.execute(
+            text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": args.db_name}
+        ).scalar()
+        if not database_exists:
+            connection.execute(text(f'CREATE DATABASE "{args.db_name}"'))
+    with engine.begin() as connection:
+        schema_exists = connection.execute(
+            text("SELECT 1 FROM information_schema.schemata WHERE schema_name = :schema"), {"schema": schema}
+        ).scalar()
+        if schema_exists and not args.recreate:
+            raise SystemExit(f"Schema '{schema}' already exists in '{args.db_name}'. Use --recreate to drop it.")
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        connection.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    command.upgrade(alembic_cfg, BASE_REVISION)
+
+    print(f"Seeding {args.channels} channels and {args.videos} videos...")
+    seed_params = {
+        "channels": args.channels,
+        "videos": args.videos,
+        "history": args.history,
+        "formats": args.formats,
+        "thumbnails": args.thumbnails,
+    }
+    with engine.begin() as connection:
+        for sql in SEED_SQL:
+            sql = sql.format(schema=schema)
+            started = time.perf_counter()
+            connection.execute(text(sql), seed_params)
+            print(f"  {sql.split()[2]:<30} {time.perf_counter() - started:8.1f}s")
+        connection.execute(text("ANALYZE"))
+
+    with engine.connect() as connection:
+        video_uuids = [
+            str(row[0])
+            for row in connection.execute(text(f"SELECT id FROM {schema}.videos ORDER BY random() LIMIT 1000"))
+        ]
+        query_params = {
+            "channel_id": "UC" + str(args.channels // 2 + 1).zfill(22),
+            "video_uuid": video_uuids[0],
+            "video_uuids": video_uuids,
+            "thumbnail_url": f"https://i.ytimg.com/vi/v{str(args.videos // 2).zfill(10)}/1.jpg",
+        }
+        before = measure(connection, schema, query_params, args.repeat)
+
+    command.upgrade(alembic_cfg, INDEXES_REVISION)
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+
+    with engine.connect() as connection:
+        after = measure(connection, schema, query_params, args.repeat)
+
+    print(f"\n{'query':<62} {'before, ms':>12} {'after, ms':>12} {'speedup':>9}")
+    for name in QUERIES:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<62} {before[name]:>12.2f} {after[name]:>12.2f} {speedup:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
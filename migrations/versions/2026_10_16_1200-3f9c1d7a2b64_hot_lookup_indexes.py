@@ -0,0 +1,82 @@
+"""Indexes for hot lookup columns
+
+Revision ID: 3f9c1d7a2b64
+Revises: e5c52e63bc97
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9c1d7a2b64"
+down_revision: Union[str, None] = "e5c52e63bc97"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # get_new_and_existing_video_ids / get_channel_videos: index-only scan по (channel_id, video_id).
+    # Заменяет индекс только по channel_id, т.к. покрывается префиксом составного.
+    op.create_index("videos_channel_id_video_id_idx", "videos", ["channel_id", "video_id"], schema=settings.db_schema)
+    op.drop_index("videos_channel_id_idx", table_name="videos", schema=settings.db_schema)
+    # Частичные индексы для выборок "проблемных" видео
+    op.create_index(
+        "videos_invalid_idx",
+        "videos",
+        ["video_id"],
+        schema=settings.db_schema,
+        postgresql_where=sa.text("like_count = -1"),
+    )
+    op.create_index(
+        "videos_without_upload_date_idx",
+        "videos",
+        ["video_id"],
+        schema=settings.db_schema,
+        postgresql_where=sa.text("upload_date IS NULL"),
+    )
+    # thumbnails.url уже проиндексирован ограничением uix_thumbnail_url, индексируем внешние ключи
+    op.create_index("thumbnails_video_id_idx", "thumbnails", ["video_id"], schema=settings.db_schema)
+    op.create_index("thumbnails_channel_id_idx", "thumbnails", ["channel_id"], schema=settings.db_schema)
+    # add_video_format: поиск формата по (video_id, format_id)
+    op.create_index(
+        "video_formats_video_id_format_id_idx",
+        "video_formats",
+        ["video_id", "format_id"],
+        schema=settings.db_schema,
+    )
+    op.drop_index("video_formats_video_id_idx", table_name="video_formats", schema=settings.db_schema)
+    # Последний снимок истории видео/канала
+    op.create_index(
+        "video_history_video_id_recorded_at_idx",
+        "video_history",
+        ["video_id", "recorded_at"],
+        schema=settings.db_schema,
+    )
+    op.create_index(
+        "channel_history_channel_id_recorded_at_idx",
+        "channel_history",
+        ["channel_id", "recorded_at"],
+        schema=settings.db_schema,
+    )
+    # Первичный ключ videotag начинается с video_id, поиск видео по тегу требует отдельного индекса
+    op.create_index("videotag_tag_id_idx", "videotag", ["tag_id"], schema=settings.db_schema)
+
+
+def downgrade() -> None:
+    op.drop_index("videotag_tag_id_idx", table_name="videotag", schema=settings.db_schema)
+    op.drop_index("channel_history_channel_id_recorded_at_idx", table_name="channel_history", schema=settings.db_schema)
+    op.drop_index("video_history_video_id_recorded_at_idx", table_name="video_history", schema=settings.db_schema)
+    op.create_index("video_formats_video_id_idx", "video_formats", ["video_id"], schema=settings.db_schema)
+    op.drop_index("video_formats_video_id_format_id_idx", table_name="video_formats", schema=settings.db_schema)
+    op.drop_index("thumbnails_channel_id_idx", table_name="thumbnails", schema=settings.db_schema)
+    op.drop_index("thumbnails_video_id_idx", table_name="thumbnails", schema=settings.db_schema)
+    op.drop_index("videos_without_upload_date_idx", table_name="videos", schema=settings.db_schema)
+    op.drop_index("videos_invalid_idx", table_name="videos", schema=settings.db_schema)
+    op.create_index("videos_channel_id_idx", "videos", ["channel_id"], schema=settings.db_schema)
+    op.drop_index("videos_channel_id_video_id_idx", table_name="videos", schema=settings.db_schema)
@@ -0,0 +1,123 @@
+"""Monthly range partitioning of history tables
+
+Revision ID: 7b2e4c9d1a53
+Revises: 3f9c1d7a2b64
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+
+from datetime import date, datetime
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision: str = "7b2e4c9d1a53"
+down_revision: Union[str, None] = "3f9c1d7a2b64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# таблица -> (колонка внешнего ключа, ссылка внешнего ключа)
+HISTORY_TABLES = {
+    "video_history": ("video_id", "videos(id)"),
+    "channel_history": ("channel_id", "channels(channel_id)"),
+}
+
+
+def _month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_month_partition(connection: sa.Connection, table: str, month: date) -> None:
+    """Создаёт секцию таблицы за месяц и переносит в неё строки этого месяца из секции по умолчанию."""
+    schema = settings.db_schema
+    name = f"{table}_p{month:%Y%m}"
+    if connection.execute(sa.text("SELECT to_regclass(:name)"), {"name": f"{schema}.{name}"}).scalar():
+        return
+    start, end = month, _add_months(month, 1)
+    connection.execute(sa.text(f"CREATE TABLE {schema}.{name} (LIKE {schema}.{table} INCLUDING DEFAULTS)"))
+    connection.execute(
+        sa.text(
+            f"WITH moved AS (DELETE FROM {schema}.{table}_default "
+            f"WHERE recorded_at >= :start AND recorded_at < :end RETURNING *) "
+            f"INSERT INTO {schema}.{name} SELECT * FROM moved"
+        ),
+        {"start": start, "end": end},
+    )
+    connection.execute(
+        sa.text(
+            f"ALTER TABLE {schema}.{table} ATTACH PARTITION {schema}.{name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    )
+
+
+def _rename_old_table(table: str, suffix: str) -> str:
+    """Переименовывает таблицу вместе с её ограничениями и индексами, освобождая имена для новой таблицы."""
+    schema = settings.db_schema
+    key, _ = HISTORY_TABLES[table]
+    old_table = f"{table}_{suffix}"
+    op.execute(f"ALTER TABLE {schema}.{table} RENAME TO {old_table}")
+    op.execute(f"ALTER TABLE {schema}.{old_table} RENAME CONSTRAINT {table}_pkey TO {old_table}_pkey")
+    op.execute(f"ALTER TABLE {schema}.{old_table} RENAME CONSTRAINT {table}_{key}_fkey TO {old_table}_{key}_fkey")
+    op.drop_index(f"{table}_{key}_recorded_at_idx", table_name=old_table, schema=settings.db_schema)
+    return old_table
+
+
+def _create_keys(table: str, primary_key: list[str]) -> None:
+    schema = settings.db_schema
+    key, reference = HISTORY_TABLES[table]
+    op.execute(f"ALTER TABLE {schema}.{table} ADD CONSTRAINT {table}_pkey PRIMARY KEY ({', '.join(primary_key)})")
+    op.execute(
+        f"ALTER TABLE {schema}.{table} ADD CONSTRAINT {table}_{key}_fkey "
+        f"FOREIGN KEY ({key}) REFERENCES {schema}.{reference}"
+    )
+    op.create_index(f"{table}_{key}_recorded_at_idx", table, [key, "recorded_at"], schema=settings.db_schema)
+
+
+def _move_rows(table: str, old_table: str) -> None:
+    schema = settings.db_schema
+    op.execute(f"INSERT INTO {schema}.{table} SELECT * FROM {schema}.{old_table}")
+    # Последовательность id переходит к новой таблице и не удаляется вместе со старой
+    op.execute(f"ALTER SEQUENCE {schema}.{table}_id_seq OWNED BY {schema}.{table}.id")
+    op.drop_table(old_table, schema=settings.db_schema)
+
+
+def upgrade() -> None:
+    schema = settings.db_schema
+    connection = op.get_bind()
+    for table in HISTORY_TABLES:
+        old_table = _rename_old_table(table, "unpartitioned")
+        # Первичный ключ секционированной таблицы обязан включать ключ секционирования
+        op.execute(
+            f"CREATE TABLE {schema}.{table} (LIKE {schema}.{old_table} INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (recorded_at)"
+        )
+        _create_keys(table, ["id", "recorded_at"])
+        op.execute(f"CREATE TABLE {schema}.{table}_default PARTITION OF {schema}.{table} DEFAULT")
+
+        first_recorded_at = connection.execute(sa.text(f"SELECT min(recorded_at) FROM {schema}.{old_table}")).scalar()
+        month = _month_start(first_recorded_at or datetime.now())
+        last_month = _add_months(_month_start(datetime.now()), settings.history_partitions_ahead)
+        while month <= last_month:
+            _create_month_partition(connection, table, month)
+            month = _add_months(month, 1)
+
+        _move_rows(table, old_table)
+
+
+def downgrade() -> None:
+    schema = settings.db_schema
+    for table in HISTORY_TABLES:
+        old_table = _rename_old_table(table, "partitioned")
+        op.execute(f"CREATE TABLE {schema}.{table} (LIKE {schema}.{old_table} INCLUDING DEFAULTS)")
+        _create_keys(table, ["id"])
+        _move_rows(table, old_table)
@@ -0,0 +1,35 @@
+"""Daily YouTube Data API quota usage
+
+Revision ID: c81f5a3e9d27
+Revises: 7b2e4c9d1a53
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision: str = "c81f5a3e9d27"
+down_revision: Union[str, None] = "7b2e4c9d1a53"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "api_quota_usage",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("units_used", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), nullable=True, server_default=sa.text("now()")),
+        sa.PrimaryKeyConstraint("day", name="api_quota_usage_pkey"),
+        schema=settings.db_schema,
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("api_quota_usage", schema=settings.db_schema)
@@ -0,0 +1,70 @@
+"""Format harvest work queue and unique video formats
+
+Revision ID: 5d8e2a6f4c19
+Revises: c81f5a3e9d27
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision: str = "5d8e2a6f4c19"
+down_revision: Union[str, None] = "c81f5a3e9d27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    schema = settings.db_schema
+    # Все форматы видео пишутся одним INSERT ... ON CONFLICT (video_id, format_id), поэтому пара должна быть
+    # уникальной. Дубликаты, оставшиеся от add_video_format, удаляем, сохраняя последнюю запись
+    op.execute(
+        f"DELETE FROM {schema}.video_formats AS older USING {schema}.video_formats AS newer "
+        "WHERE older.video_id = newer.video_id AND older.format_id = newer.format_id AND older.id < newer.id"
+    )
+    op.drop_index("video_formats_video_id_format_id_idx", table_name="video_formats", schema=schema)
+    op.create_index(
+        "video_formats_video_id_format_id_idx",
+        "video_formats",
+        ["video_id", "format_id"],
+        unique=True,
+        schema=schema,
+    )
+
+    op.create_table(
+        "format_harvest_queue",
+        sa.Column("video_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("status", sa.String(), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("available_at", sa.DateTime(), nullable=True, server_default=sa.text("now()")),
+        sa.Column("locked_until", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True, server_default=sa.text("now()")),
+        sa.ForeignKeyConstraint(
+            ["video_id"], [f"{schema}.videos.id"], name="format_harvest_queue_video_id_fkey", ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("video_id", name="format_harvest_queue_pkey"),
+        schema=schema,
+    )
+    # Выборка следующих заданий: готовые к обработке pending и задания с истёкшей арендой
+    op.create_index(
+        "format_harvest_queue_status_available_at_idx",
+        "format_harvest_queue",
+        ["status", "available_at"],
+        schema=schema,
+    )
+
+
+def downgrade() -> None:
+    schema = settings.db_schema
+    op.drop_index("format_harvest_queue_status_available_at_idx", table_name="format_harvest_queue", schema=schema)
+    op.drop_table("format_harvest_queue", schema=schema)
+    op.drop_index("video_formats_video_id_format_id_idx", table_name="video_formats", schema=schema)
+    op.create_index("video_formats_video_id_format_id_idx", "video_formats", ["video_id", "format_id"], schema=schema)
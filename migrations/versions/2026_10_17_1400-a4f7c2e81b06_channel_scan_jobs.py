@@ -0,0 +1,50 @@
+"""Channel scan leases
+
+Revision ID: a4f7c2e81b06
+Revises: 5d8e2a6f4c19
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision: str = "a4f7c2e81b06"
+down_revision: Union[str, None] = "5d8e2a6f4c19"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "channel_scan_jobs",
+        sa.Column("channel_url", sa.String(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("list_name", sa.String(), nullable=True),
+        sa.Column("next_run_at", sa.DateTime(), nullable=True, server_default=sa.text("now()")),
+        sa.Column("leased_by", sa.String(), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(), nullable=True),
+        sa.Column("last_started_at", sa.DateTime(), nullable=True),
+        sa.Column("last_finished_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("scans", sa.Integer(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("channel_url", "kind", name="channel_scan_jobs_pkey"),
+        schema=settings.db_schema,
+    )
+    # Выборка каналов, срок сканирования которых подошёл
+    op.create_index(
+        "channel_scan_jobs_kind_next_run_at_idx",
+        "channel_scan_jobs",
+        ["kind", "next_run_at"],
+        schema=settings.db_schema,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("channel_scan_jobs_kind_next_run_at_idx", table_name="channel_scan_jobs", schema=settings.db_schema)
+    op.drop_table("channel_scan_jobs", schema=settings.db_schema)
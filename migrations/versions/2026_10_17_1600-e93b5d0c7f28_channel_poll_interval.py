@@ -0,0 +1,39 @@
+"""Adaptive poll interval of channel scans
+
+Revision ID: e93b5d0c7f28
+Revises: a4f7c2e81b06
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision: str = "e93b5d0c7f28"
+down_revision: Union[str, None] = "a4f7c2e81b06"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "channel_scan_jobs", sa.Column("poll_interval", sa.Integer(), nullable=True), schema=settings.db_schema
+    )
+    # Последние загрузки канала для оценки их частоты
+    op.create_index(
+        "videos_channel_id_upload_date_idx",
+        "videos",
+        ["channel_id", sa.text("upload_date DESC")],
+        schema=settings.db_schema,
+        postgresql_where=sa.text("upload_date IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("videos_channel_id_upload_date_idx", table_name="videos", schema=settings.db_schema)
+    op.drop_column("channel_scan_jobs", "poll_interval", schema=settings.db_schema)
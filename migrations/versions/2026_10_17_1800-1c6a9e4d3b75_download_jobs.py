@@ -0,0 +1,56 @@
+"""Persistent download jobs
+
+Revision ID: 1c6a9e4d3b75
+Revises: e93b5d0c7f28
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision: str = "1c6a9e4d3b75"
+down_revision: Union[str, None] = "e93b5d0c7f28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "download_jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("video_id", sa.String(), nullable=False),
+        sa.Column("video_url", sa.String(), nullable=False),
+        sa.Column("file_path", sa.String(), nullable=False),
+        sa.Column("format", sa.String(), nullable=False),
+        sa.Column("publish", sa.Boolean(), nullable=False, server_default="false"),
+        sa.Column("payload", postgresql.JSONB(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("available_at", sa.DateTime(), nullable=True, server_default=sa.text("now()")),
+        sa.Column("locked_until", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("bytes_downloaded", sa.BigInteger(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True, server_default=sa.text("now()")),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id", name="download_jobs_pkey"),
+        sa.UniqueConstraint("video_id", "format", name="download_jobs_video_id_format_key"),
+        schema=settings.db_schema,
+    )
+    op.create_index(
+        "download_jobs_status_available_at_idx",
+        "download_jobs",
+        ["status", "available_at"],
+        schema=settings.db_schema,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("download_jobs_status_available_at_idx", table_name="download_jobs", schema=settings.db_schema)
+    op.drop_table("download_jobs", schema=settings.db_schema)
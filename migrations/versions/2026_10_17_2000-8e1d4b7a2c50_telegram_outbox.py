@@ -0,0 +1,54 @@
+"""Telegram publication outbox and video post date
+
+Revision ID: 8e1d4b7a2c50
+Revises: 1c6a9e4d3b75
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision: str = "8e1d4b7a2c50"
+down_revision: Union[str, None] = "1c6a9e4d3b75"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("videos", sa.Column("tg_post_date", sa.DateTime(), nullable=True), schema=settings.db_schema)
+    op.create_table(
+        "telegram_outbox",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("video_id", sa.String(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("payload", postgresql.JSONB(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("available_at", sa.DateTime(), nullable=True, server_default=sa.text("now()")),
+        sa.Column("locked_until", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True, server_default=sa.text("now()")),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id", name="telegram_outbox_pkey"),
+        sa.UniqueConstraint("video_id", name="telegram_outbox_video_id_key"),
+        schema=settings.db_schema,
+    )
+    op.create_index(
+        "telegram_outbox_status_available_at_idx",
+        "telegram_outbox",
+        ["status", "available_at"],
+        schema=settings.db_schema,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("telegram_outbox_status_available_at_idx", table_name="telegram_outbox", schema=settings.db_schema)
+    op.drop_table("telegram_outbox", schema=settings.db_schema)
+    op.drop_column("videos", "tg_post_date", schema=settings.db_schema)
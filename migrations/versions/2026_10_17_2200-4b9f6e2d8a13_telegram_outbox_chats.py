@@ -0,0 +1,56 @@
+"""Telegram publications per target chat
+
+Revision ID: 4b9f6e2d8a13
+Revises: 8e1d4b7a2c50
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision: str = "4b9f6e2d8a13"
+down_revision: Union[str, None] = "8e1d4b7a2c50"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    schema = settings.db_schema
+    # Существующие публикации и задания на скачивание отправляются в чат по умолчанию
+    op.add_column("telegram_outbox", sa.Column("chat_id", sa.String(), nullable=True), schema=schema)
+    op.execute(
+        sa.text(f"UPDATE {schema}.telegram_outbox SET chat_id = :chat_id").bindparams(chat_id=settings.tg_group_id)
+    )
+    op.alter_column("telegram_outbox", "chat_id", nullable=False, schema=schema)
+    op.drop_constraint("telegram_outbox_video_id_key", "telegram_outbox", type_="unique", schema=schema)
+    op.create_unique_constraint(
+        "telegram_outbox_video_id_chat_id_key", "telegram_outbox", ["video_id", "chat_id"], schema=schema
+    )
+    op.add_column(
+        "download_jobs", sa.Column("publish_chats", postgresql.ARRAY(sa.String()), nullable=True), schema=schema
+    )
+    op.execute(
+        sa.text(f"UPDATE {schema}.download_jobs SET publish_chats = ARRAY[:chat_id] WHERE publish").bindparams(
+            chat_id=settings.tg_group_id
+        )
+    )
+
+
+def downgrade() -> None:
+    schema = settings.db_schema
+    op.drop_column("download_jobs", "publish_chats", schema=schema)
+    op.drop_constraint("telegram_outbox_video_id_chat_id_key", "telegram_outbox", type_="unique", schema=schema)
+    # Из публикаций одного видео в разные чаты остаётся одна
+    op.execute(
+        f"DELETE FROM {schema}.telegram_outbox a USING {schema}.telegram_outbox b "
+        "WHERE a.video_id = b.video_id AND a.id > b.id"
+    )
+    op.create_unique_constraint("telegram_outbox_video_id_key", "telegram_outbox", ["video_id"], schema=schema)
+    op.drop_column("telegram_outbox", "chat_id", schema=schema)